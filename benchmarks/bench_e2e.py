@@ -0,0 +1,190 @@
+"""Benchmark whole runs against a local fake Wayback Machine.
+
+Generates synthetic corpora of Markdown files with varying numbers of links, updates
+them with update_files while all API calls are answered by FakeWayback, and reports
+files/s, requests/s, peak RSS and p50/p99 lookup latency. Each corpus size runs in a
+fresh process, so that peak RSS is measured per run. No network access is needed.
+
+Usage:
+    python benchmarks/bench_e2e.py [--files 10 100 1000] [--links 10]
+        [--url-pool 2000] [--latency 0.02] [--error-rate 0] [--throttle-rate 0]
+        [--backend available] [--jobs 1]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import multiprocessing
+import random
+import resource
+import statistics
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+from archive_md_urls.cdx import CDXBackend
+from archive_md_urls.fake_wayback import FakeWayback
+from archive_md_urls.gather_snapshots import (
+    AvailableBackend,
+    SnapshotBackend,
+    create_client,
+)
+from archive_md_urls.ratelimit import RateLimiter
+from archive_md_urls.update_files import update_files
+
+BACKENDS: dict[str, type[SnapshotBackend]] = {
+    "available": AvailableBackend,
+    "cdx": CDXBackend,
+}
+
+
+class TimedBackend(SnapshotBackend):
+    """Record how long each lookup of another backend takes."""
+
+    def __init__(self, backend: SnapshotBackend) -> None:
+        self.backend: SnapshotBackend = backend
+        self.latencies: list[float] = []
+
+    async def lookup(
+        self,
+        client: httpx.AsyncClient,
+        url: str,
+        timestamp: str | None = None,
+        limiter: RateLimiter | None = None,
+    ) -> str | None:
+        start: float = time.perf_counter()
+        try:
+            return await self.backend.lookup(client, url, timestamp, limiter)
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+
+def generate_corpus(directory: Path, files: int, links: int, url_pool: int) -> None:
+    """Write Markdown files with dates and links to directory.
+
+    Args:
+        directory (Path): Directory for the corpus
+        files (int): Number of files
+        links (int): Average number of links per file, numbers vary between files
+        url_pool (int): Number of distinct URLs that links are drawn from
+    """
+    corpus_random = random.Random(files)
+    for i in range(files):
+        post_date: date = date(2008, 1, 1) + timedelta(
+            days=corpus_random.randrange(5000)
+        )
+        paragraphs: list[str] = [f"Title: Post {i}\nDate: {post_date}\n"]
+        for j in range(corpus_random.randint(0, 2 * links)):
+            # Some links are stable and never looked up
+            url: str = (
+                f"https://doi.org/10.1000/{j}"
+                if corpus_random.random() < 0.1
+                else f"https://site{corpus_random.randrange(url_pool)}.example.com/"
+                + f"page/{corpus_random.randrange(10)}"
+            )
+            paragraphs.append(
+                f"Paragraph {j} links to [a page]({url}) in a sentence of ordinary "
+                + "length, followed by some more text to make it realistic."
+            )
+        Path(directory, f"{post_date}-post-{i}.md").write_text(
+            "\n\n".join(paragraphs) + "\n", encoding="utf-8"
+        )
+
+
+def run_corpus(args: argparse.Namespace, files: int) -> dict[str, Any]:
+    """Generate a corpus and update it, meant to run in a fresh process.
+
+    Args:
+        args (argparse.Namespace): Parsed command line arguments
+        files (int): Number of files of the corpus
+
+    Returns:
+        dict[str, Any]: Measurements of the run
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        generate_corpus(Path(tmp_dir), files, args.links, args.url_pool)
+        fake = FakeWayback(
+            latency=args.latency,
+            error_rate=args.error_rate,
+            throttle_rate=args.throttle_rate,
+            retry_after=0.1,
+        )
+        backend = TimedBackend(BACKENDS[args.backend]())
+
+        async def run() -> None:
+            async with create_client(transport=fake.transport()) as client:
+                await update_files(
+                    sorted(Path(tmp_dir).iterdir()),
+                    client=client,
+                    limiter=RateLimiter(args.max_in_flight, args.rate),
+                    backend=backend,
+                    jobs=args.jobs,
+                )
+
+        start: float = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            asyncio.run(run())
+        elapsed: float = time.perf_counter() - start
+    latencies: list[float] = backend.latencies or [0.0]
+    percentiles: list[float] = (
+        statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    )
+    return {
+        "files": files,
+        "files/s": files / elapsed,
+        "requests/s": sum(fake.requests.values()) / elapsed,
+        # ru_maxrss is given in kilobytes on Linux
+        "peak RSS (MB)": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "p50 (ms)": percentiles[49] * 1000,
+        "p99 (ms)": percentiles[98] * 1000,
+    }
+
+
+def main() -> None:
+    """Run benchmark and print measurements per corpus size."""
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument("--files", type=int, nargs="+", default=[10, 100, 1000])
+    argparser.add_argument("--links", type=int, default=10)
+    argparser.add_argument("--url-pool", type=int, default=2000)
+    argparser.add_argument("--latency", type=float, default=0.02)
+    argparser.add_argument("--error-rate", type=float, default=0.0)
+    argparser.add_argument("--throttle-rate", type=float, default=0.0)
+    argparser.add_argument("--backend", choices=BACKENDS, default="available")
+    argparser.add_argument("--max-in-flight", type=int, default=50)
+    argparser.add_argument("--rate", type=float, default=1000.0)
+    argparser.add_argument("--jobs", type=int, default=1)
+    args = argparser.parse_args()
+    columns: tuple[str, ...] = (
+        "files",
+        "files/s",
+        "requests/s",
+        "peak RSS (MB)",
+        "p50 (ms)",
+        "p99 (ms)",
+    )
+    print(*(f"{column:>14}" for column in columns))
+    for files in args.files:
+        with ProcessPoolExecutor(
+            1, mp_context=multiprocessing.get_context("spawn")
+        ) as pool:
+            result: dict[str, Any] = pool.submit(run_corpus, args, files).result()
+        print(
+            *(
+                (
+                    f"{result[column]:>14}"
+                    if column == "files"
+                    else f"{result[column]:>14.1f}"
+                )
+                for column in columns
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
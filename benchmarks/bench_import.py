@@ -0,0 +1,87 @@
+"""Benchmark startup time of the command line interface.
+
+Runs fresh interpreters that import archive_md_urls.cli, run `archive-md-urls --help`
+or import one of the dependencies, and reports the median wall time and the
+total import time reported by `python -X importtime`. Lists the modules whose own
+import took longest, to find dependencies that should be imported lazily.
+
+Usage:
+    python benchmarks/bench_import.py [--repeat 5] [--top 10]
+"""
+
+import argparse
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+# Code run by each interpreter, by name
+COMMANDS: dict[str, str] = {
+    "cli": "import archive_md_urls.cli",
+    "--help": "import sys; sys.argv = ['archive-md-urls', '--help'];"
+    + " from archive_md_urls.cli import main; main()",
+    "httpx": "import httpx",
+    "tenacity": "import tenacity",
+    "markdown": "import markdown",
+    "bs4": "import bs4",
+    "dateutil": "import dateutil.parser",
+}
+# Lines of -X importtime: 'import time: self [us] | cumulative [us] | module'
+IMPORT_TIME_RE = re.compile(r"^import time:\s*(\d+) \|\s*(\d+) \| (\s*)(\S+)$")
+
+
+def run(code: str) -> tuple[float, list[tuple[int, int, str]]]:
+    """Run code in a fresh interpreter.
+
+    Args:
+        code (str): Python code to run
+
+    Returns:
+        tuple[float, list[tuple[int, int, str]]]: Wall time in seconds, and for each
+                                                  imported module its own and
+                                                  cumulative import time in
+                                                  microseconds (cumulative only for
+                                                  top-level imports, 0 otherwise)
+    """
+    start: float = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    elapsed: float = time.perf_counter() - start
+    imports: list[tuple[int, int, str]] = []
+    for line in result.stderr.splitlines():
+        if match := IMPORT_TIME_RE.match(line):
+            cumulative: int = 0 if match[3] else int(match[2])
+            imports.append((int(match[1]), cumulative, match[4]))
+    return elapsed, imports
+
+
+def main() -> None:
+    """Run benchmark and print measurements per command."""
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument("--repeat", type=int, default=5)
+    argparser.add_argument("--top", type=int, default=10)
+    args = argparser.parse_args()
+    columns: tuple[str, ...] = ("command", "wall (ms)", "imports (ms)")
+    print(*(f"{column:>14}" for column in columns))
+    for name, code in COMMANDS.items():
+        runs: list[tuple[float, list[tuple[int, int, str]]]] = [
+            run(code) for _ in range(args.repeat)
+        ]
+        wall: float = statistics.median(elapsed for elapsed, _ in runs)
+        imports: float = statistics.median(
+            sum(cumulative for _, cumulative, _ in imported) for _, imported in runs
+        )
+        print(f"{name:>14}", f"{wall * 1000:>14.1f}", f"{imports / 1000:>14.1f}")
+    print(f"\nSlowest modules imported by {COMMANDS['cli']!r}:")
+    slowest: list[tuple[int, int, str]] = sorted(run(COMMANDS["cli"])[1])[::-1]
+    for own, _, module in slowest[: args.top]:
+        print(f"{own / 1000:>10.1f} ms  {module}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Benchmark updating very large Markdown files against a local fake Wayback Machine.
+
+Generates a single Markdown file of the given size with links drawn from a pool of
+URLs, and updates a copy of it with update_files once reading the whole file into
+memory and once block by block (large_file_threshold). Each mode runs in a fresh
+process, so that peak RSS is measured per mode. No network access is needed.
+
+Usage:
+    python benchmarks/bench_large_files.py [--size 100] [--url-pool 500]
+        [--link-every 4]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import multiprocessing
+import random
+import resource
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any
+
+from archive_md_urls.fake_wayback import FakeWayback
+from archive_md_urls.gather_snapshots import create_client
+from archive_md_urls.ratelimit import RateLimiter
+from archive_md_urls.update_files import update_files
+
+# Large file threshold of each mode, None reads files into memory at once
+MODES: dict[str, int | None] = {"whole": None, "blocks": 0}
+
+
+def generate_file(file: Path, size: int, url_pool: int, link_every: int) -> int:
+    """Write Markdown file with a date and links, paragraph by paragraph.
+
+    Args:
+        file (Path): File to write
+        size (int): Approximate size of the file in bytes
+        url_pool (int): Number of distinct URLs that links are drawn from
+        link_every (int): One in this many paragraphs contains a link
+
+    Returns:
+        int: Number of links in the file
+    """
+    file_random = random.Random(size)
+    links: int = 0
+    written: int = 0
+    with file.open("w", encoding="utf-8") as md_file:
+        written += md_file.write("Title: Large post\nDate: 2014-04-28\n\n")
+        paragraph: int = 0
+        while written < size:
+            text: str = (
+                f"Paragraph {paragraph} is a sentence of ordinary length, followed by "
+                + "some more text to make it realistic"
+            )
+            if paragraph % link_every == 0:
+                url: str = (
+                    f"https://site{file_random.randrange(url_pool)}.example.com/"
+                    + f"page/{file_random.randrange(10)}"
+                )
+                text += f" and [a link]({url})"
+                links += 1
+            text += "."
+            if paragraph % 1000 == 0:
+                # Links in code blocks are left alone
+                text += "\n\n```\n[not a link](https://example.com/code)\n\n```"
+            written += md_file.write(text + "\n\n")
+            paragraph += 1
+    return links
+
+
+def run_mode(source: Path, mode: str) -> dict[str, Any]:
+    """Update a copy of the generated file, meant to run in a fresh process.
+
+    Args:
+        source (Path): Generated Markdown file
+        mode (str): Name of the mode, one of MODES
+
+    Returns:
+        dict[str, Any]: Measurements of the run
+    """
+    with tempfile.TemporaryDirectory(dir=source.parent) as tmp_dir:
+        file = Path(shutil.copy(source, tmp_dir))
+        fake = FakeWayback(missing_rate=0.0)
+
+        async def run() -> None:
+            async with create_client(transport=fake.transport()) as client:
+                await update_files(
+                    [file],
+                    client=client,
+                    limiter=RateLimiter(50, 1000.0),
+                    large_file_threshold=MODES[mode],
+                )
+
+        start: float = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            asyncio.run(run())
+        elapsed: float = time.perf_counter() - start
+        size: int = file.stat().st_size
+    return {
+        "mode": mode,
+        "MB/s": source.stat().st_size / 1024 / 1024 / elapsed,
+        "seconds": elapsed,
+        # ru_maxrss is given in kilobytes on Linux
+        "peak RSS (MB)": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "output (MB)": size / 1024 / 1024,
+    }
+
+
+def main() -> None:
+    """Run benchmark and print measurements per mode."""
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument("--size", type=float, default=100.0, help="MiB")
+    argparser.add_argument("--url-pool", type=int, default=500)
+    argparser.add_argument("--link-every", type=int, default=4)
+    argparser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    args = argparser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        source = Path(tmp_dir, "2014-04-28-large.md")
+        links: int = generate_file(
+            source, int(args.size * 1024 * 1024), args.url_pool, args.link_every
+        )
+        print(f"{source.stat().st_size / 1024 / 1024:.1f} MiB, {links} links")
+        columns: tuple[str, ...] = (
+            "mode",
+            "MB/s",
+            "seconds",
+            "peak RSS (MB)",
+            "output (MB)",
+        )
+        print(*(f"{column:>14}" for column in columns))
+        for mode in args.modes:
+            with ProcessPoolExecutor(
+                1, mp_context=multiprocessing.get_context("spawn")
+            ) as pool:
+                result: dict[str, Any] = pool.submit(run_mode, source, mode).result()
+            print(
+                *(
+                    (
+                        f"{result[column]:>14}"
+                        if column == "mode"
+                        else f"{result[column]:>14.1f}"
+                    )
+                    for column in columns
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
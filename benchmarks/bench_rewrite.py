@@ -0,0 +1,72 @@
+"""Benchmark replacing URLs in Markdown documents with thousands of links.
+
+Compares update_md_source, which replaces links at their positions in a single pass,
+with the previous approach of running one re.sub over the whole document per URL.
+
+Usage:
+    python benchmarks/bench_rewrite.py [--links 500 1000 2000] [--repeat 3]
+"""
+
+import argparse
+import re
+import timeit
+
+from archive_md_urls.linkscan import scan_links
+from archive_md_urls.update_files import update_md_source
+
+
+def build_document(links: int) -> tuple[str, dict[str, str | None]]:
+    """Build Markdown document with unique links and a snapshot for each of them.
+
+    Args:
+        links (int): Number of links in the document
+
+    Returns:
+        tuple[str, dict[str, str | None]]: Markdown source and URL-snapshot pairs
+    """
+    paragraphs: list[str] = []
+    wayback_urls: dict[str, str | None] = {}
+    for i in range(links):
+        url: str = f"https://example{i % 997}.com/post/{i}?page={i % 7}"
+        paragraphs.append(
+            f"Paragraph {i} links to [a post]({url}) in a sentence of ordinary "
+            + "length, followed by some more text to make it realistic."
+        )
+        wayback_urls[url] = f"http://web.archive.org/web/20140428170257/{url}"
+    return "\n\n".join(paragraphs), wayback_urls
+
+
+def update_md_source_re_sub(md_source: str, wayback_urls: dict[str, str | None]) -> str:
+    """Replace URLs with one re.sub per URL, as done before single-pass rewriting."""
+    for url, snapshot in wayback_urls.items():
+        if snapshot:
+            md_source = re.sub(rf"(?<=\(){re.escape(url)}(?=\))", snapshot, md_source)
+    return md_source
+
+
+def main() -> None:
+    """Run benchmark and print timings per document size."""
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument("--links", type=int, nargs="+", default=[500, 1000, 2000])
+    argparser.add_argument("--repeat", type=int, default=3)
+    args = argparser.parse_args()
+    print(f"{'links':>8} {'re.sub (s)':>12} {'offsets (s)':>12} {'+ scan (s)':>12}")
+    for links in args.links:
+        md_source, wayback_urls = build_document(links)
+        scanned = scan_links(md_source)
+        assert update_md_source(md_source, wayback_urls) == update_md_source_re_sub(
+            md_source, wayback_urls
+        )
+        timings: list[float] = [
+            min(timeit.repeat(statement, number=1, repeat=args.repeat))
+            for statement in (
+                lambda: update_md_source_re_sub(md_source, wayback_urls),
+                lambda: update_md_source(md_source, wayback_urls, scanned),
+                lambda: update_md_source(md_source, wayback_urls),
+            )
+        ]
+        print(f"{links:>8}", *(f"{timing:>12.4f}" for timing in timings))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Benchmark filtering stable URLs with a growing number of rules.
+
+Compares StableMatcher with the previous approach of checking every entry of
+STABLE_URLS (plus additional host prefixes, like a large internal allowlist) as a
+substring of every URL.
+
+Usage:
+    python benchmarks/bench_stable.py [--rules 0 100 1000] [--urls 10000] [--repeat 3]
+"""
+
+import argparse
+import timeit
+
+from archive_md_urls.scan_md import STABLE_URLS
+from archive_md_urls.stable import StableMatcher, StableRule
+
+
+def main() -> None:
+    """Run benchmark and print timings per number of additional rules."""
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument("--rules", type=int, nargs="+", default=[0, 100, 1000])
+    argparser.add_argument("--urls", type=int, default=10_000)
+    argparser.add_argument("--repeat", type=int, default=3)
+    args = argparser.parse_args()
+    urls: list[str] = [
+        f"https://www.example{i % 997}.com/blog/{i}/a-post-title?page={i % 7}"
+        for i in range(args.urls)
+    ]
+    print(f"{'rules':>8} {'any() (s)':>12} {'matcher (s)':>12}")
+    for extra_rules in args.rules:
+        stable_urls: tuple[str, ...] = STABLE_URLS + tuple(
+            f"https://intranet{i}.example.org/" for i in range(extra_rules)
+        )
+        matcher = StableMatcher(StableRule("substring", url) for url in stable_urls)
+        timings: list[float] = [
+            min(timeit.repeat(statement, number=1, repeat=args.repeat))
+            for statement in (
+                lambda: [any(stable in url for stable in stable_urls) for url in urls],
+                lambda: [matcher.match(url) for url in urls],
+            )
+        ]
+        print(f"{len(stable_urls):>8}", *(f"{timing:>12.4f}" for timing in timings))
+
+
+if __name__ == "__main__":
+    main()
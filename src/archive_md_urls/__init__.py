@@ -0,0 +1,5 @@
+"""Turn URLs in Markdown files into archive.org snapshots."""
+
+from archive_md_urls.archiver import Archiver
+
+__all__ = ["Archiver"]
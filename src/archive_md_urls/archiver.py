@@ -0,0 +1,276 @@
+"""Reusable session for embedding archive-md-urls in asyncio applications.
+
+An Archiver owns everything that is expensive to set up or worth keeping warm
+between calls: the HTTPX client with its connection pool, the snapshot cache, the
+rate limiter (and what it learned about throttling), the snapshot backend, the
+compiled rules for stable URLs, the results of liveness checks and the stats of all
+calls. Long-running
+applications create one Archiver and use it for every request:
+
+    async with Archiver(cache=SnapshotCache(default_cache_path())) as archiver:
+        updated_md_source = await archiver.process_text(md_source, "2014-04-28")
+        await archiver.process_files(files)
+        async for result in archiver.iter_files(files):
+            ...
+"""
+
+import asyncio
+import contextvars
+from collections.abc import AsyncIterator, Iterable
+from pathlib import Path
+from types import TracebackType
+from typing import TYPE_CHECKING, Any
+
+from archive_md_urls.cache import SnapshotCache
+from archive_md_urls.gather_snapshots import (
+    MAX_CONNECTIONS,
+    MAX_KEEPALIVE_CONNECTIONS,
+    AvailableBackend,
+    SnapshotBackend,
+    create_client,
+    gather_snapshots,
+)
+from archive_md_urls.liveness import ALIVE, gather_liveness
+from archive_md_urls.ratelimit import RateLimiter
+from archive_md_urls.save_page_now import SavePageNow
+from archive_md_urls.scan_md import bucket_timestamp, format_date, scan_md
+from archive_md_urls.stable import StableMatcher
+from archive_md_urls.stats import Stats, active_stats
+from archive_md_urls.update_files import (
+    QUEUE_SIZE,
+    FileResult,
+    update_files,
+    update_md_source,
+)
+
+if TYPE_CHECKING:
+    import httpx
+
+
+class Archiver:
+    """Turn URLs in Markdown text and files into snapshots, reusing state across calls.
+
+    If no client is provided, one is created when entering the Archiver (with the
+    given connection limits and transport) and closed when leaving it. A provided
+    client or cache is never closed by the Archiver.
+
+    Args:
+        client (httpx.AsyncClient | None): HTTPX AsyncClient shared by all API calls
+        cache (SnapshotCache | None): Persistent cache for lookup results
+        limiter (RateLimiter | None): Limits concurrency and rate of API calls
+        backend (SnapshotBackend | None): Backend used for snapshot lookups
+        matcher (StableMatcher | None): Rules for stable URLs, STABLE_URLS if None
+        engine (str): Engine used to extract URLs from Markdown, one of ENGINES
+        granularity (str): Precision of lookup timestamps, one of GRANULARITIES
+        stats (Stats | None): Collects counters, stage times and API latencies of
+                              all calls
+        max_connections (int): Maximum number of concurrent connections of a client
+                               created by the Archiver
+        max_keepalive_connections (int): Maximum number of idle connections kept
+                                         alive by a client created by the Archiver
+        http2 (bool): Use HTTP/2 for a client created by the Archiver
+        transport (httpx.AsyncBaseTransport | None): Transport of a client created by
+                                                     the Archiver
+        check_liveness (bool): Only look up URLs that are no longer alive
+        liveness_limiter (RateLimiter | None): Limits concurrency and rate of liveness
+                                               checks
+        saver (SavePageNow | None): Worker archiving URLs without snapshot, started
+                                    when entering the Archiver and stopped when
+                                    leaving it
+    """
+
+    def __init__(
+        self,
+        client: "httpx.AsyncClient | None" = None,
+        cache: SnapshotCache | None = None,
+        limiter: RateLimiter | None = None,
+        backend: SnapshotBackend | None = None,
+        matcher: StableMatcher | None = None,
+        engine: str = "tokenizer",
+        granularity: str = "minute",
+        stats: Stats | None = None,
+        max_connections: int = MAX_CONNECTIONS,
+        max_keepalive_connections: int = MAX_KEEPALIVE_CONNECTIONS,
+        http2: bool = False,
+        transport: "httpx.AsyncBaseTransport | None" = None,
+        check_liveness: bool = False,
+        liveness_limiter: RateLimiter | None = None,
+        saver: SavePageNow | None = None,
+    ) -> None:
+        self.client: httpx.AsyncClient | None = client
+        self.owns_client: bool = client is None
+        self.cache: SnapshotCache | None = cache
+        self.limiter: RateLimiter = limiter or RateLimiter()
+        self.backend: SnapshotBackend = backend or AvailableBackend()
+        self.matcher: StableMatcher | None = matcher
+        self.engine: str = engine
+        self.granularity: str = granularity
+        self.stats: Stats = stats or Stats()
+        self.check_liveness: bool = check_liveness
+        self.liveness_limiter: RateLimiter = liveness_limiter or RateLimiter()
+        self.saver: SavePageNow | None = saver
+        self.client_options: dict[str, Any] = {
+            "max_connections": max_connections,
+            "max_keepalive_connections": max_keepalive_connections,
+            "http2": http2,
+            "transport": transport,
+        }
+
+    async def __aenter__(self) -> "Archiver":
+        if self.client is None:
+            self.client = create_client(**self.client_options)
+        if self.saver is not None:
+            self.saver.start(self.client, self.stats, self.backend)
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        """Stop Save Page Now worker, close the client if the Archiver created it."""
+        if self.saver is not None:
+            await self.saver.stop()
+        if self.owns_client and self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def get_client(self) -> "httpx.AsyncClient":
+        """Return client, raise error if the Archiver wasn't entered.
+
+        Raises:
+            RuntimeError: Archiver was used outside of 'async with'
+
+        Returns:
+            httpx.AsyncClient: HTTPX AsyncClient shared by all API calls
+        """
+        if self.client is None:
+            raise RuntimeError("Archiver must be used with 'async with'")
+        return self.client
+
+    async def process_text(
+        self,
+        md_source: str,
+        date: str | None = None,
+        failures: dict[str, str] | None = None,
+    ) -> str:
+        """Replace URLs in Markdown text with snapshots.
+
+        Args:
+            md_source (str): Markdown text
+            date (str | None): Date of the text in any format understood by
+                               format_date, read from the text's metadata if None
+            failures (dict[str, str] | None): Collects URLs that couldn't be looked
+                                              up and the reason why
+
+        Returns:
+            str: Markdown text with updated URLs
+        """
+        client: httpx.AsyncClient = self.get_client()
+        if failures is None:
+            failures = {}
+        token: contextvars.Token[Stats | None] = active_stats.set(self.stats)
+        try:
+            stable: dict[str, str] = {}
+            with self.stats.timer("scan"):
+                timestamp, urls = scan_md(
+                    md_source, Path(), self.engine, stable, self.matcher
+                )
+            if date is not None:
+                timestamp = format_date(date)
+            timestamp = bucket_timestamp(timestamp, self.granularity)
+            if self.check_liveness:
+                with self.stats.timer("liveness"):
+                    liveness: dict[str, str] = await gather_liveness(
+                        urls, timestamp, client, None, self.cache, self.liveness_limiter
+                    )
+                urls = [url for url in urls if liveness[url] != ALIVE]
+                self.stats.count("alive", len(liveness) - len(urls))
+            with self.stats.timer("lookup"):
+                wayback_urls: dict[str, str | None] = await gather_snapshots(
+                    urls,
+                    timestamp,
+                    client,
+                    None,
+                    self.cache,
+                    self.limiter,
+                    self.backend,
+                    failures,
+                )
+            with self.stats.timer("rewrite"):
+                updated_md_source: str = update_md_source(md_source, wayback_urls)
+        finally:
+            active_stats.reset(token)
+        self.stats.count("urls", len(urls))
+        self.stats.count("stable", len(stable))
+        self.stats.count(
+            "changed_urls", len([item for item in wayback_urls.values() if item])
+        )
+        if self.saver is not None:
+            for url, snapshot in wayback_urls.items():
+                if snapshot is None and url not in failures:
+                    self.saver.submit(url)
+        return updated_md_source
+
+    async def process_files(self, files: Iterable[Path], **options: Any) -> None:
+        """Replace URLs in Markdown files with snapshots.
+
+        Args:
+            files (Iterable[Path]): Markdown files to update
+            **options (Any): Further arguments of update_files, e.g. journal,
+                             manifest, report or dry_run
+        """
+        await update_files(
+            files,
+            client=self.get_client(),
+            cache=self.cache,
+            limiter=self.limiter,
+            backend=self.backend,
+            engine=self.engine,
+            matcher=self.matcher,
+            granularity=self.granularity,
+            stats=self.stats,
+            check_liveness=self.check_liveness,
+            liveness_limiter=self.liveness_limiter,
+            saver=self.saver,
+            **{"print_summary": False, **options},
+        )
+
+    async def iter_files(
+        self, files: Iterable[Path], **options: Any
+    ) -> AsyncIterator[FileResult]:
+        """Replace URLs in Markdown files with snapshots, yielding each file once done.
+
+        Args:
+            files (Iterable[Path]): Markdown files to update
+            **options (Any): Further arguments of update_files, e.g. journal,
+                             manifest, report or dry_run
+
+        Yields:
+            FileResult: Outcome of the next file that is done
+        """
+        results: asyncio.Queue[FileResult | None] = asyncio.Queue(QUEUE_SIZE)
+
+        async def produce() -> None:
+            try:
+                await self.process_files(files, results=results, **options)
+            except Exception:
+                # Stop the iteration even if the run failed before its results were
+                # closed, the error is raised when awaiting the task
+                await results.put(None)
+                raise
+
+        task: asyncio.Task[None] = asyncio.create_task(produce())
+        try:
+            while (result := await results.get()) is not None:
+                yield result
+            await task
+        finally:
+            # Stop processing if the consumer stopped iterating early
+            if not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
@@ -0,0 +1,234 @@
+"""Persistent cache for Wayback Machine snapshot lookups.
+
+Results of API calls are stored in a local SQLite database, keyed by URL and
+timestamp, so that repeated runs over the same files don't have to call the API
+again. Lookups that found a snapshot and lookups that didn't expire after separate
+periods of time, and the least recently used entries are evicted once the cache
+grows beyond its maximum size. Eviction runs when the cache is opened and closed, and
+every EVICT_INTERVAL stored lookups, so that long-running processes like watchers
+don't grow the cache without bounds.
+
+Results of liveness checks of linked pages are stored in a separate table with their
+own expiry, as pages die much sooner than snapshots disappear.
+
+Every stored result is committed right away, and the database uses write-ahead
+logging, so that several runs (e.g. a watching run and a pre-commit hook) can share
+the cache without locking each other out. Only the access times of cache hits, which
+just decide the order of eviction, are written in batches of ACCESS_BATCH.
+"""
+
+import os
+import sqlite3
+import time
+from pathlib import Path
+from types import TracebackType
+
+# Seconds after which cached lookups expire, depending on whether a snapshot was found
+POSITIVE_TTL: int = 30 * 24 * 60 * 60
+NEGATIVE_TTL: int = 24 * 60 * 60
+# Seconds after which cached liveness checks expire
+LIVENESS_TTL: int = 7 * 24 * 60 * 60
+# Maximum number of cached lookups
+MAX_ENTRIES: int = 100_000
+# Number of stored lookups after which the cache is evicted again
+EVICT_INTERVAL: int = 1000
+# Number of cache hits whose access times are written at once
+ACCESS_BATCH: int = 1000
+# Seconds to wait for another process writing to the database
+BUSY_TIMEOUT: float = 30.0
+
+
+def default_cache_path() -> Path:
+    """Return default location of the cache database in the user's cache directory.
+
+    Returns:
+        Path: Path to cache database
+    """
+    cache_home: str = os.environ.get("XDG_CACHE_HOME") or str(Path.home() / ".cache")
+    return Path(cache_home, "archive-md-urls", "snapshots.sqlite")
+
+
+class SnapshotCache:
+    """SQLite cache for URL-snapshot pairs with TTL and LRU eviction.
+
+    Args:
+        path (Path): Location of the cache database, created if it doesn't exist
+        positive_ttl (float): Seconds until a lookup that found a snapshot expires
+        negative_ttl (float): Seconds until a lookup without snapshot expires
+        max_entries (int): Maximum number of lookups kept in the cache
+        liveness_ttl (float): Seconds until a liveness check expires
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        positive_ttl: float = POSITIVE_TTL,
+        negative_ttl: float = NEGATIVE_TTL,
+        max_entries: int = MAX_ENTRIES,
+        liveness_ttl: float = LIVENESS_TTL,
+    ) -> None:
+        self.positive_ttl: float = positive_ttl
+        self.negative_ttl: float = negative_ttl
+        self.max_entries: int = max_entries
+        self.liveness_ttl: float = liveness_ttl
+        self.hits: int = 0
+        self.misses: int = 0
+        self.inserts: int = 0
+        # Access times of cache hits not written to the database yet
+        self.accessed: dict[tuple[str, str], float] = {}
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        # With write-ahead logging, commits are durable without syncing each of them
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS snapshots (url TEXT NOT NULL, "
+            + "timestamp TEXT NOT NULL, snapshot TEXT, created REAL NOT NULL, "
+            + "accessed REAL NOT NULL, PRIMARY KEY (url, timestamp))"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS snapshots_accessed ON snapshots (accessed)"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS liveness (url TEXT NOT NULL, "
+            + "timestamp TEXT NOT NULL, state TEXT NOT NULL, created REAL NOT NULL, "
+            + "PRIMARY KEY (url, timestamp))"
+        )
+        self.evict()
+
+    def __enter__(self) -> "SnapshotCache":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    def get(self, url: str, timestamp: str | None) -> tuple[bool, str | None]:
+        """Return cached snapshot for URL and timestamp.
+
+        Args:
+            url (str): URL to be searched in the Wayback Machine
+            timestamp (str | None): Timestamp of the lookup
+
+        Returns:
+            tuple[bool, str | None]: Whether an unexpired lookup was cached and its
+                                     snapshot URL, if any was found
+        """
+        row: tuple[str | None, float] | None = self.connection.execute(
+            "SELECT snapshot, created FROM snapshots WHERE url = ? AND timestamp = ?",
+            (url, timestamp or ""),
+        ).fetchone()
+        now: float = time.time()
+        if row is None or now - row[1] > self._ttl(row[0]):
+            self.misses += 1
+            return False, None
+        self.accessed[url, timestamp or ""] = now
+        if len(self.accessed) >= ACCESS_BATCH:
+            self.flush()
+        self.hits += 1
+        return True, row[0]
+
+    def set(self, url: str, timestamp: str | None, snapshot: str | None) -> None:
+        """Store result of a lookup.
+
+        Args:
+            url (str): URL searched in the Wayback Machine
+            timestamp (str | None): Timestamp of the lookup
+            snapshot (str | None): URL of the snapshot, None if none was found
+        """
+        now: float = time.time()
+        self.connection.execute(
+            "INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?)",
+            (url, timestamp or "", snapshot, now, now),
+        )
+        self.connection.commit()
+        self.inserts += 1
+        if self.inserts % EVICT_INTERVAL == 0:
+            self.evict()
+
+    def forget_missing(self, url: str) -> None:
+        """Remove lookups of URL that found no snapshot, e.g. once it was archived.
+
+        Args:
+            url (str): URL searched in the Wayback Machine
+        """
+        self.connection.execute(
+            "DELETE FROM snapshots WHERE url = ? AND snapshot IS NULL", (url,)
+        )
+        self.connection.commit()
+
+    def get_liveness(self, url: str, timestamp: str | None) -> str | None:
+        """Return cached state of a liveness check.
+
+        Args:
+            url (str): Checked URL
+            timestamp (str | None): Timestamp of the post linking to URL
+
+        Returns:
+            str | None: State of the URL, None if no unexpired check was cached
+        """
+        row: tuple[str] | None = self.connection.execute(
+            "SELECT state FROM liveness WHERE url = ? AND timestamp = ? "
+            + "AND created >= ?",
+            (url, timestamp or "", time.time() - self.liveness_ttl),
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def set_liveness(self, url: str, timestamp: str | None, state: str) -> None:
+        """Store result of a liveness check.
+
+        Args:
+            url (str): Checked URL
+            timestamp (str | None): Timestamp of the post linking to URL
+            state (str): State of the URL
+        """
+        self.connection.execute(
+            "INSERT OR REPLACE INTO liveness VALUES (?, ?, ?, ?)",
+            (url, timestamp or "", state, time.time()),
+        )
+        self.connection.commit()
+
+    def flush(self) -> None:
+        """Write access times of cache hits to the database."""
+        self.connection.executemany(
+            "UPDATE snapshots SET accessed = MAX(accessed, ?) "
+            + "WHERE url = ? AND timestamp = ?",
+            (
+                (accessed, url, timestamp)
+                for (url, timestamp), accessed in self.accessed.items()
+            ),
+        )
+        self.connection.commit()
+        self.accessed.clear()
+
+    def evict(self) -> None:
+        """Remove expired entries and least recently used lookups beyond max_entries."""
+        # Eviction depends on up-to-date access times
+        self.flush()
+        now: float = time.time()
+        self.connection.execute(
+            "DELETE FROM liveness WHERE created < ?", (now - self.liveness_ttl,)
+        )
+        self.connection.execute(
+            "DELETE FROM snapshots WHERE (snapshot IS NOT NULL AND created < ?) "
+            + "OR (snapshot IS NULL AND created < ?)",
+            (now - self.positive_ttl, now - self.negative_ttl),
+        )
+        self.connection.execute(
+            "DELETE FROM snapshots WHERE rowid IN (SELECT rowid FROM snapshots "
+            + "ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+        self.connection.commit()
+
+    def close(self) -> None:
+        """Evict old lookups and close the database."""
+        self.evict()
+        self.connection.close()
+
+    def _ttl(self, snapshot: str | None) -> float:
+        return self.positive_ttl if snapshot else self.negative_ttl
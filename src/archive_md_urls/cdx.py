@@ -0,0 +1,166 @@
+"""Look up snapshots with the Wayback Machine CDX server.
+
+Instead of asking the availability API for the snapshot closest to each timestamp,
+CDXBackend fetches the list of captures of a URL once and finds the capture closest
+to any requested timestamp locally. A URL linked in many files with different dates
+therefore only costs a single API call. Capture lists are kept for a limited time and
+number of URLs, so that long-running processes neither grow without bound nor miss
+new captures.
+"""
+
+import asyncio
+import bisect
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import TYPE_CHECKING
+from urllib.parse import quote
+
+from archive_md_urls.gather_snapshots import SnapshotBackend, call_api
+from archive_md_urls.ratelimit import RateLimiter
+
+if TYPE_CHECKING:
+    import httpx
+
+# Fills up shortened timestamps (e.g. YYYYMMDD) to YYYYMMDDhhmmss
+TIMESTAMP_PADDING: str = "00000101000000"
+# Number of URLs whose capture lists are kept, and seconds they are kept for
+MAX_CAPTURES: int = 10_000
+CAPTURES_TTL: float = 60.0 * 60
+
+
+def build_cdx_call(url: str) -> str:
+    """Return call to the CDX server listing all successful captures of a URL.
+
+    Captures are collapsed to at most one per day, which keeps responses small for
+    frequently archived URLs.
+
+    Args:
+        url (str): URL to be searched in the Wayback Machine
+
+    Returns:
+        str: Valid CDX server call
+    """
+    return (
+        f"https://web.archive.org/cdx/search/cdx?url={quote(url, safe=':/')}"
+        + "&output=json&fl=timestamp,original&filter=statuscode:200"
+        + "&collapse=timestamp:8"
+    )
+
+
+def parse_timestamp(timestamp: str) -> datetime:
+    """Parse full or shortened Wayback Machine timestamp.
+
+    Args:
+        timestamp (str): Timestamp with at least four digits (YYYY[MMDDhhmmss])
+
+    Returns:
+        datetime: Parsed timestamp
+    """
+    return datetime.strptime(
+        timestamp[:14] + TIMESTAMP_PADDING[len(timestamp) :], "%Y%m%d%H%M%S"
+    )
+
+
+def get_nearest(captures: list[tuple[str, str]], timestamp: str | None) -> str | None:
+    """Get URL of the capture closest to timestamp.
+
+    Args:
+        captures (list[tuple[str, str]]): Timestamp and original URL of captures,
+                                          sorted by timestamp
+        timestamp (str | None): Timestamp of desired snapshot, latest if None
+
+    Returns:
+        str | None: URL of Wayback Machine snapshot, if any capture exists
+    """
+    if not captures:
+        return None
+    if timestamp:
+        try:
+            requested: datetime = parse_timestamp(timestamp)
+        except ValueError:
+            requested = datetime.max
+        # Candidates are the captures right before and after the requested timestamp
+        index: int = bisect.bisect_left(captures, (requested.strftime("%Y%m%d%H%M%S"),))
+        capture: tuple[str, str] = min(
+            captures[max(index - 1, 0) : index + 1],
+            key=lambda capture: abs(parse_timestamp(capture[0]) - requested),
+        )
+    else:
+        capture = captures[-1]
+    return f"http://web.archive.org/web/{capture[0]}/{capture[1]}"
+
+
+class CDXBackend(SnapshotBackend):
+    """Look up snapshots from capture lists fetched once per URL.
+
+    Args:
+        max_captures (int): Number of URLs whose capture lists are kept, least
+                            recently used ones are dropped first
+        ttl (float): Seconds after which capture lists are fetched again
+    """
+
+    def __init__(
+        self, max_captures: int = MAX_CAPTURES, ttl: float = CAPTURES_TTL
+    ) -> None:
+        self.max_captures: int = max_captures
+        self.ttl: float = ttl
+        # Fetch of the capture list of each URL, and when it was started
+        self.captures: OrderedDict[
+            str, tuple[float, asyncio.Task[list[tuple[str, str]]]]
+        ] = OrderedDict()
+
+    async def lookup(
+        self,
+        client: "httpx.AsyncClient",
+        url: str,
+        timestamp: str | None = None,
+        limiter: RateLimiter | None = None,
+    ) -> str | None:
+        now: float = time.monotonic()
+        entry: tuple[float, asyncio.Task[list[tuple[str, str]]]] | None = (
+            self.captures.get(url)
+        )
+        if entry is None or entry[0] + self.ttl < now:
+            entry = (
+                now,
+                asyncio.create_task(self.fetch_captures(client, url, limiter)),
+            )
+            self.captures[url] = entry
+            while len(self.captures) > self.max_captures:
+                self.captures.popitem(last=False)
+        self.captures.move_to_end(url)
+        try:
+            captures: list[tuple[str, str]] = await entry[1]
+        except BaseException:
+            # Failed fetches are retried by the next lookup
+            if self.captures.get(url) is entry:
+                del self.captures[url]
+            raise
+        return get_nearest(captures, timestamp)
+
+    def forget(self, url: str) -> None:
+        self.captures.pop(url, None)
+
+    async def fetch_captures(
+        self,
+        client: "httpx.AsyncClient",
+        url: str,
+        limiter: RateLimiter | None = None,
+    ) -> list[tuple[str, str]]:
+        """Fetch timestamps and original URLs of all captures of a URL.
+
+        Args:
+            client (httpx.AsyncClient): HTTPX AsyncClient to make API calls
+            url (str): URL to be searched in the Wayback Machine
+            limiter (RateLimiter | None): Limits concurrency and rate of API calls
+
+        Returns:
+            list[tuple[str, str]]: Timestamp and original URL of captures, sorted by
+                                   timestamp
+        """
+        rows: list[list[str]] = (
+            await call_api(client, build_cdx_call(url), limiter) or []
+        )
+        # The first row contains the field names
+        return sorted((row[0], row[1]) for row in rows[1:])
@@ -2,17 +2,63 @@
 
 import argparse
 import asyncio
+import contextlib
+import itertools
+import os
+import re
 import sys
+from collections.abc import Iterable, Iterator
 from pathlib import Path
 
-from archive_md_urls.update_files import update_files
+from archive_md_urls.archiver import Archiver
+from archive_md_urls.cache import LIVENESS_TTL, SnapshotCache, default_cache_path
+from archive_md_urls.cdx import CDXBackend
+from archive_md_urls.discover import MARKDOWN_GLOB, iter_md_files
+from archive_md_urls.gather_snapshots import (
+    MAX_CONNECTIONS,
+    MAX_KEEPALIVE_CONNECTIONS,
+    AvailableBackend,
+    SnapshotBackend,
+)
+from archive_md_urls.journal import JOURNAL_PATH, Journal, JournalInUseError
+from archive_md_urls.manifest import MANIFEST_PATH, Manifest
+from archive_md_urls.ratelimit import MAX_IN_FLIGHT, RATE, RateLimiter
+from archive_md_urls.report import Report
+from archive_md_urls.save_page_now import (
+    CREDENTIALS_ENV,
+    SAVE_QUEUE_PATH,
+    WAIT,
+    SavePageNow,
+    SaveQueue,
+)
+from archive_md_urls.scan_md import ENGINES, GRANULARITIES, STABLE_MATCHER
+from archive_md_urls.stable import StableMatcher, StableRule, load_stable_rules
+from archive_md_urls.stats import Stats, profile
+from archive_md_urls.update_files import (
+    LARGE_FILE_THRESHOLD,
+    LOOKUP_WORKERS,
+    SCAN_WORKERS,
+    WRITE_WORKERS,
+)
+from archive_md_urls.watch import DEBOUNCE, Watcher
+
+NO_FILES_FOUND: str = (
+    "Couldn't find any Markdown files. Do you use the file ending .md for "
+    + "your Markdown files? If yes, you could try to search directories "
+    + "recursively using the -r flag (see help)."
+)
+# Backends available for snapshot lookups
+BACKENDS: dict[str, type[SnapshotBackend]] = {
+    "available": AvailableBackend,
+    "cdx": CDXBackend,
+}
 
 
 def get_md_files(items: list[Path], recursive: bool) -> list[Path]:
     """Scan files and directories and create a list of Markdown files.
 
     For single file just check if file exists and has the correct file ending (.md).
-    For directory, glob for files with .md ending and add each to file list.
+    For directory, search for files with .md ending and add each to file list.
 
     Args:
         item_list (list[str]): List of items provided via argparse
@@ -21,29 +67,49 @@ def get_md_files(items: list[Path], recursive: bool) -> list[Path]:
     Returns:
         list[Path]: List of Markdown files to update
     """
-    files: list[Path] = []
-    for item in items:
-        if item.is_dir():
-            if recursive:
-                files.extend(list(item.rglob("**/*.md")))
-            else:
-                files.extend(list(item.glob("*.md")))
-        elif item.is_file():
-            if item.suffix == ".md":
-                files.append(item)
-            else:
-                sys.exit(f"No Markdown file extension (.md): {item}")
-        else:
-            sys.exit(f"Not a file or directory: {item}.")
+    files: list[Path] = list(iter_md_files(items, recursive))
     if not files:
-        sys.exit(
-            "Couldn't find any Markdown files. Do you use the file ending .md for " +
-            "your Markdown files? If yes, you could try to search directories " +
-            "recursively using the -r flag (see help)."
-        )
+        sys.exit(NO_FILES_FOUND)
     return files
 
 
+def stream_md_files(args: argparse.Namespace) -> Iterator[Path]:
+    """Lazily find Markdown files to update, exit if there are none.
+
+    Unlike get_md_files, only the first file is searched for before returning, the
+    remaining files are found while they are processed.
+
+    Args:
+        args (argparse.Namespace): Parsed command line arguments
+
+    Returns:
+        Iterator[Path]: Markdown files to update
+    """
+    files: Iterator[Path] = find_md_files(args)
+    first_file: Path | None = next(files, None)
+    if first_file is None:
+        sys.exit(NO_FILES_FOUND)
+    return itertools.chain([first_file], files)
+
+
+def find_md_files(args: argparse.Namespace) -> Iterator[Path]:
+    """Lazily find Markdown files selected by command line arguments.
+
+    Args:
+        args (argparse.Namespace): Parsed command line arguments
+
+    Returns:
+        Iterator[Path]: Markdown files to update
+    """
+    return iter_md_files(
+        args.items,
+        args.recursive,
+        include=args.include or (MARKDOWN_GLOB,),
+        exclude=args.exclude,
+        ignore_files=args.ignore_file,
+    )
+
+
 def parse_args() -> argparse.Namespace:
     """Parse arguments."""
     argparser = argparse.ArgumentParser(
@@ -62,14 +128,398 @@ def parse_args() -> argparse.Namespace:
         action="store_true",
         help="Recursively search for Markdown files in subdirectories",
     )
-    return argparser.parse_args()
+    argparser.add_argument(
+        "--include",
+        action="append",
+        default=[],
+        metavar="GLOB",
+        help=f"Only update files whose names match GLOB (default: {MARKDOWN_GLOB}). "
+        + "Can be used several times",
+    )
+    argparser.add_argument(
+        "--exclude",
+        action="append",
+        default=[],
+        metavar="GLOB",
+        help="Skip files and directories matching GLOB, using the same rules as "
+        + ".gitignore files. Can be used several times",
+    )
+    argparser.add_argument(
+        "--ignore-file",
+        action="append",
+        default=[],
+        metavar="NAME",
+        help="Skip files and directories listed in ignore files with this name "
+        + "(e.g. .gitignore) found in searched directories. Can be used several times",
+    )
+    argparser.add_argument(
+        "--engine",
+        choices=ENGINES,
+        default="tokenizer",
+        help="How links are found in Markdown files: 'tokenizer' scans the Markdown "
+        + "source, 'markdown' converts files to HTML first, which is slower "
+        + "(default: %(default)s)",
+    )
+    argparser.add_argument(
+        "--scan-workers",
+        type=int,
+        default=SCAN_WORKERS,
+        metavar="N",
+        help="Number of chunks of files read and scanned concurrently "
+        + f"(default: {SCAN_WORKERS})",
+    )
+    argparser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Number of processes scanning files, use more than one to scan large "
+        + "sites on several CPU cores (default: %(default)s)",
+    )
+    argparser.add_argument(
+        "--large-file-threshold",
+        type=float,
+        default=LARGE_FILE_THRESHOLD / (1024 * 1024),
+        metavar="MB",
+        help="Size in MiB above which files are scanned and rewritten block by block "
+        + "instead of being read into memory at once (default: %(default)g)",
+    )
+    argparser.add_argument(
+        "--lookup-workers",
+        type=int,
+        default=LOOKUP_WORKERS,
+        metavar="N",
+        help="Number of files for which snapshots are looked up concurrently "
+        + f"(default: {LOOKUP_WORKERS})",
+    )
+    argparser.add_argument(
+        "--write-workers",
+        type=int,
+        default=WRITE_WORKERS,
+        metavar="N",
+        help=f"Number of files updated concurrently (default: {WRITE_WORKERS})",
+    )
+    argparser.add_argument(
+        "--max-connections",
+        type=int,
+        default=MAX_CONNECTIONS,
+        metavar="N",
+        help="Maximum number of open connections to archive.org "
+        + f"(default: {MAX_CONNECTIONS})",
+    )
+    argparser.add_argument(
+        "--max-keepalive",
+        type=int,
+        default=MAX_KEEPALIVE_CONNECTIONS,
+        metavar="N",
+        help="Maximum number of idle connections kept alive "
+        + f"(default: {MAX_KEEPALIVE_CONNECTIONS})",
+    )
+    argparser.add_argument(
+        "--http2",
+        action="store_true",
+        help="Use HTTP/2 for API calls (requires archive-md-urls[http2])",
+    )
+    argparser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default="available",
+        help="API used to look up snapshots: 'available' makes one call per URL and "
+        + "date, 'cdx' fetches all captures of a URL at once, which is faster for "
+        + "URLs linked from many files with different dates (default: %(default)s)",
+    )
+    argparser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=MAX_IN_FLIGHT,
+        metavar="N",
+        help=f"Maximum number of API calls in flight (default: {MAX_IN_FLIGHT})",
+    )
+    argparser.add_argument(
+        "--rate",
+        type=float,
+        default=RATE,
+        metavar="N",
+        help="Maximum number of API calls per second, automatically lowered when "
+        + f"archive.org throttles requests (default: {RATE:g})",
+    )
+    argparser.add_argument(
+        "--cache-path",
+        type=Path,
+        default=default_cache_path(),
+        metavar="PATH",
+        help="Location of the snapshot cache database (default: %(default)s)",
+    )
+    argparser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Don't read or write cached snapshot lookups",
+    )
+    argparser.add_argument(
+        "--check-liveness",
+        action="store_true",
+        help="Check linked pages first and only replace URLs that are dead, "
+        + "redirected or changed since the date of the file",
+    )
+    argparser.add_argument(
+        "--liveness-ttl",
+        type=float,
+        default=LIVENESS_TTL / (24 * 60 * 60),
+        metavar="DAYS",
+        help="Days after which cached liveness checks expire (default: %(default)g)",
+    )
+    argparser.add_argument(
+        "--save-missing",
+        action="store_true",
+        help="Ask the Wayback Machine to archive URLs without snapshot using Save Page "
+        + "Now. New snapshots are written into files by the next run. Set "
+        + f"{CREDENTIALS_ENV} to 'ACCESS:SECRET' to use archive.org S3 keys",
+    )
+    argparser.add_argument(
+        "--save-queue",
+        type=Path,
+        default=SAVE_QUEUE_PATH,
+        metavar="PATH",
+        help="Queue of URLs to archive, resumed by later runs (default: %(default)s)",
+    )
+    argparser.add_argument(
+        "--save-wait",
+        type=float,
+        default=WAIT,
+        metavar="SECONDS",
+        help="Time to keep submitting URLs and polling capture jobs once all files "
+        + "are done (default: %(default)g)",
+    )
+    argparser.add_argument(
+        "--journal",
+        type=Path,
+        default=JOURNAL_PATH,
+        metavar="PATH",
+        help="Checkpoint file recording progress of the run, removed once all URLs "
+        + "have been looked up (default: %(default)s)",
+    )
+    argparser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Resume an interrupted run from its journal, skipping completed files "
+        + "and resolved lookups",
+    )
+    argparser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Skip files that haven't changed since the last incremental run and "
+        + "only look up URLs that are new in changed files",
+    )
+    argparser.add_argument(
+        "--manifest",
+        type=Path,
+        default=MANIFEST_PATH,
+        metavar="PATH",
+        help="File recording the state of processed files for incremental runs "
+        + "(default: %(default)s)",
+    )
+    argparser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Look up snapshots but don't change any files, only report what would "
+        + "be changed",
+    )
+    argparser.add_argument(
+        "--report",
+        type=Path,
+        metavar="PATH",
+        help="Write the decision made about every URL to PATH, as CSV if PATH ends "
+        + "with .csv, otherwise as JSON Lines ('-' for standard output)",
+    )
+    argparser.add_argument(
+        "--granularity",
+        choices=GRANULARITIES,
+        default="minute",
+        help="Precision of the dates used to look up snapshots. Coarser dates let "
+        + "posts of the same day or month share lookups (default: %(default)s)",
+    )
+    argparser.add_argument(
+        "--stable-config",
+        type=Path,
+        metavar="PATH",
+        help="JSON file with additional rules for URLs considered stable, which are "
+        + "never replaced with snapshots (see README)",
+    )
+    argparser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running after updating all files and update files again whenever "
+        + "they change, until interrupted with Ctrl+C",
+    )
+    argparser.add_argument(
+        "--debounce",
+        type=float,
+        default=DEBOUNCE,
+        metavar="SECONDS",
+        help="With --watch, wait until files haven't changed for this long before "
+        + "updating them (default: %(default)g)",
+    )
+    argparser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Print counters, time spent in each stage and API latencies at the end "
+        + "of the run",
+    )
+    argparser.add_argument(
+        "--stats-file",
+        type=Path,
+        metavar="PATH",
+        help="Export stats of the run to PATH, in the Prometheus textfile format if "
+        + "PATH ends with .prom, otherwise as JSON",
+    )
+    argparser.add_argument(
+        "--profile",
+        type=Path,
+        metavar="PATH",
+        help="Profile the run with cProfile and save the profile to PATH, or with "
+        + "pyinstrument as HTML page if PATH ends with .html",
+    )
+    args: argparse.Namespace = argparser.parse_args()
+    if args.rate <= 0:
+        argparser.error("--rate must be greater than 0")
+    # Limits and numbers of workers below 1 would stop the run from making progress
+    for option in (
+        "scan_workers",
+        "lookup_workers",
+        "write_workers",
+        "jobs",
+        "max_connections",
+        "max_keepalive",
+        "max_in_flight",
+    ):
+        if getattr(args, option) < 1:
+            argparser.error(f"--{option.replace('_', '-')} must be at least 1")
+    args.matcher = None
+    if args.stable_config is not None:
+        try:
+            rules: list[StableRule] = load_stable_rules(args.stable_config)
+            args.matcher = StableMatcher(STABLE_MATCHER.rules + rules)
+        except (OSError, ValueError, re.error) as error:
+            argparser.error(f"invalid --stable-config {args.stable_config}: {error}")
+    return args
+
+
+async def run(args: argparse.Namespace, files: Iterable[Path]) -> None:
+    """Update files with one Archiver session shared by the whole run.
+
+    Args:
+        args (argparse.Namespace): Parsed command line arguments
+        files (Iterable[Path]): Markdown files to update
+    """
+    cache: SnapshotCache | None = (
+        None
+        if args.no_cache
+        else SnapshotCache(
+            args.cache_path, liveness_ttl=args.liveness_ttl * 24 * 60 * 60
+        )
+    )
+    # A dry run leaves all files untouched, including journal and manifest
+    journal: Journal | None = (
+        None if args.dry_run else Journal(args.journal, resume=args.resume)
+    )
+    manifest: Manifest | None = Manifest(args.manifest) if args.incremental else None
+    report: Report | None = None if args.report is None else Report(args.report)
+    save_queue: SaveQueue | None = (
+        SaveQueue(args.save_queue) if args.save_missing and not args.dry_run else None
+    )
+    stats = Stats()
+    completed: bool = False
+    try:
+        async with Archiver(
+            cache=cache,
+            limiter=RateLimiter(args.max_in_flight, args.rate),
+            backend=BACKENDS[args.backend](),
+            matcher=args.matcher,
+            engine=args.engine,
+            granularity=args.granularity,
+            stats=stats,
+            max_connections=args.max_connections,
+            max_keepalive_connections=args.max_keepalive,
+            http2=args.http2,
+            check_liveness=args.check_liveness,
+            liveness_limiter=RateLimiter(args.max_in_flight, args.rate),
+            saver=(
+                None
+                if save_queue is None
+                else SavePageNow(
+                    save_queue,
+                    cache,
+                    wait=args.save_wait,
+                    credentials=os.environ.get(CREDENTIALS_ENV),
+                )
+            ),
+        ) as archiver:
+            await archiver.process_files(
+                files,
+                scan_workers=args.scan_workers,
+                lookup_workers=args.lookup_workers,
+                write_workers=args.write_workers,
+                journal=journal,
+                jobs=args.jobs,
+                large_file_threshold=int(args.large_file_threshold * 1024 * 1024),
+                manifest=manifest,
+                report=report,
+                dry_run=args.dry_run,
+                print_summary=True,
+            )
+            completed = True
+            if args.watch:
+                print("Watching for changes, press Ctrl+C to stop.")
+                await Watcher(
+                    archiver,
+                    args.items,
+                    lambda: find_md_files(args),
+                    args.recursive,
+                    args.debounce,
+                    manifest=manifest,
+                    scan_workers=args.scan_workers,
+                    lookup_workers=args.lookup_workers,
+                    write_workers=args.write_workers,
+                    large_file_threshold=int(args.large_file_threshold * 1024 * 1024),
+                    report=report,
+                    dry_run=args.dry_run,
+                ).run()
+    finally:
+        if report is not None:
+            report.close()
+        if manifest is not None and not args.dry_run:
+            manifest.save()
+        if save_queue is not None:
+            save_queue.close()
+        if cache is not None:
+            cache.close()
+        # Keep journal to resume from if the run didn't complete
+        if journal is not None:
+            journal.close(remove=completed and not journal.failures)
+        if args.stats:
+            print(stats.format())
+        if args.stats_file is not None:
+            stats.write(args.stats_file)
 
 
 def main() -> None:
     """archive-md-urls cli entry point."""
     args: argparse.Namespace = parse_args()
-    files: list[Path] = get_md_files(args.items, args.recursive)
-    asyncio.run(update_files(files))
+    files: Iterator[Path] = stream_md_files(args)
+    with profile(args.profile) if args.profile else contextlib.nullcontext():
+        try:
+            asyncio.run(run(args, files))
+        except KeyboardInterrupt:
+            # Ctrl+C is the regular way to stop watching
+            if not args.watch:
+                raise
+        except ImportError as error:
+            # Optional dependencies that are missing, e.g. h2 for --http2
+            sys.exit(str(error))
+        except JournalInUseError as error:
+            # Another run, e.g. a watcher, holds the journal
+            sys.exit(str(error))
 
 
 if __name__ == "__main__":
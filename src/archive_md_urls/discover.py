@@ -0,0 +1,236 @@
+"""Find Markdown files in files and directories passed to archive-md-urls.
+
+Directories are walked lazily with os.scandir, so files can be processed while the
+rest of a large tree is still being searched. Files can be selected with include
+globs (matched against file names) and skipped with exclude globs and ignore files,
+which follow the rules of .gitignore files. Files reachable via several inputs or
+symlinks are only yielded once, and symlinked directories are only entered once to
+protect against symlink loops.
+"""
+
+import fnmatch
+import os
+import sys
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from typing import NamedTuple
+
+# Glob matching Markdown files by default
+MARKDOWN_GLOB: str = "*.md"
+
+
+class IgnoreRule(NamedTuple):
+    """Pattern of an ignore file (or exclude glob) and the directory it applies to."""
+
+    base: str
+    pattern: str
+    negated: bool
+    directories_only: bool
+    anchored: bool
+
+
+def parse_ignore_rules(lines: Iterable[str], base: str) -> list[IgnoreRule]:
+    """Parse patterns following the rules of .gitignore files.
+
+    Args:
+        lines (Iterable[str]): Lines of the ignore file
+        base (str): Directory the patterns are relative to
+
+    Returns:
+        list[IgnoreRule]: Parsed rules, in order
+    """
+    rules: list[IgnoreRule] = []
+    for line in lines:
+        pattern: str = line.rstrip("\n").rstrip()
+        if not pattern or pattern.startswith("#"):
+            continue
+        negated: bool = pattern.startswith("!")
+        pattern = pattern.removeprefix("!").removeprefix("\\")
+        directories_only: bool = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+        # Patterns containing a slash are relative to base, others match at any depth
+        anchored: bool = "/" in pattern
+        rules.append(
+            IgnoreRule(
+                base,
+                pattern.lstrip("/").removeprefix("**/"),
+                negated,
+                directories_only,
+                anchored and not pattern.startswith("**/"),
+            )
+        )
+    return rules
+
+
+def is_ignored(path: str, is_dir: bool, rules: list[IgnoreRule]) -> bool:
+    """Check if path is ignored, the last matching rule wins.
+
+    Args:
+        path (str): Path of file or directory
+        is_dir (bool): Path is a directory
+        rules (list[IgnoreRule]): Rules that apply to the path's directory
+
+    Returns:
+        bool: True if path is ignored
+    """
+    ignored: bool = False
+    for rule in rules:
+        if rule.directories_only and not is_dir:
+            continue
+        if rule.anchored:
+            candidate: str = os.path.relpath(path, rule.base).replace(os.sep, "/")
+        else:
+            candidate = os.path.basename(path)
+        if fnmatch.fnmatchcase(candidate, rule.pattern):
+            ignored = not rule.negated
+    return ignored
+
+
+def iter_md_files(
+    items: Iterable[Path],
+    recursive: bool,
+    include: Iterable[str] = (MARKDOWN_GLOB,),
+    exclude: Iterable[str] = (),
+    ignore_files: Iterable[str] = (),
+) -> Iterator[Path]:
+    """Lazily yield Markdown files from files and directories.
+
+    Files passed directly must match one of the include globs. They are checked right
+    away, so that an invalid item stops the program before any file is processed.
+    In directories, files are yielded in alphabetical order before subdirectories
+    are searched.
+
+    Args:
+        items (Iterable[Path]): Files and directories provided via argparse
+        recursive (bool): Recursively search subdirectories for Markdown files if True
+        include (Iterable[str]): Globs matching names of files to yield
+        exclude (Iterable[str]): Globs of files and directories to skip, following the
+                                 rules of .gitignore files relative to each directory
+                                 item
+        ignore_files (Iterable[str]): Names of ignore files (e.g. '.gitignore') to read
+                                      in each searched directory
+
+    Returns:
+        Iterator[Path]: Markdown files, found while iterating
+    """
+    items = list(items)
+    include = tuple(include)
+    for item in items:
+        if item.is_dir():
+            continue
+        if not item.is_file():
+            sys.exit(f"Not a file or directory: {item}.")
+        if not any(fnmatch.fnmatchcase(item.name, glob) for glob in include):
+            sys.exit(f"No Markdown file extension (.md): {item}")
+    return iter_items(items, recursive, include, tuple(exclude), tuple(ignore_files))
+
+
+def iter_items(
+    items: list[Path],
+    recursive: bool,
+    include: tuple[str, ...],
+    exclude: tuple[str, ...],
+    ignore_files: tuple[str, ...],
+) -> Iterator[Path]:
+    """Yield Markdown files from checked files and directories.
+
+    Args:
+        items (list[Path]): Existing files and directories
+        recursive (bool): Recursively search subdirectories for Markdown files if True
+        include (tuple[str, ...]): Globs matching names of files to yield
+        exclude (tuple[str, ...]): Globs of files and directories to skip
+        ignore_files (tuple[str, ...]): Names of ignore files to read
+
+    Yields:
+        Path: Next Markdown file
+    """
+    # Device and inode of yielded files and visited directories
+    seen_files: set[tuple[int, int]] = set()
+    seen_dirs: set[tuple[int, int]] = set()
+    for item in items:
+        if item.is_dir():
+            yield from walk(
+                str(item),
+                recursive,
+                include,
+                parse_ignore_rules(exclude, str(item)),
+                ignore_files,
+                seen_files,
+                seen_dirs,
+            )
+        else:
+            stat: os.stat_result = item.stat()
+            if (stat.st_dev, stat.st_ino) not in seen_files:
+                seen_files.add((stat.st_dev, stat.st_ino))
+                yield item
+
+
+def walk(
+    directory: str,
+    recursive: bool,
+    include: tuple[str, ...],
+    rules: list[IgnoreRule],
+    ignore_files: tuple[str, ...],
+    seen_files: set[tuple[int, int]],
+    seen_dirs: set[tuple[int, int]],
+) -> Iterator[Path]:
+    """Yield matching files of a directory, then search its subdirectories.
+
+    Args:
+        directory (str): Directory to search
+        recursive (bool): Search subdirectories
+        include (tuple[str, ...]): Globs matching names of files to yield
+        rules (list[IgnoreRule]): Ignore rules inherited from parent directories
+        ignore_files (tuple[str, ...]): Names of ignore files to read
+        seen_files (set[tuple[int, int]]): Device and inode of yielded files
+        seen_dirs (set[tuple[int, int]]): Device and inode of visited directories
+
+    Yields:
+        Path: Next Markdown file
+    """
+    stat: os.stat_result = os.stat(directory)
+    if (stat.st_dev, stat.st_ino) in seen_dirs:
+        return
+    seen_dirs.add((stat.st_dev, stat.st_ino))
+    for name in ignore_files:
+        try:
+            with open(os.path.join(directory, name), encoding="utf-8") as ignore_file:
+                rules = rules + parse_ignore_rules(ignore_file, directory)
+        except (FileNotFoundError, PermissionError):
+            pass
+    try:
+        with os.scandir(directory) as entries:
+            sorted_entries: list[os.DirEntry[str]] = sorted(
+                entries, key=lambda e: e.name
+            )
+    except PermissionError:
+        # Unreadable directories are skipped like excluded ones
+        return
+    subdirectories: list[str] = []
+    for entry in sorted_entries:
+        if entry.is_dir():
+            if recursive and not is_ignored(entry.path, True, rules):
+                subdirectories.append(entry.path)
+        elif (
+            entry.is_file()
+            and any(fnmatch.fnmatchcase(entry.name, glob) for glob in include)
+            and not is_ignored(entry.path, False, rules)
+        ):
+            key: tuple[int, int] = (
+                (stat.st_dev, entry.inode())
+                if not entry.is_symlink()
+                else (entry.stat().st_dev, entry.stat().st_ino)
+            )
+            if key not in seen_files:
+                seen_files.add(key)
+                yield Path(entry.path)
+    for subdirectory in subdirectories:
+        yield from walk(
+            subdirectory,
+            recursive,
+            include,
+            rules,
+            ignore_files,
+            seen_files,
+            seen_dirs,
+        )
@@ -0,0 +1,245 @@
+"""Offline stand-in for the Wayback Machine APIs, for tests and benchmarks.
+
+FakeWayback answers the availability API (/wayback/available), the CDX server
+(/cdx/search/cdx) and Save Page Now (/save) through an HTTPX MockTransport, so that
+whole runs can be exercised without network access:
+
+    fake = FakeWayback(latency=0.05, throttle_rate=0.01)
+    async with create_client(transport=fake.transport()) as client:
+        await update_files(files, client=client)
+
+Captures are derived from a hash of each URL, so every URL always has the same
+captures. A share of URLs has never been archived, until they are saved with Save
+Page Now: capture jobs are pending for a number of status checks and then add a
+capture of the URL. Responses can be delayed, and a share of them can be replaced
+with server errors (503) or throttling (429 with a Retry-After header).
+"""
+
+import asyncio
+import contextlib
+import hashlib
+import random
+from datetime import datetime, timedelta
+from typing import Any
+from urllib.parse import parse_qs
+
+import httpx
+
+from archive_md_urls.cdx import parse_timestamp
+
+# Range of capture timestamps
+FIRST_CAPTURE = datetime(2005, 1, 1)
+LAST_CAPTURE = datetime(2024, 1, 1)
+
+
+class FakeWayback:
+    """Fake Wayback Machine with deterministic captures and injectable failures.
+
+    Args:
+        latency (float): Seconds each response is delayed
+        error_rate (float): Share of responses replaced with 503 Service Unavailable
+        throttle_rate (float): Share of responses replaced with 429 Too Many Requests
+        retry_after (float): Value of the Retry-After header of 429 responses
+        missing_rate (float): Share of URLs that have never been archived
+        max_captures (int): Maximum number of captures of an archived URL
+        seed (int): Seed for injecting errors
+        save_polls (int): Number of status checks for which capture jobs are pending
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        retry_after: float = 1.0,
+        missing_rate: float = 0.1,
+        max_captures: int = 20,
+        seed: int = 0,
+        save_polls: int = 1,
+    ) -> None:
+        self.latency: float = latency
+        self.error_rate: float = error_rate
+        self.throttle_rate: float = throttle_rate
+        self.retry_after: float = retry_after
+        self.missing_rate: float = missing_rate
+        self.max_captures: int = max_captures
+        self.random = random.Random(seed)
+        self.save_polls: int = save_polls
+        # Capture jobs by job ID with their URL and number of status checks, and
+        # timestamps of captures made by Save Page Now
+        self.jobs: dict[str, tuple[str, int]] = {}
+        self.saved: dict[str, str] = {}
+        # Number of requests by path and by status code of the response
+        self.requests: dict[str, int] = {}
+        self.responses: dict[int, int] = {}
+
+    def transport(self) -> httpx.MockTransport:
+        """Return transport routing requests of an HTTPX client to the fake.
+
+        Returns:
+            httpx.MockTransport: Transport to pass to create_client
+        """
+        return httpx.MockTransport(self.handle)
+
+    def captures(self, url: str) -> list[str]:
+        """Return timestamps of all captures of a URL.
+
+        Args:
+            url (str): Archived URL
+
+        Returns:
+            list[str]: Sorted timestamps (YYYYMMDDhhmmss), empty if never archived
+        """
+        seed: int = int.from_bytes(hashlib.sha256(url.encode()).digest()[:8], "big")
+        url_random = random.Random(seed)
+        saved: list[str] = [self.saved[url]] if url in self.saved else []
+        if url_random.random() < self.missing_rate:
+            return saved
+        span: float = (LAST_CAPTURE - FIRST_CAPTURE).total_seconds()
+        return sorted(
+            [
+                (
+                    FIRST_CAPTURE + timedelta(seconds=int(url_random.random() * span))
+                ).strftime("%Y%m%d%H%M%S")
+                for _ in range(url_random.randint(1, self.max_captures))
+            ]
+            + saved
+        )
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        """Answer a request like the Wayback Machine.
+
+        Args:
+            request (httpx.Request): Request sent by the client
+
+        Returns:
+            httpx.Response: Response of the fake
+        """
+        path: str = request.url.path
+        self.requests[path] = self.requests.get(path, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        response: httpx.Response
+        draw: float = self.random.random()
+        if draw < self.throttle_rate:
+            response = httpx.Response(
+                httpx.codes.TOO_MANY_REQUESTS,
+                headers={"Retry-After": str(self.retry_after)},
+            )
+        elif draw < self.throttle_rate + self.error_rate:
+            response = httpx.Response(httpx.codes.SERVICE_UNAVAILABLE)
+        elif path == "/wayback/available":
+            response = httpx.Response(
+                200,
+                json=self.available(
+                    request.url.params.get("url", ""),
+                    request.url.params.get("timestamp"),
+                ),
+            )
+        elif path == "/cdx/search/cdx":
+            response = self.cdx(request.url.params.get("url", ""))
+        elif path == "/save" and request.method == "POST":
+            response = self.save(request)
+        elif path.startswith("/save/status/"):
+            response = self.save_status(path.removeprefix("/save/status/"))
+        else:
+            response = httpx.Response(httpx.codes.NOT_FOUND)
+        self.responses[response.status_code] = (
+            self.responses.get(response.status_code, 0) + 1
+        )
+        return response
+
+    def available(self, url: str, timestamp: str | None) -> dict[str, Any]:
+        """Answer like the availability API.
+
+        Args:
+            url (str): URL to look up
+            timestamp (str | None): Requested timestamp, latest capture if None
+
+        Returns:
+            dict[str, Any]: JSON response with the closest capture, if any
+        """
+        captures: list[str] = self.captures(url)
+        if not captures:
+            return {"url": url, "archived_snapshots": {}}
+        closest: str = captures[-1]
+        # Malformed timestamps are ignored, like by the real API
+        if timestamp:
+            with contextlib.suppress(ValueError):
+                requested: datetime = parse_timestamp(timestamp)
+                closest = min(
+                    captures,
+                    key=lambda capture: abs(parse_timestamp(capture) - requested),
+                )
+        return {
+            "url": url,
+            "archived_snapshots": {
+                "closest": {
+                    "status": "200",
+                    "available": True,
+                    "url": f"http://web.archive.org/web/{closest}/{url}",
+                    "timestamp": closest,
+                }
+            },
+        }
+
+    def cdx(self, url: str) -> httpx.Response:
+        """Answer like the CDX server with JSON output.
+
+        Args:
+            url (str): URL to list captures of
+
+        Returns:
+            httpx.Response: Captures with a header row, empty if never archived
+        """
+        captures: list[str] = self.captures(url)
+        if not captures:
+            return httpx.Response(200, content=b"")
+        return httpx.Response(
+            200,
+            json=[["timestamp", "original"]] + [[capture, url] for capture in captures],
+        )
+
+    def save(self, request: httpx.Request) -> httpx.Response:
+        """Start a capture job like Save Page Now.
+
+        Args:
+            request (httpx.Request): Form-encoded request with the URL to capture
+
+        Returns:
+            httpx.Response: JSON response with the ID of the capture job
+        """
+        url: str = parse_qs(request.content.decode()).get("url", [""])[0]
+        job_id: str = f"spn2-{hashlib.sha256(url.encode()).hexdigest()[:40]}"
+        self.jobs[job_id] = (url, 0)
+        return httpx.Response(200, json={"url": url, "job_id": job_id})
+
+    def save_status(self, job_id: str) -> httpx.Response:
+        """Report status of a capture job, adding its capture once it is done.
+
+        Args:
+            job_id (str): ID of the capture job
+
+        Returns:
+            httpx.Response: JSON response with the status of the job
+        """
+        if job_id not in self.jobs:
+            return httpx.Response(
+                200, json={"status": "error", "message": "Job not found"}
+            )
+        url, polls = self.jobs[job_id]
+        if polls < self.save_polls:
+            self.jobs[job_id] = (url, polls + 1)
+            return httpx.Response(200, json={"status": "pending", "job_id": job_id})
+        timestamp: str = self.saved.setdefault(
+            url, LAST_CAPTURE.strftime("%Y%m%d%H%M%S")
+        )
+        return httpx.Response(
+            200,
+            json={
+                "status": "success",
+                "job_id": job_id,
+                "original_url": url,
+                "timestamp": timestamp,
+            },
+        )
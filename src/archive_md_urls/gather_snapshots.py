@@ -4,21 +4,89 @@ Given a URL and (optionally) a timestamp, return the URL of the archive.org
 snapshot closest to the provided timestamp. If no timestamp is provided or no
 snapshot for the provided timestamp can be found, return the latest
 snapshot. If no snapshot available, return None.
+
+Snapshots are looked up by a backend. By default, AvailableBackend calls the
+Wayback Machine's availability API once per URL and timestamp. Alternative backends
+(see archive_md_urls.cdx) implement the same SnapshotBackend interface.
+
+HTTPX and tenacity are only imported once the first client is created or API call
+made, so that importing this module (e.g. for its defaults) stays cheap.
 """
 
+import abc
 import asyncio
-import sys
-from typing import Any
+import contextlib
+import time
+from typing import TYPE_CHECKING, Any
+from urllib.parse import quote
+
+from archive_md_urls.cache import SnapshotCache
+from archive_md_urls.ratelimit import RateLimiter, parse_retry_after
+from archive_md_urls.stats import Stats, active_stats, record_retry
+
+if TYPE_CHECKING:
+    import httpx
+
+# Default limits for the connection pool shared by all API calls of a run
+MAX_CONNECTIONS: int = 20
+MAX_KEEPALIVE_CONNECTIONS: int = 10
+# Number of attempts of an API call and seconds to wait between them
+RETRY_ATTEMPTS: int = 5
+RETRY_WAIT: float = 2.0
+
+
+def create_client(
+    max_connections: int = MAX_CONNECTIONS,
+    max_keepalive_connections: int = MAX_KEEPALIVE_CONNECTIONS,
+    http2: bool = False,
+    transport: "httpx.AsyncBaseTransport | None" = None,
+) -> "httpx.AsyncClient":
+    """Create HTTPX client to be shared by all API calls of a run.
+
+    Reusing one client means connections to archive.org (and their TLS handshakes)
+    are pooled across files, while the limits cap the number of open connections.
+
+    Args:
+        max_connections (int): Maximum number of concurrent connections
+        max_keepalive_connections (int): Maximum number of idle connections kept alive
+        http2 (bool): Use HTTP/2 if supported by the server (requires the h2 package)
+        transport (httpx.AsyncBaseTransport | None): Transport to send requests with
+                                                     instead of the network, e.g. to
+                                                     a FakeWayback
+
+    Raises:
+        ImportError: HTTP/2 was requested, but the h2 package isn't installed
+
+    Returns:
+        httpx.AsyncClient: HTTPX AsyncClient to make API calls
+    """
+    import httpx
 
-import httpx
-import tenacity
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive_connections,
+    )
+    try:
+        return httpx.AsyncClient(
+            timeout=None, limits=limits, http2=http2, transport=transport
+        )
+    except ImportError as error:
+        raise ImportError(
+            "HTTP/2 support requires the h2 package, install it with "
+            + "'pip install archive-md-urls[http2]'."
+        ) from error
 
 
-@tenacity.retry(stop=tenacity.stop_after_attempt(5), wait=tenacity.wait_fixed(2))
-async def call_api(client: httpx.AsyncClient, api_call: str) -> dict[str, Any]:
+async def call_api(
+    client: "httpx.AsyncClient", api_call: str, limiter: RateLimiter | None = None
+) -> Any:
     """Call Wayback Machine API and return JSON response.
 
-    If API is unresponsive, sleep task for two seconds for a maximum of five times.
+    If API is unresponsive, sleep task for RETRY_WAIT seconds and try again, until
+    RETRY_ATTEMPTS calls failed. If a rate limiter is provided, wait for its
+    permission before calling the API and report back 429 responses, so that the
+    limiter can slow down all API calls.
+    Latency, 429 responses and retries are counted in the active Stats, if any.
 
     Expect the following API responses:
 
@@ -31,16 +99,58 @@ async def call_api(client: httpx.AsyncClient, api_call: str) -> dict[str, Any]:
     - URL that is has not available in archive.org:
         Empty JSON
 
+    The CDX server answers with an empty response instead of JSON if a URL has not
+    been archived, in which case None is returned.
+
     Args:
         client (httpx.AsyncClient): HTTPX AsyncClient to make API calls
         api_call (str): Valid call to archive.org API
+        limiter (RateLimiter | None): Limits concurrency and rate of API calls
 
     Returns:
-        dict[str, Any]: JSON API response
+        Any: JSON API response
     """
-    response: httpx.Response = await client.get(api_call)
+    import tenacity
+
+    retrying = tenacity.AsyncRetrying(
+        stop=tenacity.stop_after_attempt(RETRY_ATTEMPTS),
+        wait=tenacity.wait_fixed(RETRY_WAIT),
+        before_sleep=record_retry,
+    )
+    return await retrying(call_api_once, client, api_call, limiter)
+
+
+async def call_api_once(
+    client: "httpx.AsyncClient", api_call: str, limiter: RateLimiter | None = None
+) -> Any:
+    """Call Wayback Machine API once, see call_api.
+
+    Args:
+        client (httpx.AsyncClient): HTTPX AsyncClient to make API calls
+        api_call (str): Valid call to archive.org API
+        limiter (RateLimiter | None): Limits concurrency and rate of API calls
+
+    Returns:
+        Any: JSON API response
+    """
+    import httpx
+
+    stats: Stats | None = active_stats.get()
+    async with limiter or contextlib.nullcontext():
+        start: float = time.perf_counter()
+        response: httpx.Response = await client.get(api_call)
+    if stats is not None:
+        stats.observe_latency(time.perf_counter() - start)
+        stats.count("api_calls")
+        if response.status_code == httpx.codes.TOO_MANY_REQUESTS:
+            stats.count("throttled")
+    if limiter is not None:
+        if response.status_code == httpx.codes.TOO_MANY_REQUESTS:
+            limiter.throttle(parse_retry_after(response.headers.get("Retry-After")))
+        elif response.is_success:
+            limiter.succeeded()
     response.raise_for_status()
-    return response.json()
+    return response.json() if response.content else None
 
 
 def build_api_call(url: str, timestamp: str | None = None) -> str:
@@ -53,7 +163,8 @@ def build_api_call(url: str, timestamp: str | None = None) -> str:
     Returns:
         str: Valid archive.org API call
     """
-    api_call: str = f"https://archive.org/wayback/available?url={url}"
+    # Percent-encode the URL, so that its own query and fragment are kept
+    api_call: str = f"https://archive.org/wayback/available?url={quote(url, safe=':/')}"
     if timestamp:
         api_call += f"&timestamp={timestamp}"
     return api_call
@@ -75,37 +186,165 @@ def get_closest(api_response: dict[str, Any]) -> str | None:
     return api_response["archived_snapshots"]["closest"]["url"]
 
 
+class SnapshotBackend(abc.ABC):
+    """Interface for looking up the snapshot closest to a timestamp."""
+
+    @abc.abstractmethod
+    async def lookup(
+        self,
+        client: "httpx.AsyncClient",
+        url: str,
+        timestamp: str | None = None,
+        limiter: RateLimiter | None = None,
+    ) -> str | None:
+        """Return URL of the snapshot closest to timestamp, if any.
+
+        Args:
+            client (httpx.AsyncClient): HTTPX AsyncClient to make API calls
+            url (str): URL to be searched in the Wayback Machine
+            timestamp (str | None): Timestamp of desired snapshot, latest if None
+            limiter (RateLimiter | None): Limits concurrency and rate of API calls
+
+        Returns:
+            str | None: URL of Wayback Machine snapshot, if any was found
+        """
+
+    def forget(self, url: str) -> None:
+        """Drop anything remembered about URL, e.g. after it was archived.
+
+        Args:
+            url (str): URL whose snapshots may have changed
+        """
+
+
+class AvailableBackend(SnapshotBackend):
+    """Look up snapshots with one call to the availability API per URL and timestamp."""
+
+    async def lookup(
+        self,
+        client: "httpx.AsyncClient",
+        url: str,
+        timestamp: str | None = None,
+        limiter: RateLimiter | None = None,
+    ) -> str | None:
+        return get_closest(
+            await call_api(client, build_api_call(url, timestamp), limiter)
+        )
+
+
+async def lookup_snapshot(
+    client: "httpx.AsyncClient",
+    url: str,
+    timestamp: str | None = None,
+    cache: SnapshotCache | None = None,
+    limiter: RateLimiter | None = None,
+    backend: SnapshotBackend | None = None,
+) -> str | None:
+    """Look up a single URL and return URL of the closest snapshot, if any.
+
+    If a cache is provided, only call the API if no unexpired result is cached, and
+    cache the result afterwards.
+
+    Args:
+        client (httpx.AsyncClient): HTTPX AsyncClient to make API calls
+        url (str): URL to be searched in the Wayback Machine
+        timestamp (str | None): Timestamp to send to the Wayback Machine API
+        cache (SnapshotCache | None): Persistent cache for lookup results
+        limiter (RateLimiter | None): Limits concurrency and rate of API calls
+        backend (SnapshotBackend | None): Backend used for lookups, AvailableBackend
+                                          if None
+
+    Returns:
+        str | None: URL of Wayback Machine snapshot, if any was found
+    """
+    if cache is not None:
+        cached, snapshot = cache.get(url, timestamp)
+        if cached:
+            return snapshot
+    snapshot = await (backend or AvailableBackend()).lookup(
+        client, url, timestamp, limiter
+    )
+    if cache is not None:
+        cache.set(url, timestamp, snapshot)
+    return snapshot
+
+
 async def gather_snapshots(
-    urls: list[str], timestamp: str = None
+    urls: list[str],
+    timestamp: str | None = None,
+    client: "httpx.AsyncClient | None" = None,
+    lookups: dict[tuple[str, str | None], asyncio.Future[str | None]] | None = None,
+    cache: SnapshotCache | None = None,
+    limiter: RateLimiter | None = None,
+    backend: SnapshotBackend | None = None,
+    failures: dict[str, str] | None = None,
 ) -> dict[str, str | None]:
-    """Create HTTPX session for API calls and return gathered snapshots.
+    """Call API for each URL and return gathered snapshots.
+
+    To make asynchronous calls, create a task for each URL-timestamp pair and get
+    results with asyncio.gather(). The completed tasks will then be used to build a
+    dict of url-snapshot pairs.
+
+    If no client is provided, a new one is created just for these URLs. Pass a shared
+    client to reuse its connection pool across calls.
 
-    To make asynchronous calls, create a task list for calling the call_api function
-    and get results with asyncio.gather(). The completed tasks will then be used to
-    build a dict of url-snapshot pairs.
+    Tasks are registered in lookups, keyed by URL and timestamp. Pass the same dict to
+    every call of a run so that a URL-timestamp pair found in several files is only
+    sent to the API once, with its result fanned out to all of these files.
+
+    A URL for which the API stays unresponsive after all retries doesn't stop the
+    others: it is treated as if no snapshot was found and the reason is added to
+    failures, if provided.
 
     Args:
         urls (list[str]): Urls to send to the Wayback Machine API
         timestamp (str | None): Timestamp to send to the Wayback Machine API
+        client (httpx.AsyncClient | None): HTTPX AsyncClient to make API calls
+        lookups (dict[tuple[str, str | None], asyncio.Future[str | None]] | None):
+            Pending and completed lookups shared across calls
+        cache (SnapshotCache | None): Persistent cache for lookup results
+        limiter (RateLimiter | None): Limits concurrency and rate of API calls
+        backend (SnapshotBackend | None): Backend used for lookups, AvailableBackend
+                                          if None
+        failures (dict[str, str] | None): Collects URLs that couldn't be looked up
+                                          and the reason why
 
     Returns:
         dict[str, str | None]: API call results with original URL as keys and Wayback
                                   snapshot URLs as values
     """
-    async with httpx.AsyncClient(timeout=None) as client:
-        # Create task list (with each task being an API call)
-        tasks: list[asyncio.Task[Any]] = []
-        for url in urls:
-            tasks.append(
-                asyncio.create_task(call_api(client, build_api_call(url, timestamp)))
+    import tenacity
+
+    if client is None:
+        async with create_client() as client:
+            return await gather_snapshots(
+                urls, timestamp, client, lookups, cache, limiter, backend, failures
+            )
+    if lookups is None:
+        lookups = {}
+    if limiter is None:
+        limiter = RateLimiter()
+    if backend is None:
+        backend = AvailableBackend()
+    # Create task list (with each task being an API call), reusing registered tasks
+    tasks: list[asyncio.Future[str | None]] = []
+    for url in urls:
+        if (url, timestamp) not in lookups:
+            lookups[url, timestamp] = asyncio.create_task(
+                lookup_snapshot(client, url, timestamp, cache, limiter, backend)
             )
-        # Execute tasks and gather results. If a task failed five times, exit program
-        try:
-            api_responses: list[dict[str, Any]] = await asyncio.gather(*tasks)
-        except tenacity.RetryError:
-            sys.exit("API appears unresponsive, please try again later.")
-        # Build url-snapshot pairs from results
-        wayback_urls: dict[str, str | None] = {}
-        for api_response in api_responses:
-            wayback_urls[api_response["url"]] = get_closest(api_response)
+        tasks.append(lookups[url, timestamp])
+    # Execute tasks and gather results
+    results: list[Any] = await asyncio.gather(*tasks, return_exceptions=True)
+    # Build url-snapshot pairs from results. If a task failed five times, record
+    # failure and leave URL unchanged
+    wayback_urls: dict[str, str | None] = {}
+    for url, result in zip(urls, results):
+        if isinstance(result, tenacity.RetryError):
+            if failures is not None:
+                failures[url] = repr(result.last_attempt.exception())
+            result = None
+        elif isinstance(result, BaseException):
+            raise result
+        wayback_urls[url] = result
     return wayback_urls
@@ -0,0 +1,202 @@
+"""Checkpoint progress of a run to resume it after interruptions.
+
+The journal is a JSON Lines file to which every resolved lookup and every completed
+file is appended as soon as it is done. If a run is interrupted or some URLs
+couldn't be looked up, it can be resumed from the journal: completed files are
+skipped and resolved lookups are reused without calling the API again.
+
+The journal file is only created once a run starts processing files, and it is
+locked while the run is using it, so that concurrent runs, e.g. a watcher and a
+pre-commit hook, can't truncate or remove each other's journal.
+"""
+
+import json
+import os
+from pathlib import Path
+from types import TracebackType
+from typing import Any, TextIO
+
+try:
+    import fcntl
+except ImportError:
+    # Windows locks files with msvcrt instead
+    import msvcrt
+
+# Default location of the journal, relative to the working directory
+JOURNAL_PATH = Path(".archive-md-urls-journal.jsonl")
+
+
+class JournalInUseError(Exception):
+    """Another run is using the journal file."""
+
+
+def lock(file: TextIO) -> bool:
+    """Lock file exclusively without waiting for other processes to release it.
+
+    Locks are released when the file is closed, also if the process was killed.
+
+    Args:
+        file (TextIO): Open file
+
+    Returns:
+        bool: True if file was locked, False if another process holds the lock
+    """
+    try:
+        if os.name == "nt":
+            # Windows locks byte ranges, the first byte stands for the whole file
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    return True
+
+
+class Journal:
+    """Append-only record of resolved lookups, failed lookups and completed files.
+
+    The journal file is opened by open(), which update_files calls before
+    processing any file.
+
+    Args:
+        path (Path): Location of the journal file
+        resume (bool): Load and continue existing journal instead of starting anew
+    """
+
+    def __init__(self, path: Path, resume: bool = False) -> None:
+        self.path: Path = path
+        self.resume: bool = resume
+        self.completed_files: set[str] = set()
+        self.snapshots: dict[tuple[str, str | None], str | None] = {}
+        self.failures: int = 0
+        self.file: TextIO | None = None
+
+    def __enter__(self) -> "Journal":
+        self.open()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    def open(self) -> None:
+        """Create or lock journal file, and load it if resuming.
+
+        Raises:
+            JournalInUseError: Another run holds the lock on the journal file
+        """
+        if self.file is not None:
+            return
+        while True:
+            # Line buffering writes every record to disk right away
+            file: TextIO = self.path.open("a", encoding="utf-8", buffering=1)
+            if not lock(file):
+                file.close()
+                raise JournalInUseError(
+                    f"{self.path} is used by another run, "
+                    + "pass --journal to give this run a journal of its own"
+                )
+            # The run that held the lock might have removed the file in the meantime
+            try:
+                if os.path.samestat(os.fstat(file.fileno()), os.stat(self.path)):
+                    break
+            except FileNotFoundError:
+                pass
+            file.close()
+        self.file = file
+        if self.resume:
+            self.load()
+        else:
+            self.file.truncate(0)
+
+    def load(self) -> None:
+        """Read completed files and resolved lookups from journal file."""
+        with self.path.open(encoding="utf-8") as journal:
+            for line in journal:
+                try:
+                    record: dict[str, Any] = json.loads(line)
+                # The last line might be incomplete if the run was killed
+                except json.JSONDecodeError:
+                    continue
+                if "file" in record:
+                    self.completed_files.add(record["file"])
+                elif "snapshot" in record:
+                    self.snapshots[record["url"], record["timestamp"]] = record[
+                        "snapshot"
+                    ]
+
+    def is_completed(self, file: Path) -> bool:
+        """Check if file was completed in a previous run.
+
+        Args:
+            file (Path): Markdown file
+
+        Returns:
+            bool: True if file was completed
+        """
+        return str(file.resolve()) in self.completed_files
+
+    def record_lookup(
+        self, url: str, timestamp: str | None, snapshot: str | None
+    ) -> None:
+        """Record resolved lookup, unless it was already recorded.
+
+        Args:
+            url (str): URL searched in the Wayback Machine
+            timestamp (str | None): Timestamp of the lookup
+            snapshot (str | None): URL of the snapshot, None if none was found
+        """
+        if (url, timestamp) not in self.snapshots:
+            self.snapshots[url, timestamp] = snapshot
+            self.write({"url": url, "timestamp": timestamp, "snapshot": snapshot})
+
+    def record_failure(self, url: str, timestamp: str | None, reason: str) -> None:
+        """Record lookup that failed, so that it is retried when resuming.
+
+        Args:
+            url (str): URL searched in the Wayback Machine
+            timestamp (str | None): Timestamp of the lookup
+            reason (str): Description of the error
+        """
+        self.failures += 1
+        self.write({"url": url, "timestamp": timestamp, "failure": reason})
+
+    def record_file(self, file: Path) -> None:
+        """Record completed file.
+
+        Args:
+            file (Path): Markdown file that was updated
+        """
+        self.completed_files.add(str(file.resolve()))
+        self.write({"file": str(file.resolve())})
+
+    def write(self, record: dict[str, Any]) -> None:
+        """Append record to journal file.
+
+        Args:
+            record (dict[str, Any]): Record to append
+        """
+        self.file.write(json.dumps(record) + "\n")
+
+    def close(self, remove: bool = False) -> None:
+        """Close journal file and release its lock, if it was opened.
+
+        Args:
+            remove (bool): Delete journal file, e.g. once a run completed without
+                           failures
+        """
+        if self.file is None:
+            return
+        # Remove journal file before releasing the lock, so that no other run can
+        # take it over in between, except on Windows where open files can't be removed
+        if remove and os.name != "nt":
+            self.path.unlink(missing_ok=True)
+        self.file.close()
+        self.file = None
+        if remove and os.name == "nt":
+            self.path.unlink(missing_ok=True)
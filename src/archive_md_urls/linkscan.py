@@ -0,0 +1,314 @@
+"""Find links in Markdown source without converting it to HTML.
+
+Instead of rendering Markdown to HTML and parsing the result to collect href
+attributes, scan_links() finds links with a single pass of a regular expression over
+the Markdown source. It recognizes inline links, reference definitions, autolinks
+and HTML anchors, skips images, code spans and fenced code blocks, and reports the
+position of each URL in the source so that it can be replaced in place.
+
+Indented code blocks depend on the blocks around them (the same indentation continues
+a list item), so they are found by code_ranges() in a pass over the lines first, and
+the regular expression only scans the text between them.
+
+Front matter is parsed following the rules of Python-Markdown's meta extension,
+which allows to read the date of a file without rendering its body.
+
+Large files don't have to be scanned at once: iter_blocks() groups their lines into
+blocks that end at blank lines outside of fenced code blocks, which links can't
+span, so that each block can be scanned on its own.
+"""
+
+import re
+from collections.abc import Iterable, Iterator
+from typing import NamedTuple
+
+# Markdown meta data (optionally enclosed by YAML delimiters), see
+# https://python-markdown.github.io/extensions/meta_data/
+META_BEGIN_RE = re.compile(r"^-{3}(\s.*)?$")
+META_END_RE = re.compile(r"^(-{3}|\.{3})(\s.*)?$")
+META_RE = re.compile(r"^[ ]{0,3}(?P<key>[A-Za-z0-9_-]+):\s*(?P<value>.*)$")
+META_MORE_RE = re.compile(r"^[ ]{4,}(?P<value>.*)$")
+
+# Alternatives are tried in order at each position. Code and escaped characters are
+# matched only to skip over them, so that links inside of them are ignored. Code
+# spans end at the end of their paragraph and footnote definitions ([^label]: ...)
+# are not reference definitions.
+LINK_RE = re.compile(
+    r"""
+    (?P<escape>\\.)
+    | (?P<fence>
+        ^[ ]{0,3}(?P<fence_chars>`{3,}|~{3,})[^\n]*\n
+        (?:[\s\S]*?^[ ]{0,3}(?P=fence_chars)[`~]*[ \t]*$|[\s\S]*\Z)
+    )
+    | ^[ ]{0,3}\[(?!\^)[^\[\]\n]+\]:[ \t]*\n?[ \t]*
+        (?:<(?P<reference_angle>[^>\n]*)>|(?P<reference>\S+))
+    | (?P<code>(?P<ticks>`+)(?:(?!\n[ \t]*\n)[\s\S])+?(?<!`)(?P=ticks)(?!`))
+    | <(?P<autolink>(?:[Ff]|[Hh][Tt])[Tt][Pp][Ss]?://[^<>\s]*)>
+    | <[Aa]\s[^>]*?\bhref\s*=\s*(?:"(?P<href_double>[^"]*)"|'(?P<href_single>[^']*)')
+    | (?P<image>!)?\[(?:[^\[\]\\]|\\.|\[(?:[^\[\]\\]|\\.)*\])*\]
+        \([ \t]*\n?[ \t]*
+        (?:
+            <(?P<inline_angle>[^>\n]*)>
+            | (?P<inline>(?:[^\s()\\]|\\.|\((?:[^\s()\\]|\\.)*\))+)
+        )
+        (?:[ \t]*\n?[ \t]*(?:"[^"]*"|'[^']*'|\([^)]*\)))?
+        [ \t]*\)
+    """,
+    re.MULTILINE | re.VERBOSE,
+)
+# Opening and closing lines of fenced code blocks, to avoid splitting them
+FENCE_RE = re.compile(r"^[ ]{0,3}(?P<fence_chars>`{3,}|~{3,})")
+# Lines that might belong to an indented code block, at the top level or in quotes
+INDENTED_RE = re.compile(r"^(?:[ ]{0,3}>[ ]?)*(?:[ ]{4}|[ ]{0,3}\t)", re.MULTILINE)
+LIST_ITEM_RE = re.compile(r"^[ ]{0,3}(?:[*+-]|\d+\.)[ ]+")
+QUOTE_RE = re.compile(r"^[ ]{0,3}>[ ]?")
+# Characters that can be escaped with a backslash, see
+# https://python-markdown.github.io/#backslash-escapes
+ESCAPE_RE = re.compile(r"\\([\\`*_{}\[\]()>#+\-.!])")
+# Groups of LINK_RE that capture a URL
+URL_GROUPS: tuple[str, ...] = (
+    "reference_angle",
+    "reference",
+    "autolink",
+    "href_double",
+    "href_single",
+    "inline_angle",
+    "inline",
+)
+# Groups of LINK_RE whose URL is unescaped by Markdown, unlike reference definitions
+# and raw HTML
+ESCAPED_GROUPS: frozenset[str] = frozenset({"autolink", "inline_angle", "inline"})
+
+
+class Link(NamedTuple):
+    """URL of a link and its position in the Markdown source."""
+
+    url: str
+    start: int
+    end: int
+
+
+def scan_front_matter(md_source: str) -> tuple[dict[str, list[str]], int]:
+    """Parse meta data at the beginning of Markdown source.
+
+    Args:
+        md_source (str): Contents of the Markdown file
+
+    Returns:
+        tuple[dict[str, list[str]], int]: Meta data with lower case keys and offset
+                                          at which the body starts
+    """
+    meta: dict[str, list[str]] = {}
+    key: str | None = None
+    offset: int = 0
+    while offset < len(md_source):
+        end: int = md_source.find("\n", offset) + 1 or len(md_source)
+        line: str = md_source[offset:end].rstrip("\r\n")
+        if offset == 0 and META_BEGIN_RE.match(line):
+            offset = end
+            continue
+        # Blank line or end of YAML header: done, the line belongs to the meta data
+        if not line.strip() or META_END_RE.match(line):
+            offset = end
+            break
+        if match := META_RE.match(line):
+            key = match["key"].lower().strip()
+            meta.setdefault(key, []).append(match["value"].strip())
+        elif (match := META_MORE_RE.match(line)) and key:
+            meta[key].append(match["value"].strip())
+        else:
+            break
+        offset = end
+    return meta, offset
+
+
+def scan_links(md_source: str, front_matter: bool = True) -> list[Link]:
+    """Find URLs of links in Markdown source.
+
+    Unlike links in the HTML version of the file, reference definitions are reported
+    once where they are defined (whether they are used or not) instead of wherever
+    they are used.
+
+    Args:
+        md_source (str): Contents of the Markdown file
+        front_matter (bool): Skip meta data at the beginning, False for blocks that
+                             don't start the file
+
+    Returns:
+        list[Link]: URLs and their positions, in order of appearance
+    """
+    links: list[Link] = []
+    start: int = scan_front_matter(md_source)[1] if front_matter else 0
+    code: list[tuple[int, int]] = []
+    if INDENTED_RE.search(md_source, start):
+        lines: list[tuple[int, str]] = []
+        offset: int = start
+        for line in md_source[start:].split("\n"):
+            lines.append((offset, line))
+            offset += len(line) + 1
+        code = code_ranges(lines)
+    # Scan the text between indented code blocks
+    for end, code_end in [*code, (len(md_source), len(md_source))]:
+        for match in LINK_RE.finditer(md_source, start, end):
+            if match["image"]:
+                continue
+            for group in URL_GROUPS:
+                if match[group] is not None:
+                    url: str = match[group]
+                    if group in ESCAPED_GROUPS:
+                        url = ESCAPE_RE.sub(r"\1", url)
+                    links.append(Link(url, *match.span(group)))
+                    break
+        start = code_end
+    return links
+
+
+def indentation(line: str) -> tuple[int, int]:
+    """Measure the indentation of a line, with tab stops every 4 columns.
+
+    Args:
+        line (str): Line of Markdown source
+
+    Returns:
+        tuple[int, int]: Width of the indentation in columns and in characters
+    """
+    columns: int = 0
+    for index, character in enumerate(line):
+        if character == " ":
+            columns += 1
+        elif character == "\t":
+            columns += 4 - columns % 4
+        else:
+            return columns, index
+    return columns, len(line)
+
+
+def dedent(line: tuple[int, str]) -> tuple[int, str]:
+    """Remove one level (4 columns) of indentation from a line.
+
+    Args:
+        line (tuple[int, str]): Offset of the line in the source and its text
+
+    Returns:
+        tuple[int, str]: Offset and text of the line without the indentation
+    """
+    offset, text = line
+    columns: int = 0
+    index: int = 0
+    while index < len(text) and columns < 4 and text[index] in " \t":
+        columns = columns + 1 if text[index] == " " else columns + 4 - columns % 4
+        index += 1
+    return offset + index, text[index:]
+
+
+def code_ranges(lines: list[tuple[int, str]]) -> list[tuple[int, int]]:
+    """Find indented code blocks like Python-Markdown.
+
+    Text indented by 4 columns after a blank line is code, unless it follows a list
+    item, in which case it is the item's content. List content and blockquotes are
+    searched recursively, without their indentation or quote markers. Fenced code
+    blocks are left to LINK_RE.
+
+    Args:
+        lines (list[tuple[int, str]]): Offset in the source and text of each line,
+                                       without line breaks
+
+    Returns:
+        list[tuple[int, int]]: Start and end offsets of code blocks, in order
+    """
+    ranges: list[tuple[int, int]] = []
+    previous_blank: bool = True
+    in_list: bool = False
+    fence: str | None = None
+    index: int = 0
+    while index < len(lines):
+        offset, text = lines[index]
+        match: re.Match[str] | None = FENCE_RE.match(text)
+        if fence is not None:
+            if (
+                match
+                and match["fence_chars"].startswith(fence)
+                and not text[match.end() :].strip("`~ \t\r")
+            ):
+                fence = None
+            index += 1
+            continue
+        if not text.strip():
+            previous_blank = True
+            index += 1
+            continue
+        if previous_blank and indentation(text)[0] >= 4:
+            # The block continues over blank lines up to the next unindented line
+            last: int = index
+            end: int = index + 1
+            while end < len(lines) and (
+                not lines[end][1].strip() or indentation(lines[end][1])[0] >= 4
+            ):
+                if lines[end][1].strip():
+                    last = end
+                end += 1
+            if in_list:
+                ranges.extend(
+                    code_ranges([dedent(line) for line in lines[index : last + 1]])
+                )
+            else:
+                ranges.append((offset, lines[last][0] + len(lines[last][1])))
+            previous_blank = False
+            index = last + 1
+            continue
+        if QUOTE_RE.match(text):
+            quoted: list[tuple[int, str]] = []
+            while index < len(lines) and (quote := QUOTE_RE.match(lines[index][1])):
+                quoted.append(
+                    (lines[index][0] + quote.end(), lines[index][1][quote.end() :])
+                )
+                index += 1
+            ranges.extend(code_ranges(quoted))
+            previous_blank = False
+            in_list = False
+            continue
+        if match:
+            fence = match["fence_chars"]
+        if previous_blank:
+            in_list = LIST_ITEM_RE.match(text) is not None
+        previous_blank = False
+        index += 1
+    return ranges
+
+
+def iter_blocks(lines: Iterable[str], size: int) -> Iterator[str]:
+    """Group lines of Markdown source into blocks that can be scanned separately.
+
+    A block ends at the first blank line outside of a fenced code block once it
+    contains at least size characters. Meta data ends at the first blank line, so it
+    is always part of the first block.
+
+    Args:
+        lines (Iterable[str]): Lines of the Markdown source, including line breaks
+        size (int): Minimum number of characters per block, except for the last one
+
+    Yields:
+        str: Next block of lines
+    """
+    block: list[str] = []
+    length: int = 0
+    fence: str | None = None
+    for line in lines:
+        block.append(line)
+        length += len(line)
+        match: re.Match[str] | None = FENCE_RE.match(line)
+        if fence is not None:
+            if (
+                match
+                and match["fence_chars"].startswith(fence)
+                and not line[match.end() :].strip("`~ \t\r\n")
+            ):
+                fence = None
+        elif match:
+            fence = match["fence_chars"]
+        elif length >= size and not line.strip():
+            yield "".join(block)
+            block = []
+            length = 0
+    if block:
+        yield "".join(block)
@@ -0,0 +1,232 @@
+"""Check whether linked pages are still alive before archiving them.
+
+A link that still leads to the page it pointed to when a post was written doesn't
+need a snapshot. gather_liveness() sends a HEAD request to each URL (falling back to
+a GET request whose body is never read if the server doesn't answer HEAD requests),
+conditional on the page being modified since the post's date. Only URLs that are
+dead, redirect elsewhere or changed since the post's date are then looked up in the
+Wayback Machine:
+
+- alive: 2xx response not modified since the post's date, 304 Not Modified, or a
+  redirect to the same page (e.g. from http to https)
+- dead: 4xx response other than 403 Forbidden and 429 Too Many Requests
+- redirected: redirect to another page
+- changed: Last-Modified header later than the post's date
+- unchecked: not an http(s) URL (e.g. a relative link), no response at all, a 5xx
+  response, 403 or 429 (often sent to bots or clients sending many requests). These
+  URLs are looked up as before, and the result isn't cached since it may be a
+  temporary problem.
+"""
+
+import asyncio
+import contextlib
+import email.utils
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING
+from urllib.parse import urljoin, urlsplit
+
+from archive_md_urls.cache import SnapshotCache
+from archive_md_urls.cdx import parse_timestamp
+from archive_md_urls.ratelimit import RateLimiter
+from archive_md_urls.stats import Stats, active_stats
+
+if TYPE_CHECKING:
+    import httpx
+
+ALIVE: str = "alive"
+DEAD: str = "dead"
+REDIRECTED: str = "redirected"
+CHANGED: str = "changed"
+UNCHECKED: str = "unchecked"
+# Seconds to wait for the response of a linked server
+TIMEOUT: float = 10.0
+# Status codes of servers that don't (properly) answer HEAD requests
+HEAD_NOT_SUPPORTED: frozenset[int] = frozenset({403, 405, 501})
+# Status codes that tell nothing about the page itself, e.g. because bots are blocked
+UNKNOWN_STATUS: frozenset[int] = frozenset({403, 429})
+
+
+def format_http_date(timestamp: str | None) -> str | None:
+    """Format Wayback Machine timestamp as HTTP date, e.g. for If-Modified-Since.
+
+    Args:
+        timestamp (str | None): Timestamp (YYYY[MMDDhhmm])
+
+    Returns:
+        str | None: HTTP date, None if there is no valid timestamp
+    """
+    if not timestamp:
+        return None
+    try:
+        date: datetime = parse_timestamp(timestamp)
+    except ValueError:
+        return None
+    return email.utils.format_datetime(date.replace(tzinfo=timezone.utc), usegmt=True)
+
+
+def is_same_page(url: str, location: str) -> bool:
+    """Check if a redirect leads to the same page, ignoring scheme and trailing slash.
+
+    Args:
+        url (str): Requested URL
+        location (str): Absolute URL the request is redirected to
+
+    Returns:
+        bool: True if only the scheme or a trailing slash differ
+    """
+    requested, redirected = urlsplit(url), urlsplit(location)
+    return (
+        requested.netloc.lower() == redirected.netloc.lower()
+        and requested.path.rstrip("/") == redirected.path.rstrip("/")
+        and requested.query == redirected.query
+    )
+
+
+def classify_response(
+    url: str, response: "httpx.Response", modified_since: str | None
+) -> str:
+    """Tell from the response to a liveness check whether a URL needs a snapshot.
+
+    Args:
+        url (str): Checked URL
+        response (httpx.Response): Response to the HEAD or GET request
+        modified_since (str | None): HTTP date of the post, if known
+
+    Returns:
+        str: ALIVE, DEAD, REDIRECTED, CHANGED or UNCHECKED
+    """
+    import httpx
+
+    if response.status_code in UNKNOWN_STATUS or response.is_server_error:
+        return UNCHECKED
+    if response.status_code == httpx.codes.NOT_MODIFIED:
+        return ALIVE
+    if response.is_redirect:
+        location: str = urljoin(url, response.headers.get("Location", ""))
+        return ALIVE if is_same_page(url, location) else REDIRECTED
+    if response.status_code >= 400:
+        return DEAD
+    if response.status_code >= 300:
+        return REDIRECTED
+    last_modified: str | None = response.headers.get("Last-Modified")
+    if modified_since and last_modified:
+        with contextlib.suppress(TypeError, ValueError):
+            if email.utils.parsedate_to_datetime(
+                last_modified
+            ) > email.utils.parsedate_to_datetime(modified_since):
+                return CHANGED
+    return ALIVE
+
+
+async def check_url(
+    client: "httpx.AsyncClient",
+    url: str,
+    timestamp: str | None = None,
+    limiter: RateLimiter | None = None,
+) -> str:
+    """Check whether a URL still leads to the page it pointed to at timestamp.
+
+    Args:
+        client (httpx.AsyncClient): HTTPX AsyncClient to send the requests with
+        url (str): URL to check
+        timestamp (str | None): Timestamp of the post linking to URL
+        limiter (RateLimiter | None): Limits concurrency and rate of checks
+
+    Returns:
+        str: ALIVE, DEAD, REDIRECTED, CHANGED or UNCHECKED
+    """
+    import httpx
+
+    if not url.lower().startswith(("http://", "https://")):
+        return UNCHECKED
+    modified_since: str | None = format_http_date(timestamp)
+    headers: dict[str, str] = (
+        {"If-Modified-Since": modified_since} if modified_since else {}
+    )
+    try:
+        async with limiter or contextlib.nullcontext():
+            response: httpx.Response = await client.head(
+                url, headers=headers, timeout=TIMEOUT
+            )
+            if response.status_code in HEAD_NOT_SUPPORTED:
+                # Only the status and headers are needed, the body is never read
+                async with client.stream(
+                    "GET", url, headers=headers, timeout=TIMEOUT
+                ) as response:
+                    pass
+    except (httpx.InvalidURL, httpx.HTTPError):
+        # Timeouts and connection errors may well be temporary
+        return UNCHECKED
+    return classify_response(url, response, modified_since)
+
+
+async def check_cached(
+    client: "httpx.AsyncClient",
+    url: str,
+    timestamp: str | None = None,
+    cache: SnapshotCache | None = None,
+    limiter: RateLimiter | None = None,
+) -> str:
+    """Check a single URL unless an unexpired result is cached.
+
+    Args:
+        client (httpx.AsyncClient): HTTPX AsyncClient to send the requests with
+        url (str): URL to check
+        timestamp (str | None): Timestamp of the post linking to URL
+        cache (SnapshotCache | None): Persistent cache for liveness results
+        limiter (RateLimiter | None): Limits concurrency and rate of checks
+
+    Returns:
+        str: ALIVE, DEAD, REDIRECTED, CHANGED or UNCHECKED
+    """
+    if cache is not None:
+        state: str | None = cache.get_liveness(url, timestamp)
+        if state is not None:
+            return state
+    state = await check_url(client, url, timestamp, limiter)
+    if state == UNCHECKED:
+        return state
+    stats: Stats | None = active_stats.get()
+    if stats is not None:
+        stats.count("liveness_checks")
+    if cache is not None:
+        cache.set_liveness(url, timestamp, state)
+    return state
+
+
+async def gather_liveness(
+    urls: list[str],
+    timestamp: str | None,
+    client: "httpx.AsyncClient",
+    checks: dict[tuple[str, str | None], asyncio.Future[str]] | None = None,
+    cache: SnapshotCache | None = None,
+    limiter: RateLimiter | None = None,
+) -> dict[str, str]:
+    """Check all URLs concurrently and return their states.
+
+    Like lookups in gather_snapshots, checks are registered in checks, keyed by URL
+    and timestamp. Pass the same dict to every call of a run so that each URL is only
+    checked once per timestamp.
+
+    Args:
+        urls (list[str]): URLs to check
+        timestamp (str | None): Timestamp of the post linking to the URLs
+        client (httpx.AsyncClient): HTTPX AsyncClient to send the requests with
+        checks (dict[tuple[str, str | None], asyncio.Future[str]] | None): Pending
+            and completed checks shared across calls
+        cache (SnapshotCache | None): Persistent cache for liveness results
+        limiter (RateLimiter | None): Limits concurrency and rate of checks
+
+    Returns:
+        dict[str, str]: State of each URL
+    """
+    if checks is None:
+        checks = {}
+    tasks: list[asyncio.Future[str]] = []
+    for url in urls:
+        if (url, timestamp) not in checks:
+            checks[url, timestamp] = asyncio.create_task(
+                check_cached(client, url, timestamp, cache, limiter)
+            )
+        tasks.append(checks[url, timestamp])
+    return dict(zip(urls, await asyncio.gather(*tasks)))
@@ -0,0 +1,162 @@
+"""Remember processed files to skip unchanged ones in incremental runs.
+
+The manifest is a JSON file that stores the content hash, modification time and size
+of every file processed in a previous run, together with the URLs that were already
+looked up for it. Files whose modification time and size are unchanged are skipped
+without reading them, files with a different modification time but the same content
+hash are skipped without scanning them, and for changed files only URLs that weren't
+looked up before are sent to the API. Files with URLs left to look up, e.g. because
+the lookup failed, are marked as pending and scanned again in the next run.
+
+URLs that were left unchanged because their pages are still alive count as looked
+up, but the manifest remembers when their liveness checks expire. From then on, the
+file is scanned again and these URLs are checked once more.
+"""
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any
+
+from archive_md_urls.cache import LIVENESS_TTL
+
+# Default location of the manifest, relative to the working directory
+MANIFEST_PATH = Path(".archive-md-urls-manifest.json")
+
+
+def hash_source(md_source: str) -> str:
+    """Return content hash of a Markdown file.
+
+    Args:
+        md_source (str): Contents of the Markdown file
+
+    Returns:
+        str: SHA-256 hex digest of the UTF-8 encoded contents
+    """
+    return hashlib.sha256(md_source.encode("utf-8")).hexdigest()
+
+
+class Manifest:
+    """Content hash, modification time, size and processed URLs of files.
+
+    Args:
+        path (Path): Location of the manifest file, loaded if it exists
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path: Path = path
+        self.files: dict[str, dict[str, Any]] = {}
+        if path.exists():
+            self.files = json.loads(path.read_text(encoding="utf-8"))["files"]
+
+    def is_due(self, file: Path) -> bool:
+        """Check if file has alive URLs whose liveness checks expired.
+
+        Args:
+            file (Path): Markdown file
+
+        Returns:
+            bool: True if file has to be scanned again to check URLs
+        """
+        entry: dict[str, Any] = self.files.get(str(file.resolve()), {})
+        return any(
+            recheck <= time.time() for recheck in entry.get("alive", {}).values()
+        )
+
+    def is_unchanged(self, file: Path) -> bool:
+        """Check if modification time and size of file match the manifest.
+
+        Args:
+            file (Path): Markdown file
+
+        Returns:
+            bool: True if file can be skipped without reading it
+        """
+        entry: dict[str, Any] | None = self.files.get(str(file.resolve()))
+        if entry is None or entry.get("pending") or self.is_due(file):
+            return False
+        stat: os.stat_result = file.stat()
+        return entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size
+
+    def digest(self, file: Path) -> str | None:
+        """Return content hash of file at the time it was processed, if any.
+
+        Args:
+            file (Path): Markdown file
+
+        Returns:
+            str | None: SHA-256 hex digest of file contents, None if file has
+                        URLs left to look up or check
+        """
+        entry: dict[str, Any] = self.files.get(str(file.resolve()), {})
+        if entry.get("pending") or self.is_due(file):
+            return None
+        return entry.get("sha256")
+
+    def processed_urls(self, file: Path) -> set[str]:
+        """Return URLs of file that were already looked up.
+
+        Args:
+            file (Path): Markdown file
+
+        Returns:
+            set[str]: URLs looked up in previous runs, except alive URLs whose
+                      liveness checks expired
+        """
+        entry: dict[str, Any] = self.files.get(str(file.resolve()), {})
+        return set(entry.get("urls", [])) - {
+            url
+            for url, recheck in entry.get("alive", {}).items()
+            if recheck <= time.time()
+        }
+
+    def update(
+        self,
+        file: Path,
+        digest: str,
+        urls: set[str] | None = None,
+        pending: bool = False,
+        alive: set[str] | None = None,
+        liveness_ttl: float = LIVENESS_TTL,
+    ) -> None:
+        """Record current state of a processed file.
+
+        Args:
+            file (Path): Markdown file, after it was updated
+            digest (str): Content hash of the updated file
+            urls (set[str] | None): URLs looked up for file, unchanged if None
+            pending (bool): File has URLs left to look up, so it isn't skipped in
+                            the next run
+            alive (set[str] | None): URLs among urls that were found alive now
+            liveness_ttl (float): Seconds until URLs found alive are checked again
+        """
+        stat: os.stat_result = file.stat()
+        key: str = str(file.resolve())
+        now: float = time.time()
+        # Keep alive URLs found in previous runs until their checks expire
+        rechecks: dict[str, float] = {
+            url: recheck
+            for url, recheck in self.files.get(key, {}).get("alive", {}).items()
+            if urls is None or (url in urls and recheck > now)
+        }
+        if urls is None:
+            urls = set(self.files.get(key, {}).get("urls", []))
+        rechecks.update((url, now + liveness_ttl) for url in alive or ())
+        self.files[key] = {
+            "sha256": digest,
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "urls": sorted(urls),
+            "pending": pending,
+            "alive": rechecks,
+        }
+
+    def save(self) -> None:
+        """Write manifest to a temporary file and move it into place."""
+        temporary: Path = self.path.with_name(f".{self.path.name}.tmp")
+        temporary.write_text(
+            json.dumps({"version": 1, "files": self.files}), encoding="utf-8"
+        )
+        os.replace(temporary, self.path)
@@ -0,0 +1,127 @@
+"""Limit number and rate of concurrent calls to the Wayback Machine API.
+
+Bursts of API calls quickly trigger archive.org's throttling. RateLimiter caps the
+number of calls in flight with a semaphore and spaces them out with a token bucket.
+When the API answers with HTTP 429 (Too Many Requests), all calls are paused for the
+time requested in the Retry-After header (or an exponentially growing delay if there
+is none) and the rate is halved. Every successful call afterwards raises the rate
+again until the configured maximum is reached.
+"""
+
+import asyncio
+import email.utils
+import time
+from datetime import datetime, timezone
+from types import TracebackType
+
+# Default maximum number of API calls in flight and API calls per second
+MAX_IN_FLIGHT: int = 10
+RATE: float = 10.0
+# Delay in seconds after the first 429 response without Retry-After header, doubled
+# for each subsequent 429 response up to MAX_BACKOFF
+BACKOFF: float = 1.0
+MAX_BACKOFF: float = 60.0
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Parse Retry-After header given either in seconds or as HTTP date.
+
+    Args:
+        value (str | None): Value of the Retry-After header
+
+    Returns:
+        float | None: Seconds to wait before the next call, None if not parseable
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at: datetime = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class RateLimiter:
+    """Async context manager limiting concurrency and rate of API calls.
+
+    Args:
+        max_in_flight (int): Maximum number of API calls in flight
+        rate (float): Maximum number of API calls per second
+        burst (int | None): Number of API calls that can be made at once after an idle
+                            period, defaults to max_in_flight
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = MAX_IN_FLIGHT,
+        rate: float = RATE,
+        burst: int | None = None,
+    ) -> None:
+        self.max_rate: float = rate
+        self.rate: float = rate
+        self.capacity: float = float(burst or max_in_flight)
+        self.tokens: float = self.capacity
+        self.updated: float = time.monotonic()
+        self.paused_until: float = 0.0
+        self.backoff: float = BACKOFF
+        self.throttled: int = 0
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._lock = asyncio.Lock()
+
+    async def __aenter__(self) -> "RateLimiter":
+        await self._semaphore.acquire()
+        try:
+            await self._take_token()
+        except BaseException:
+            self._semaphore.release()
+            raise
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self._semaphore.release()
+
+    def throttle(self, retry_after: float | None = None) -> None:
+        """Pause all API calls and halve the rate after a 429 response.
+
+        Args:
+            retry_after (float | None): Seconds requested by the Retry-After header
+        """
+        self.throttled += 1
+        if retry_after is None:
+            retry_after = self.backoff
+            self.backoff = min(self.backoff * 2, MAX_BACKOFF)
+        self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+        self.rate = max(self.rate / 2, self.max_rate / 64)
+
+    def succeeded(self) -> None:
+        """Raise the rate again after a successful API call."""
+        self.backoff = BACKOFF
+        self.rate = min(self.rate + self.max_rate / 20, self.max_rate)
+
+    async def _take_token(self) -> None:
+        # Waiting calls queue up on the lock, so tokens are handed out in order
+        async with self._lock:
+            while True:
+                now: float = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
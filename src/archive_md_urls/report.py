@@ -0,0 +1,162 @@
+"""Report every decision made about a URL, e.g. to review a dry run.
+
+For every URL found in a processed file, a record with the requested timestamp, the
+chosen snapshot and its distance to the requested timestamp, the reason why the URL
+was skipped as stable, the result of its liveness check, or the error that prevented
+its lookup is written to the report as soon as the file is done. Reports are written
+as JSON Lines, or as CSV if the report file ends with .csv.
+"""
+
+import csv
+import json
+import sys
+from pathlib import Path
+from types import TracebackType
+from typing import Any, TextIO
+
+from archive_md_urls.cdx import parse_timestamp
+
+# Fields of each record, in the order of CSV columns
+FIELDS: tuple[str, ...] = (
+    "file",
+    "url",
+    "timestamp",
+    "snapshot",
+    "distance",
+    "stable",
+    "liveness",
+    "error",
+)
+
+
+def snapshot_distance(snapshot: str | None, timestamp: str | None) -> int | None:
+    """Return number of seconds between a snapshot and the requested timestamp.
+
+    Args:
+        snapshot (str | None): URL of Wayback Machine snapshot
+        timestamp (str | None): Requested timestamp (YYYYMMDDhhmm)
+
+    Returns:
+        int | None: Distance in seconds, None if there is no snapshot or timestamp
+    """
+    if not snapshot or not timestamp or "/web/" not in snapshot:
+        return None
+    try:
+        captured = parse_timestamp(snapshot.split("/web/", 1)[1].split("/", 1)[0])
+        requested = parse_timestamp(timestamp)
+    except ValueError:
+        return None
+    return int(abs((captured - requested).total_seconds()))
+
+
+class Report:
+    """Streaming JSON Lines or CSV report of URL decisions.
+
+    Args:
+        path (Path): Location of the report, standard output if '-'
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path: Path = path
+        self.file: TextIO = (
+            sys.stdout
+            if str(path) == "-"
+            # Line buffering writes every record to disk right away
+            else path.open("w", encoding="utf-8", newline="", buffering=1)
+        )
+        self.writer: csv.DictWriter[str] | None = None
+        if path.suffix.lower() == ".csv":
+            self.writer = csv.DictWriter(self.file, FIELDS)
+            self.writer.writeheader()
+
+    def __enter__(self) -> "Report":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    def record_file(
+        self,
+        file: Path,
+        timestamp: str | None,
+        wayback_urls: dict[str, str | None],
+        stable: dict[str, str],
+        failures: dict[str, str],
+        liveness: dict[str, str] | None = None,
+    ) -> None:
+        """Write records for all URLs of a processed file.
+
+        Args:
+            file (Path): Markdown file
+            timestamp (str | None): Timestamp of the lookups
+            wayback_urls (dict[str, str | None]): Looked up URLs and their snapshots
+            stable (dict[str, str]): Skipped URLs and the stable URL they matched
+            failures (dict[str, str]): URLs that couldn't be looked up and the error
+            liveness (dict[str, str] | None): Checked URLs and their state, URLs that
+                                              are alive weren't looked up
+        """
+        if liveness is None:
+            liveness = {}
+        for url, snapshot in wayback_urls.items():
+            self.write(
+                {
+                    "file": str(file),
+                    "url": url,
+                    "timestamp": timestamp,
+                    "snapshot": snapshot,
+                    "distance": snapshot_distance(snapshot, timestamp),
+                    "stable": None,
+                    "liveness": liveness.get(url),
+                    "error": failures.get(url),
+                }
+            )
+        for url, state in liveness.items():
+            if url not in wayback_urls:
+                self.write(
+                    {
+                        "file": str(file),
+                        "url": url,
+                        "timestamp": timestamp,
+                        "snapshot": None,
+                        "distance": None,
+                        "stable": None,
+                        "liveness": state,
+                        "error": None,
+                    }
+                )
+        for url, reason in stable.items():
+            self.write(
+                {
+                    "file": str(file),
+                    "url": url,
+                    "timestamp": timestamp,
+                    "snapshot": None,
+                    "distance": None,
+                    "stable": reason,
+                    "liveness": None,
+                    "error": None,
+                }
+            )
+
+    def write(self, record: dict[str, Any]) -> None:
+        """Append record to report.
+
+        Args:
+            record (dict[str, Any]): Record with the keys of FIELDS
+        """
+        if self.writer is not None:
+            self.writer.writerow(record)
+        else:
+            self.file.write(json.dumps(record) + "\n")
+
+    def close(self) -> None:
+        """Close report file, standard output is only flushed."""
+        if self.file is sys.stdout:
+            self.file.flush()
+        else:
+            self.file.close()
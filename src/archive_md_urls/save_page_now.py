@@ -0,0 +1,420 @@
+"""Ask the Wayback Machine to archive URLs that have no snapshot yet.
+
+URLs for which no snapshot was found are added to a durable queue, a small SQLite
+database next to the journal. A background worker submits them to Save Page Now and
+polls each capture job until it is done, with its own rate limiter, so that the
+slow Save Page Now API never holds up lookups or writing files.
+
+Nothing is written back into files by the worker itself: once a capture succeeded,
+cached lookups that found no snapshot for the URL are forgotten, so that the next
+run looks it up again and replaces the URL with the new snapshot. Submissions and
+capture jobs that are still pending when a run ends are resumed by the next run
+using the same queue.
+"""
+
+import asyncio
+import contextlib
+import sqlite3
+import time
+from pathlib import Path
+from types import TracebackType
+from typing import TYPE_CHECKING, Any
+
+from archive_md_urls.cache import SnapshotCache
+from archive_md_urls.gather_snapshots import SnapshotBackend
+from archive_md_urls.ratelimit import RateLimiter, parse_retry_after
+from archive_md_urls.stats import Stats
+
+if TYPE_CHECKING:
+    import httpx
+
+# Default location of the queue, relative to the working directory
+SAVE_QUEUE_PATH = Path(".archive-md-urls-saves.sqlite")
+SAVE_API: str = "https://web.archive.org/save"
+# Environment variable with archive.org S3 keys as 'ACCESS:SECRET'
+CREDENTIALS_ENV: str = "ARCHIVE_ORG_CREDENTIALS"
+# Save Page Now allows far fewer calls than the lookup APIs
+MAX_IN_FLIGHT: int = 2
+RATE: float = 0.2
+# Seconds between status checks of a capture job
+POLL_INTERVAL: float = 10.0
+# Seconds to wait after a failed call, and number of attempts before giving up
+RETRY_DELAY: float = 60.0
+MAX_ATTEMPTS: int = 5
+# Seconds to keep submitting and polling once all files are done
+WAIT: float = 60.0
+# Number of queued URLs and jobs handled at once
+BATCH_SIZE: int = 20
+
+# States of queued URLs
+QUEUED: str = "queued"
+PENDING: str = "pending"
+SAVED: str = "saved"
+FAILED: str = "failed"
+
+
+class SaveQueue:
+    """Durable queue of URLs to archive and their capture jobs.
+
+    Args:
+        path (Path): Location of the queue database, created if it doesn't exist
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path: Path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS saves (url TEXT PRIMARY KEY, "
+            + "state TEXT NOT NULL, job_id TEXT, snapshot TEXT, error TEXT, "
+            + "attempts INTEGER NOT NULL DEFAULT 0, next_check REAL NOT NULL)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS saves_next_check ON saves (state, next_check)"
+        )
+        self.connection.commit()
+
+    def __enter__(self) -> "SaveQueue":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    def add(self, url: str) -> bool:
+        """Queue URL unless it is already queued, saved or failed.
+
+        Args:
+            url (str): URL to archive
+
+        Returns:
+            bool: True if URL was added
+        """
+        cursor: sqlite3.Cursor = self.connection.execute(
+            "INSERT OR IGNORE INTO saves (url, state, next_check) VALUES (?, ?, 0)",
+            (url, QUEUED),
+        )
+        self.connection.commit()
+        return cursor.rowcount > 0
+
+    def state(self, url: str) -> str | None:
+        """Return state of a URL.
+
+        Args:
+            url (str): URL to archive
+
+        Returns:
+            str | None: QUEUED, PENDING, SAVED or FAILED, None if URL isn't queued
+        """
+        row: tuple[str] | None = self.connection.execute(
+            "SELECT state FROM saves WHERE url = ?", (url,)
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def due(self, now: float, limit: int = BATCH_SIZE) -> list[tuple[str, str, str]]:
+        """Return queued URLs and pending jobs that are due.
+
+        Args:
+            now (float): Current time (time.time())
+            limit (int): Maximum number of entries
+
+        Returns:
+            list[tuple[str, str, str]]: URL, state and job ID (empty if queued)
+        """
+        return self.connection.execute(
+            "SELECT url, state, coalesce(job_id, '') FROM saves "
+            + "WHERE state IN (?, ?) AND next_check <= ? ORDER BY next_check LIMIT ?",
+            (QUEUED, PENDING, now, limit),
+        ).fetchall()
+
+    def next_check(self) -> float | None:
+        """Return time at which the next queued URL or pending job is due.
+
+        Returns:
+            float | None: Time (time.time()), None if nothing is queued or pending
+        """
+        row: tuple[float | None] = self.connection.execute(
+            "SELECT min(next_check) FROM saves WHERE state IN (?, ?)", (QUEUED, PENDING)
+        ).fetchone()
+        return row[0]
+
+    def update(
+        self,
+        url: str,
+        state: str,
+        next_check: float = 0.0,
+        job_id: str | None = None,
+        snapshot: str | None = None,
+        error: str | None = None,
+    ) -> None:
+        """Record the progress of a URL.
+
+        Args:
+            url (str): Queued URL
+            state (str): New state of the URL
+            next_check (float): Time at which the URL is due again
+            job_id (str | None): ID of the capture job, kept if None
+            snapshot (str | None): URL of the new snapshot
+            error (str | None): Reason why the last call failed
+        """
+        self.connection.execute(
+            "UPDATE saves SET state = ?, next_check = ?, "
+            + "job_id = coalesce(?, job_id), snapshot = ?, error = ? WHERE url = ?",
+            (state, next_check, job_id, snapshot, error, url),
+        )
+        self.connection.commit()
+
+    def retry(self, url: str, error: str, next_check: float) -> None:
+        """Count failed call and give up on URL after MAX_ATTEMPTS.
+
+        Args:
+            url (str): Queued URL
+            error (str): Reason why the call failed
+            next_check (float): Time at which to try again
+        """
+        self.connection.execute(
+            "UPDATE saves SET attempts = attempts + 1, error = ?, next_check = ?, "
+            + "state = CASE WHEN attempts + 1 >= ? THEN ? ELSE state END WHERE url = ?",
+            (error, next_check, MAX_ATTEMPTS, FAILED, url),
+        )
+        self.connection.commit()
+
+    def counts(self) -> dict[str, int]:
+        """Return number of URLs in each state.
+
+        Returns:
+            dict[str, int]: Number of URLs by state
+        """
+        return dict(
+            self.connection.execute(
+                "SELECT state, count(*) FROM saves GROUP BY state"
+            ).fetchall()
+        )
+
+    def close(self) -> None:
+        """Close the database."""
+        self.connection.close()
+
+
+class SavePageNow:
+    """Background worker submitting queued URLs to Save Page Now.
+
+    Args:
+        queue (SaveQueue): Durable queue of URLs to archive
+        cache (SnapshotCache | None): Snapshot cache whose lookups without snapshot
+                                      are forgotten once a URL was archived
+        limiter (RateLimiter | None): Limits concurrency and rate of Save Page Now
+                                      calls, separately from lookups
+        poll_interval (float): Seconds between status checks of a capture job
+        retry_delay (float): Seconds to wait after a failed call
+        wait (float): Seconds to keep working once stopped, before leaving the rest
+                      to the next run
+        credentials (str | None): archive.org S3 access key and secret as
+                                  'ACCESS:SECRET', anonymous calls if None
+    """
+
+    def __init__(
+        self,
+        queue: SaveQueue,
+        cache: SnapshotCache | None = None,
+        limiter: RateLimiter | None = None,
+        poll_interval: float = POLL_INTERVAL,
+        retry_delay: float = RETRY_DELAY,
+        wait: float = WAIT,
+        credentials: str | None = None,
+    ) -> None:
+        self.queue: SaveQueue = queue
+        self.cache: SnapshotCache | None = cache
+        self.limiter: RateLimiter = limiter or RateLimiter(MAX_IN_FLIGHT, RATE)
+        self.poll_interval: float = poll_interval
+        self.retry_delay: float = retry_delay
+        self.wait: float = wait
+        self.headers: dict[str, str] = {"Accept": "application/json"}
+        if credentials:
+            self.headers["Authorization"] = f"LOW {credentials}"
+        self.client: httpx.AsyncClient | None = None
+        self.task: asyncio.Task[None] | None = None
+        self.wakeup = asyncio.Event()
+        self.stopping: bool = False
+        self.stats: Stats | None = None
+        self.backend: SnapshotBackend | None = None
+
+    def start(
+        self,
+        client: "httpx.AsyncClient",
+        stats: Stats | None = None,
+        backend: SnapshotBackend | None = None,
+    ) -> None:
+        """Start worker in the background.
+
+        Args:
+            client (httpx.AsyncClient): HTTPX AsyncClient to make API calls
+            stats (Stats | None): Counts queued, submitted, saved and failed URLs
+            backend (SnapshotBackend | None): Backend of lookups, told to forget
+                                              archived URLs
+        """
+        self.client = client
+        self.stats = stats
+        self.backend = backend
+        self.stopping = False
+        self.task = asyncio.create_task(self.run())
+
+    def submit(self, url: str) -> bool:
+        """Queue URL for archiving without waiting for it.
+
+        Args:
+            url (str): URL without snapshot
+
+        Returns:
+            bool: True if URL is waiting to be archived, False if it can't be
+                  archived (e.g. a relative link) or was already saved or given up on
+        """
+        if not url.lower().startswith(("http://", "https://")):
+            return False
+        if self.queue.add(url):
+            self.count("save_queued")
+            self.wakeup.set()
+            return True
+        return self.queue.state(url) in (QUEUED, PENDING)
+
+    async def stop(self) -> None:
+        """Let worker finish due work for up to wait seconds, then stop it."""
+        if self.task is None:
+            return
+        self.stopping = True
+        self.wakeup.set()
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(asyncio.shield(self.task), self.wait)
+        if not self.task.done():
+            self.task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self.task
+        self.task = None
+
+    async def run(self) -> None:
+        """Submit queued URLs and poll pending jobs until stopped and idle."""
+        while True:
+            now: float = time.time()
+            due: list[tuple[str, str, str]] = self.queue.due(now)
+            if due:
+                await asyncio.gather(
+                    *(self.advance(url, state, job_id) for url, state, job_id in due)
+                )
+                continue
+            next_check: float | None = self.queue.next_check()
+            if self.stopping and (next_check is None or next_check - now > self.wait):
+                return
+            self.wakeup.clear()
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(
+                    self.wakeup.wait(),
+                    None if next_check is None else max(next_check - now, 0.0),
+                )
+
+    async def advance(self, url: str, state: str, job_id: str) -> None:
+        """Submit a queued URL or poll its pending job.
+
+        Args:
+            url (str): Queued URL
+            state (str): QUEUED or PENDING
+            job_id (str): ID of the capture job of a pending URL
+        """
+        import httpx
+
+        try:
+            if state == QUEUED:
+                await self.submit_url(url)
+            else:
+                await self.poll_job(url, job_id)
+        except (httpx.HTTPError, ValueError, KeyError) as error:
+            self.queue.retry(url, repr(error), time.time() + self.retry_delay)
+
+    async def submit_url(self, url: str) -> None:
+        """Start capture job for URL.
+
+        Args:
+            url (str): Queued URL
+        """
+        response: dict[str, str] = await self.call("POST", SAVE_API, data={"url": url})
+        if "job_id" not in response:
+            self.queue.update(
+                url, FAILED, error=response.get("message", "no capture job started")
+            )
+            self.count("save_failed")
+            return
+        self.queue.update(
+            url, PENDING, time.time() + self.poll_interval, response["job_id"]
+        )
+        self.count("save_submitted")
+
+    async def poll_job(self, url: str, job_id: str) -> None:
+        """Check status of capture job and record its snapshot once done.
+
+        Args:
+            url (str): Queued URL
+            job_id (str): ID of the capture job
+        """
+        response: dict[str, str] = await self.call("GET", f"{SAVE_API}/status/{job_id}")
+        status: str = response.get("status", "")
+        if status == "pending":
+            self.queue.update(url, PENDING, time.time() + self.poll_interval)
+        elif status == "success":
+            snapshot: str = (
+                f"http://web.archive.org/web/{response['timestamp']}/"
+                + response.get("original_url", url)
+            )
+            self.queue.update(url, SAVED, snapshot=snapshot)
+            if self.cache is not None:
+                # Let the next run find the new snapshot
+                self.cache.forget_missing(url)
+            if self.backend is not None:
+                self.backend.forget(url)
+            self.count("saved")
+        else:
+            self.queue.update(
+                url, FAILED, error=response.get("message", status or "unknown status")
+            )
+            self.count("save_failed")
+
+    async def call(self, method: str, api_call: str, **kwargs: Any) -> Any:
+        """Call Save Page Now API and return JSON response.
+
+        Args:
+            method (str): HTTP method
+            api_call (str): URL of the API endpoint
+            **kwargs (Any): Further arguments of httpx.AsyncClient.request
+
+        Returns:
+            Any: JSON API response
+        """
+        import httpx
+
+        if self.client is None:
+            raise RuntimeError("SavePageNow worker wasn't started")
+        async with self.limiter:
+            response: httpx.Response = await self.client.request(
+                method,
+                api_call,
+                headers=self.headers,
+                **kwargs,
+            )
+        if response.status_code == httpx.codes.TOO_MANY_REQUESTS:
+            self.limiter.throttle(
+                parse_retry_after(response.headers.get("Retry-After"))
+            )
+        elif response.is_success:
+            self.limiter.succeeded()
+        response.raise_for_status()
+        return response.json()
+
+    def count(self, name: str) -> None:
+        """Increase counter of the Stats passed to start, if any.
+
+        Args:
+            name (str): Name of the counter
+        """
+        if self.stats is not None:
+            self.stats.count(name)
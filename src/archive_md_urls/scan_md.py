@@ -1,10 +1,37 @@
-"""Extract dates and URLs from Markdown files."""
+"""Extract dates and URLs from Markdown files.
 
+Python-Markdown and Beautiful Soup are only imported by the markdown engine, and
+dateutil only for dates that aren't formatted as YYYY-MM-DD, so scanning with the
+tokenizer doesn't load any of them.
+"""
+
+import datetime
+import functools
+import re
+import threading
 from pathlib import Path
+from typing import TYPE_CHECKING
+
+from archive_md_urls.linkscan import scan_front_matter, scan_links
+from archive_md_urls.stable import StableMatcher, StableRule
+
+if TYPE_CHECKING:
+    import markdown
+
+# Engines to extract URLs: 'tokenizer' scans the Markdown source directly, 'markdown'
+# converts it to HTML and parses the HTML
+ENGINES: tuple[str, ...] = ("tokenizer", "markdown")
+
+# Dates in the most common format of front matter and file names, YYYY-MM-DD
+ISO_DATE_RE = re.compile(r"(\d{4})-(\d{2})-(\d{2})")
+# Number of formatted dates kept in memory, file names share a handful of dates
+DATE_CACHE_SIZE: int = 4096
 
-import dateutil.parser
-import markdown
-from bs4 import BeautifulSoup
+# Markdown converters of the current thread, created once and reset between files
+CONVERTERS = threading.local()
+
+# Precision of snapshot timestamps and the length of timestamps truncated to it
+GRANULARITIES: dict[str, int] = {"minute": 12, "day": 8, "month": 6}
 
 # List of URLs considered stable and thus ignored
 STABLE_URLS: tuple[str, ...] = (
@@ -51,9 +78,17 @@ STABLE_URLS: tuple[str, ...] = (
     "http://papers.ssrn.com/abstract_id=",
     "http://zbmath.org/?format=complete&q=",
 )
+# Matcher for STABLE_URLS, used unless another one is provided
+STABLE_MATCHER = StableMatcher(StableRule("substring", url) for url in STABLE_URLS)
 
 
-def scan_md(md_source: str, md_file: Path) -> tuple[str | None, list[str]]:
+def scan_md(
+    md_source: str,
+    md_file: Path,
+    engine: str = "tokenizer",
+    stable: dict[str, str] | None = None,
+    matcher: StableMatcher | None = None,
+) -> tuple[str | None, list[str]]:
     """Extract date and URLs from specified Markdown file.
 
     To get the date, first try to extract it from Markdown meta information. If no date
@@ -61,17 +96,47 @@ def scan_md(md_source: str, md_file: Path) -> tuple[str | None, list[str]]:
     where files for blog posts start with YYYY-MM-DD. Next, try to format date for
     Wayback Machine API as YYYYMMDDhhmm.
 
+    By default, URLs are found by scanning the Markdown source for links. The markdown
+    engine converts the file to HTML first, which is much slower but follows
+    Python-Markdown's interpretation of the file to the letter.
+
     Args:
         md_source (str): Contents of the Markdown file
         md_file (Path): Markdown file path
+        engine (str): Engine used to extract URLs, one of ENGINES
+        stable (dict[str, str] | None): If provided, URLs considered stable are added
+                                        with the name of the rule they matched
+        matcher (StableMatcher | None): Rules for stable URLs, STABLE_MATCHER if None
 
     Returns:
         tuple[str | None, list[str]]: Formatted date (if found) and list of URLs
     """
-    html, date = convert_markdown(md_source)
-    if not date:
-        date = md_file.name[:10]
-    return format_date(date), filter_urls(get_urls(html))
+    if engine == "markdown":
+        html, date = convert_markdown(md_source)
+        urls: list[str] = get_urls(html)
+        if not date:
+            date = md_file.name[:10]
+    else:
+        date = extract_date(md_source, md_file)
+        urls = [link.url for link in scan_links(md_source)]
+    return format_date(date), filter_urls(urls, stable, matcher)
+
+
+def extract_date(md_source: str, md_file: Path) -> str:
+    """Extract unformatted date of Markdown file without rendering its body.
+
+    Only the front matter is parsed. If it contains no date, the first ten characters
+    of the file name (YYYY-MM-DD following the Jekyll naming convention) are used.
+
+    Args:
+        md_source (str): Contents of the Markdown file
+        md_file (Path): Markdown file path
+
+    Returns:
+        str: Date from Markdown metadata or beginning of file name
+    """
+    date: str | None = scan_front_matter(md_source)[0].get("date", [None])[0]
+    return date or md_file.name[:10]
 
 
 def convert_markdown(md_source: str) -> tuple[str, str | None]:
@@ -84,7 +149,7 @@ def convert_markdown(md_source: str) -> tuple[str, str | None]:
         tuple[str, dict[str, str | None]: HTML version of Markdown file and date from
                                              Markdown metadata
     """
-    md: markdown.core.Markdown = markdown.Markdown(extensions=["meta"])
+    md: markdown.core.Markdown = get_converter()
     html: str = md.convert(md_source)
     try:
         date: str | None = md.Meta["date"][0]
@@ -93,11 +158,34 @@ def convert_markdown(md_source: str) -> tuple[str, str | None]:
     return html, date
 
 
+def get_converter() -> "markdown.core.Markdown":
+    """Return Markdown converter of the current thread, ready to convert a file.
+
+    Loading extensions and setting up a converter takes longer than converting most
+    files, so each thread (and worker process) keeps one converter and resets it
+    between files instead.
+
+    Returns:
+        markdown.core.Markdown: Converter with the meta extension
+    """
+    md: markdown.core.Markdown | None = getattr(CONVERTERS, "md", None)
+    if md is None:
+        import markdown
+
+        md = CONVERTERS.md = markdown.Markdown(extensions=["meta"])
+    else:
+        md.reset()
+    return md
+
+
+@functools.lru_cache(maxsize=DATE_CACHE_SIZE)
 def format_date(date: str) -> str | None:
     """Format date according to Wayback Machine API format.
 
     Use dateutil.parser to recognize dates and return them as YYYYMMDDhhmm. If hour and
     minute aren't provided, they are set to 0. If format isn't recognized, return None.
+    Dates formatted as YYYY-MM-DD are formatted without dateutil, and results are
+    cached because many files share the same dates.
 
     Args:
         date (str): Date extracted from Markdown metadata or file name
@@ -105,6 +193,15 @@ def format_date(date: str) -> str | None:
     Returns:
         str | None: Date formatted as YYYYMMDDhhmm
     """
+    if match := ISO_DATE_RE.fullmatch(date):
+        try:
+            datetime.date(*map(int, match.groups()))
+        except ValueError:
+            pass
+        else:
+            return "".join(match.groups()) + "0000"
+    import dateutil.parser
+
     try:
         return dateutil.parser.parse(date).strftime("%Y%m%d%H%M")
     # Malformatted date or no date at the beginning of file name
@@ -112,7 +209,29 @@ def format_date(date: str) -> str | None:
         return None
 
 
-def filter_urls(md_urls: list[str]) -> list[str]:
+def bucket_timestamp(timestamp: str | None, granularity: str = "minute") -> str | None:
+    """Truncate timestamp to granularity.
+
+    Lookups with timestamps in the same bucket (e.g. the same day) mostly result in
+    the same snapshot, so truncating timestamps lets them share a single API call.
+
+    Args:
+        timestamp (str | None): Timestamp formatted as YYYYMMDDhhmm
+        granularity (str): One of GRANULARITIES
+
+    Returns:
+        str | None: Truncated timestamp (YYYYMMDDhhmm, YYYYMMDD or YYYYMM)
+    """
+    if timestamp is None:
+        return None
+    return timestamp[: GRANULARITIES[granularity]]
+
+
+def filter_urls(
+    md_urls: list[str],
+    stable: dict[str, str] | None = None,
+    matcher: StableMatcher | None = None,
+) -> list[str]:
     """Take and filter list of URLs for API calls.
 
     Filter out duplicates and remove URLs that are considered stable:
@@ -123,6 +242,9 @@ def filter_urls(md_urls: list[str]) -> list[str]:
 
     Args:
         md_urls (list[str]): List of URLs extracted from Markdown file
+        stable (dict[str, str] | None): If provided, filtered out URLs are added with
+                                        the name of the rule they matched
+        matcher (StableMatcher | None): Rules for stable URLs, STABLE_MATCHER if None
 
     Returns:
         list[str]: Filtered list of URLs
@@ -130,9 +252,16 @@ def filter_urls(md_urls: list[str]) -> list[str]:
     # Remove duplicates
     urls: list[str] = list(set(md_urls))
     # Filter out stable URLs
-    return [
-        url for url in urls if not any(stable_url in url for stable_url in STABLE_URLS)
-    ]
+    if matcher is None:
+        matcher = STABLE_MATCHER
+    filtered_urls: list[str] = []
+    for url in urls:
+        rule: StableRule | None = matcher.match(url)
+        if rule is None:
+            filtered_urls.append(url)
+        elif stable is not None:
+            stable[url] = rule.name
+    return filtered_urls
 
 
 def get_urls(html: str) -> list[str]:
@@ -144,5 +273,7 @@ def get_urls(html: str) -> list[str]:
     Returns:
         list[str]: URLs found in HTML
     """
+    from bs4 import BeautifulSoup
+
     soup = BeautifulSoup(html, "html.parser")
     return [a.get("href") for a in soup.find_all("a", href=True)]
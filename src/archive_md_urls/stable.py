@@ -0,0 +1,168 @@
+"""Match URLs against rules for URLs considered stable.
+
+Checking every URL against every stable URL one after the other gets slower with
+every rule that is added. StableMatcher indexes rules once instead: rules that start
+with a scheme and host (like most entries of STABLE_URLS) are looked up by the hosts
+found in a URL, domain rules by the URL's host and its parent domains, and the
+remaining substring rules are grouped by their first character. Only regular
+expression rules, each compiled once, are checked for every URL.
+
+Additional rules can be loaded from a JSON file that maps rule kinds to lists of
+patterns, for example::
+
+    {
+        "domain": ["example.org"],
+        "prefix": ["https://intranet.example.com/"],
+        "substring": ["/permalink/"],
+        "regex": ["^https://gist\\.github\\.com/[^/]+/[0-9a-f]+$"]
+    }
+"""
+
+import json
+import re
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any, NamedTuple
+from urllib.parse import urlsplit
+
+# Kinds of rules: 'substring' matches anywhere in a URL, 'prefix' at its beginning,
+# 'domain' the host of the URL or any of its subdomains, 'regex' is searched in it
+RULE_KINDS: tuple[str, ...] = ("substring", "prefix", "domain", "regex")
+
+
+class StableRule(NamedTuple):
+    """Pattern of a stable URL and how it is matched."""
+
+    kind: str
+    pattern: str
+
+    @property
+    def name(self) -> str:
+        """Describe rule, substring rules are described by their pattern alone."""
+        if self.kind == "substring":
+            return self.pattern
+        return f"{self.kind}:{self.pattern}"
+
+
+class StableMatcher:
+    """Find the rule a stable URL matches.
+
+    Args:
+        rules (Iterable[StableRule]): Rules for stable URLs
+    """
+
+    def __init__(self, rules: Iterable[StableRule]) -> None:
+        self.rules: list[StableRule] = list(rules)
+        # Substring and prefix rules with scheme and host, by host. Each rule is
+        # stored with the position of '://' in its pattern.
+        self.hosts: dict[str, list[tuple[int, StableRule]]] = {}
+        self.domains: dict[str, StableRule] = {}
+        # Remaining substring rules, by first character
+        self.substrings: dict[str, list[StableRule]] = {}
+        self.prefixes: list[StableRule] = []
+        regex_rules: list[StableRule] = []
+        for rule in self.rules:
+            if rule.kind == "domain":
+                self.domains.setdefault(rule.pattern.lower().strip("."), rule)
+                continue
+            if rule.kind == "regex":
+                regex_rules.append(rule)
+                continue
+            separator: int = rule.pattern.find("://")
+            host_end: int = rule.pattern.find("/", separator + 3)
+            if separator >= 0 and host_end >= 0:
+                host: str = rule.pattern[separator + 3 : host_end]
+                self.hosts.setdefault(host, []).append((separator, rule))
+            elif rule.kind == "prefix":
+                self.prefixes.append(rule)
+            else:
+                self.substrings.setdefault(rule.pattern[:1], []).append(rule)
+        # Patterns are compiled separately, as inline flags and backreferences of
+        # one rule would break a combined pattern
+        self.regexes: list[tuple[re.Pattern[str], StableRule]] = [
+            (re.compile(rule.pattern), rule) for rule in regex_rules
+        ]
+
+    def match(self, url: str) -> StableRule | None:
+        """Find a rule that URL matches.
+
+        Args:
+            url (str): URL to check
+
+        Returns:
+            StableRule | None: Matching rule, None if URL isn't stable
+        """
+        # A pattern starting with scheme and host can only occur in a URL where the
+        # URL contains '://' followed by the same host
+        separator: int = url.find("://")
+        while separator >= 0:
+            host_end: int = url.find("/", separator + 3)
+            if host_end >= 0:
+                for offset, rule in self.hosts.get(url[separator + 3 : host_end], ()):
+                    start: int = separator - offset
+                    if (
+                        start >= 0
+                        and url.startswith(rule.pattern, start)
+                        and (rule.kind == "substring" or start == 0)
+                    ):
+                        return rule
+            separator = url.find("://", separator + 3)
+        if self.domains:
+            try:
+                hostname: str | None = urlsplit(url).hostname
+            except ValueError:
+                hostname = None
+            if hostname:
+                labels: list[str] = hostname.split(".")
+                for index in range(len(labels)):
+                    if (rule := self.domains.get(".".join(labels[index:]))) is not None:
+                        return rule
+        for first_character, rules in self.substrings.items():
+            if first_character in url:
+                for rule in rules:
+                    if rule.pattern in url:
+                        return rule
+        for rule in self.prefixes:
+            if url.startswith(rule.pattern):
+                return rule
+        for regex, rule in self.regexes:
+            if regex.search(url):
+                return rule
+        return None
+
+
+def load_stable_rules(path: Path) -> list[StableRule]:
+    """Load rules for stable URLs from a JSON file.
+
+    Args:
+        path (Path): JSON file mapping kinds of rules to lists of patterns
+
+    Raises:
+        ValueError: File isn't valid JSON, contains an unknown kind of rule or an
+                    invalid regular expression
+
+    Returns:
+        list[StableRule]: Rules in the order of the file
+    """
+    config: Any = json.loads(path.read_text(encoding="utf-8"))
+    if not isinstance(config, dict):
+        raise ValueError("expected an object mapping kinds of rules to patterns")
+    rules: list[StableRule] = []
+    for kind, patterns in config.items():
+        if kind not in RULE_KINDS:
+            raise ValueError(
+                f"unknown kind of rule '{kind}', "
+                + f"expected one of {', '.join(RULE_KINDS)}"
+            )
+        if not isinstance(patterns, list) or not all(
+            isinstance(pattern, str) and pattern for pattern in patterns
+        ):
+            raise ValueError(f"expected a list of patterns for '{kind}'")
+        for pattern in patterns:
+            if kind == "regex":
+                try:
+                    re.compile(pattern)
+                except re.error as error:
+                    raise ValueError(f"invalid regex '{pattern}': {error}") from error
+            rules.append(StableRule(kind, pattern))
+    return rules
@@ -0,0 +1,280 @@
+"""Count what a run does and time where it spends its time.
+
+Stats collects counters (files, URLs, lookups, stable skips, alive URLs, cache hits,
+API calls, retries, 429 responses, ...), the time spent in each pipeline stage and a
+histogram of API call latencies. They can be printed at the end of a run or exported
+as JSON or in the Prometheus textfile format. A whole run can also be profiled with
+cProfile or pyinstrument.
+
+update_files makes its Stats available as active_stats while it runs, which is how
+API calls made deep inside snapshot backends report their latency and retries.
+"""
+
+import contextlib
+import contextvars
+import cProfile
+import itertools
+import json
+import math
+import sys
+import time
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any
+
+# Upper bounds in seconds of the buckets of the API latency histogram
+LATENCY_BUCKETS: tuple[float, ...] = (
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    math.inf,
+)
+# Counters of a run, which are reported even if they remain 0
+COUNTERS: tuple[str, ...] = (
+    "files",
+    "written",
+    "bytes",
+    "unchanged",
+    "urls",
+    "changed_urls",
+    "stable",
+    "alive",
+    "liveness_checks",
+    "unique_lookups",
+    "lookups_saved",
+    "cache_hits",
+    "cache_misses",
+    "api_calls",
+    "retries",
+    "throttled",
+    "failed",
+    "save_queued",
+    "save_submitted",
+    "saved",
+    "save_failed",
+)
+# Prefix of metric names in the Prometheus textfile format
+METRIC_PREFIX: str = "archive_md_urls"
+
+
+class Stats:
+    """Counters, stage timers and API latency histogram of a run."""
+
+    def __init__(self) -> None:
+        self.counters: dict[str, int] = dict.fromkeys(COUNTERS, 0)
+        # Seconds spent in each stage, summed over concurrent workers
+        self.stages: dict[str, float] = {}
+        self.latency_buckets: list[int] = [0] * len(LATENCY_BUCKETS)
+        self.latency_sum: float = 0.0
+        self.latency_count: int = 0
+
+    def count(self, name: str, value: int = 1) -> None:
+        """Increase counter.
+
+        Args:
+            name (str): Name of the counter
+            value (int): Amount to add
+        """
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def __getitem__(self, name: str) -> int:
+        return self.counters.get(name, 0)
+
+    @contextlib.contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        """Add time spent in the with block to a stage.
+
+        Args:
+            stage (str): Name of the stage
+        """
+        start: float = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[stage] = (
+                self.stages.get(stage, 0.0) + time.perf_counter() - start
+            )
+
+    def observe_latency(self, seconds: float) -> None:
+        """Add latency of an API call to the histogram.
+
+        Args:
+            seconds (float): Time between sending the request and the response
+        """
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.latency_buckets[index] += 1
+                break
+        self.latency_sum += seconds
+        self.latency_count += 1
+
+    def to_dict(self) -> dict[str, Any]:
+        """Return all stats as JSON-serializable dict.
+
+        Returns:
+            dict[str, Any]: Counters, stage times and cumulative latency histogram
+        """
+        return {
+            "counters": dict(sorted(self.counters.items())),
+            "stages": {
+                stage: round(seconds, 6) for stage, seconds in self.stages.items()
+            },
+            "api_latency": {
+                "buckets": {
+                    format_bound(bound): cumulative
+                    for bound, cumulative in zip(
+                        LATENCY_BUCKETS, self.cumulative_buckets()
+                    )
+                },
+                "sum": round(self.latency_sum, 6),
+                "count": self.latency_count,
+            },
+        }
+
+    def to_prometheus(self) -> str:
+        """Return all stats in the Prometheus textfile format.
+
+        Returns:
+            str: Counters, stage times and latency histogram as Prometheus metrics
+        """
+        lines: list[str] = []
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name}_total counter")
+            lines.append(f"{METRIC_PREFIX}_{name}_total {value}")
+        stage_seconds: str = f"{METRIC_PREFIX}_stage_seconds_total"
+        lines.append(f"# TYPE {stage_seconds} counter")
+        for stage, seconds in self.stages.items():
+            lines.append(f'{stage_seconds}{{stage="{stage}"}} {seconds:.6f}')
+        latency: str = f"{METRIC_PREFIX}_api_latency_seconds"
+        lines.append(f"# TYPE {latency} histogram")
+        for bound, cumulative in zip(LATENCY_BUCKETS, self.cumulative_buckets()):
+            lines.append(f'{latency}_bucket{{le="{format_bound(bound)}"}} {cumulative}')
+        lines.append(f"{latency}_sum {self.latency_sum:.6f}")
+        lines.append(f"{latency}_count {self.latency_count}")
+        return "\n".join(lines) + "\n"
+
+    def format(self) -> str:
+        """Return all stats as human-readable text.
+
+        Returns:
+            str: One line per counter, stage and non-empty latency bucket
+        """
+        lines: list[str] = ["Counters:"]
+        lines.extend(
+            f"  {name:<20} {value:>10}" for name, value in sorted(self.counters.items())
+        )
+        lines.append("Stage times (seconds, summed over workers):")
+        lines.extend(
+            f"  {stage:<20} {seconds:>10.3f}" for stage, seconds in self.stages.items()
+        )
+        lines.append(f"API calls by latency (mean {self.mean_latency():.3f}s):")
+        lower: str = "0"
+        for bound, calls in zip(LATENCY_BUCKETS, self.latency_buckets):
+            if calls:
+                bucket: str = f"{lower}-{format_bound(bound)}s"
+                lines.append(f"  {bucket:<20} {calls:>10}")
+            lower = format_bound(bound)
+        return "\n".join(lines)
+
+    def write(self, path: Path) -> None:
+        """Export stats, in the Prometheus textfile format if path ends with .prom.
+
+        Args:
+            path (Path): Location of the exported file, JSON unless it ends with .prom
+        """
+        if path.suffix == ".prom":
+            content: str = self.to_prometheus()
+        else:
+            content = json.dumps(self.to_dict(), indent=2) + "\n"
+        # Write to a temporary file first, so that collectors never read partial files
+        temporary: Path = path.with_name(f".{path.name}.tmp")
+        temporary.write_text(content, encoding="utf-8")
+        temporary.replace(path)
+
+    def cumulative_buckets(self) -> list[int]:
+        """Return number of API calls at or below each bucket's upper bound.
+
+        Returns:
+            list[int]: Cumulative counts, in the order of LATENCY_BUCKETS
+        """
+        return list(itertools.accumulate(self.latency_buckets))
+
+    def mean_latency(self) -> float:
+        """Return mean latency of API calls.
+
+        Returns:
+            float: Mean latency in seconds, 0 if no API call was made
+        """
+        return self.latency_sum / self.latency_count if self.latency_count else 0.0
+
+
+def format_bound(bound: float) -> str:
+    """Format upper bound of a histogram bucket like Prometheus.
+
+    Args:
+        bound (float): Upper bound in seconds
+
+    Returns:
+        str: Bound without trailing zeros, '+Inf' for infinity
+    """
+    return "+Inf" if math.isinf(bound) else f"{bound:g}"
+
+
+# Stats of the running update_files call, if any
+active_stats: contextvars.ContextVar[Stats | None] = contextvars.ContextVar(
+    "active_stats", default=None
+)
+
+
+def record_retry(retry_state: Any) -> None:
+    """Count retried API call, called by tenacity before waiting for the retry.
+
+    Args:
+        retry_state (tenacity.RetryCallState): State of the retried call
+    """
+    stats: Stats | None = active_stats.get()
+    if stats is not None:
+        stats.count("retries")
+
+
+@contextlib.contextmanager
+def profile(path: Path) -> Iterator[None]:
+    """Profile the with block and save the result.
+
+    Profiles are recorded with cProfile and saved in its binary format (to be read
+    with pstats or a viewer like snakeviz), unless path ends with .html, in which case
+    pyinstrument (if installed) records the profile and saves it as HTML page.
+
+    Args:
+        path (Path): Location of the saved profile
+    """
+    if path.suffix == ".html":
+        try:
+            import pyinstrument
+        except ImportError:
+            sys.exit(
+                "HTML profiles require the pyinstrument package, install it with "
+                + "'pip install archive-md-urls[profile]'."
+            )
+        html_profiler = pyinstrument.Profiler(async_mode="enabled")
+        html_profiler.start()
+        try:
+            yield
+        finally:
+            html_profiler.stop()
+            path.write_text(html_profiler.output_html(), encoding="utf-8")
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(path)
@@ -1,51 +1,767 @@
 """Turn URLs in Markdown files to Wayback snapshots."""
 
-import re
+import asyncio
+import contextlib
+import contextvars
+import hashlib
+import itertools
+import os
+import shutil
+import stat
+import tempfile
+import time
+from collections.abc import Awaitable, Callable, Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import TYPE_CHECKING, Any, BinaryIO, NamedTuple
 
-from archive_md_urls.gather_snapshots import gather_snapshots
-from archive_md_urls.scan_md import scan_md
+from archive_md_urls.cache import LIVENESS_TTL, SnapshotCache
+from archive_md_urls.gather_snapshots import (
+    SnapshotBackend,
+    create_client,
+    gather_snapshots,
+)
+from archive_md_urls.journal import Journal
+from archive_md_urls.linkscan import Link, iter_blocks, scan_links
+from archive_md_urls.liveness import ALIVE, gather_liveness
+from archive_md_urls.manifest import Manifest, hash_source
+from archive_md_urls.ratelimit import RateLimiter
+from archive_md_urls.report import Report
+from archive_md_urls.save_page_now import SavePageNow
+from archive_md_urls.scan_md import (
+    bucket_timestamp,
+    extract_date,
+    filter_urls,
+    format_date,
+    scan_md,
+)
+from archive_md_urls.stable import StableMatcher
+from archive_md_urls.stats import Stats, active_stats
 
+if TYPE_CHECKING:
+    import httpx
 
-async def update_files(files: list[Path]) -> None:
+# Default number of concurrent workers for each pipeline stage
+SCAN_WORKERS: int = 2
+LOOKUP_WORKERS: int = 8
+WRITE_WORKERS: int = 2
+# Maximum number of files waiting between two pipeline stages
+QUEUE_SIZE: int = 64
+# Number of files scanned together by a worker
+CHUNK_SIZE: int = 16
+# Files larger than this (in bytes) are scanned and rewritten block by block
+LARGE_FILE_THRESHOLD: int = 32 * 1024 * 1024
+# Minimum number of characters in a block of a large file
+BLOCK_SIZE: int = 1024 * 1024
+
+
+class ScannedFile(NamedTuple):
+    """Markdown file with its content hash and the date and URLs found in it.
+
+    URLs are None (and the content empty) if the file wasn't scanned because its
+    content is unchanged since it was last processed. Stable URLs map URLs that are
+    not looked up to the name of the stable URL rule they matched. Liveness maps
+    checked URLs to their state, if liveness checks are enabled. Saving are the URLs
+    waiting to be archived by Save Page Now. The content of large files is not kept,
+    they are read again block by block when they are written.
+    """
+
+    path: Path
+    md_source: str
+    date: str | None
+    urls: list[str] | None
+    digest: str
+    stable: dict[str, str]
+    liveness: dict[str, str]
+    large: bool = False
+    saving: frozenset[str] = frozenset()
+
+
+class FileResult(NamedTuple):
+    """Outcome of updating a Markdown file.
+
+    Snapshots map the URLs looked up for the file to their snapshots (None if none
+    was found), failures the URLs that couldn't be looked up to the reason why.
+    """
+
+    path: Path
+    snapshots: dict[str, str | None]
+    failures: dict[str, str]
+    changed: bool
+
+
+async def update_files(
+    files: Iterable[Path],
+    *,
+    scan_workers: int = SCAN_WORKERS,
+    lookup_workers: int = LOOKUP_WORKERS,
+    write_workers: int = WRITE_WORKERS,
+    queue_size: int = QUEUE_SIZE,
+    client: "httpx.AsyncClient | None" = None,
+    cache: SnapshotCache | None = None,
+    limiter: RateLimiter | None = None,
+    backend: SnapshotBackend | None = None,
+    journal: Journal | None = None,
+    engine: str = "tokenizer",
+    jobs: int = 1,
+    manifest: Manifest | None = None,
+    report: Report | None = None,
+    dry_run: bool = False,
+    matcher: StableMatcher | None = None,
+    granularity: str = "minute",
+    stats: Stats | None = None,
+    results: asyncio.Queue[FileResult | None] | None = None,
+    print_summary: bool = True,
+    check_liveness: bool = False,
+    liveness_limiter: RateLimiter | None = None,
+    saver: SavePageNow | None = None,
+    large_file_threshold: int | None = LARGE_FILE_THRESHOLD,
+) -> None:
     """Scan and update URLs in Markdown files.
 
-    File contents are updated in-place.
+    File contents are updated in-place. Files pass through a pipeline of three
+    stages connected by bounded queues (scan, lookup and write), so that reading
+    files, calling the Wayback Machine API and writing files overlap. If no client
+    is provided, one is created for the run and closed once it is done.
 
     Args:
-        files (list[Path]): List of Markdown files to scan and update
+        files (Iterable[Path]): Markdown files to scan and update
+        scan_workers (int): Number of chunks of files scanned concurrently by threads
+        lookup_workers (int): Number of files for which snapshots are gathered
+                              concurrently
+        write_workers (int): Number of files updated and written concurrently
+        queue_size (int): Maximum number of files waiting between two stages
+        client (httpx.AsyncClient | None): HTTPX AsyncClient shared by all API calls
+        cache (SnapshotCache | None): Persistent cache for lookup results
+        limiter (RateLimiter | None): Limits concurrency and rate of API calls
+        backend (SnapshotBackend | None): Backend used for snapshot lookups
+        journal (Journal | None): Checkpoint of completed files and resolved lookups
+        engine (str): Engine used to extract URLs from Markdown files
+        jobs (int): Number of processes scanning files, no processes are started if 1
+        manifest (Manifest | None): State of files processed in previous runs
+        report (Report | None): Report of looked up and skipped URLs
+        dry_run (bool): Don't write files, only report what would be changed
+        matcher (StableMatcher | None): Rules for stable URLs, which are not looked
+                                        up, STABLE_URLS if None
+        granularity (str): Precision of lookup timestamps, one of GRANULARITIES
+        stats (Stats | None): Collects counters, stage times and API latencies
+        results (asyncio.Queue[FileResult | None] | None): Receives the result of
+            each processed file as soon as it is done, followed by None once all
+            files are done
+        print_summary (bool): Print summary of the run
+        check_liveness (bool): Only look up URLs that are no longer alive
+        liveness_limiter (RateLimiter | None): Limits concurrency and rate of liveness
+                                               checks
+        saver (SavePageNow | None): Started worker archiving URLs without snapshot
+        large_file_threshold (int | None): Size in bytes above which files are
+                                           processed block by block, never if None
+
+    Raises:
+        ValueError: A stage has less than one worker
+        JournalInUseError: Another run is using the journal
     """
-    # Keep count of changed URLs to summarize changes to user
-    changed_urls: int = 0
-    for file in files:
-        md_source: str = file.read_text(encoding="utf-8")
-        date, urls = scan_md(md_source, file)
+    if min(scan_workers, lookup_workers, write_workers) < 1:
+        raise ValueError("Each stage needs at least one worker")
+    if limiter is None:
+        limiter = RateLimiter()
+    if check_liveness and liveness_limiter is None:
+        liveness_limiter = RateLimiter()
+    # Keep count of processed files and URLs to summarize changes to user
+    if stats is None:
+        stats = Stats()
+    # Stats might be shared with previous runs, the summary only covers this one
+    counters_before: dict[str, int] = dict(stats.counters)
+    # URL-date pairs looked up during this run, shared by all files
+    lookups: dict[tuple[str, str | None], asyncio.Future[str | None]] = {}
+    # URL-date pairs checked for liveness during this run
+    checks: dict[tuple[str, str | None], asyncio.Future[str]] = {}
+    # URL-date pairs before and after truncating dates, to count saved lookups
+    requested: set[tuple[str, str | None]] = set()
+    bucketed: set[tuple[str, str | None]] = set()
+    if journal is not None:
+        journal.open()
+        # Skip completed files and reuse lookups resolved in previous runs
+        files = (file for file in files if not journal.is_completed(file))
+        for key, snapshot in journal.snapshots.items():
+            lookups[key] = asyncio.get_running_loop().create_future()
+            lookups[key].set_result(snapshot)
+    if manifest is not None:
+        files = skip_unchanged(files, manifest, stats)
+
+    pool: ProcessPoolExecutor | None = ProcessPoolExecutor(jobs) if jobs > 1 else None
+
+    async def scan(chunk: list[Path]) -> list[ScannedFile]:
+        """Read and scan chunk of files in a thread, or in a process with jobs.
+
+        Files whose content hash matches the manifest are not scanned again, and
+        files above large_file_threshold are scanned block by block.
+        """
+        digests: list[str | None] | None = None
+        if manifest is not None:
+            digests = [manifest.digest(file) for file in chunk]
+        with stats.timer("scan"):
+            if pool is None:
+                return await asyncio.to_thread(
+                    scan_files, chunk, engine, digests, matcher, large_file_threshold
+                )
+            return await asyncio.get_running_loop().run_in_executor(
+                pool, scan_files, chunk, engine, digests, matcher, large_file_threshold
+            )
+
+    async def lookup(
+        scanned_file: ScannedFile,
+    ) -> tuple[ScannedFile, dict[str, str | None], dict[str, str]]:
+        """Gather snapshots for the URLs of a scanned file.
+
+        Each URL-date pair (with dates truncated to granularity) is looked up once
+        per run, and not at all if found in the journal or cache. With a manifest,
+        only URLs that weren't processed before are looked up, and with liveness
+        checks only URLs that are no longer alive. Failed lookups leave URLs
+        unchanged, URLs without snapshot are handed to the saver.
+        """
+        urls: list[str] = scanned_file.urls or []
+        if manifest is not None:
+            # Only look up URLs that are new since the file was last processed
+            processed_urls: set[str] = manifest.processed_urls(scanned_file.path)
+            urls = [url for url in urls if url not in processed_urls]
+        timestamp: str | None = bucket_timestamp(scanned_file.date, granularity)
+        if timestamp != scanned_file.date:
+            requested.update((url, scanned_file.date) for url in urls)
+            bucketed.update((url, timestamp) for url in urls)
+            scanned_file = scanned_file._replace(date=timestamp)
+        if check_liveness:
+            # Only URLs that are no longer alive need snapshots
+            with stats.timer("liveness"):
+                liveness: dict[str, str] = await gather_liveness(
+                    urls, scanned_file.date, client, checks, cache, liveness_limiter
+                )
+            scanned_file = scanned_file._replace(liveness=liveness)
+            urls = [url for url in urls if liveness[url] != ALIVE]
+            stats.count("alive", len(liveness) - len(urls))
         # Call API and collect snapshots
-        wayback_urls: dict[str, str | None] = await gather_snapshots(urls, date)
-        # Update links in file source and write file
-        updated_md_source: str = update_md_source(md_source, wayback_urls)
-        file.write_text(updated_md_source, encoding="utf-8")
-        changed_urls += len([item for item in wayback_urls.values() if item])
+        failures: dict[str, str] = {}
+        with stats.timer("lookup"):
+            wayback_urls: dict[str, str | None] = await gather_snapshots(
+                urls,
+                scanned_file.date,
+                client,
+                lookups,
+                cache,
+                limiter,
+                backend,
+                failures,
+            )
+        stats.count("urls", len(urls))
+        stats.count("stable", len(scanned_file.stable))
+        stats.count("failed", len(failures))
+        if saver is not None and not dry_run:
+            scanned_file = scanned_file._replace(
+                saving=frozenset(
+                    url
+                    for url, snapshot in wayback_urls.items()
+                    if snapshot is None and url not in failures and saver.submit(url)
+                )
+            )
+        if journal is not None:
+            for url, snapshot in wayback_urls.items():
+                if url in failures:
+                    journal.record_failure(url, scanned_file.date, failures[url])
+                else:
+                    journal.record_lookup(url, scanned_file.date, snapshot)
+        return scanned_file, wayback_urls, failures
+
+    async def write(
+        item: tuple[ScannedFile, dict[str, str | None], dict[str, str]],
+    ) -> None:
+        """Replace URLs with snapshots and write file if any of them changed.
+
+        The file is then added to the report, recorded as completed in the journal
+        unless lookups failed, and its state is recorded in the manifest. In a dry
+        run, nothing is written and neither journal nor manifest are updated.
+        """
+        scanned_file, wayback_urls, failures = item
+        file: Path = scanned_file.path
+        if scanned_file.urls is None:
+            # Content unchanged, only the modification time needs to be recorded
+            stats.count("unchanged")
+            if manifest is not None:
+                manifest.update(file, scanned_file.digest)
+            if results is not None:
+                await results.put(FileResult(file, {}, {}, False))
+            return
+        if report is not None:
+            report.record_file(
+                file,
+                scanned_file.date,
+                wayback_urls,
+                scanned_file.stable,
+                failures,
+                scanned_file.liveness,
+            )
+        # Update links in file source and write file if any of them changed
+        digest: str = scanned_file.digest
+        changed: bool = False
+        if scanned_file.large:
+            with stats.timer("write"):
+                rewritten: tuple[int, str] | None = await asyncio.to_thread(
+                    rewrite_large_file, file, wayback_urls, dry_run
+                )
+            if rewritten is not None:
+                changed = True
+                stats.count("bytes", rewritten[0])
+                digest = rewritten[1]
+        else:
+            with stats.timer("rewrite"):
+                updated_md_source: str = update_md_source(
+                    scanned_file.md_source, wayback_urls
+                )
+            if updated_md_source != scanned_file.md_source:
+                changed = True
+                digest = hash_source(updated_md_source)
+                if dry_run:
+                    stats.count("bytes", len(updated_md_source.encode("utf-8")))
+                else:
+                    with stats.timer("write"):
+                        stats.count(
+                            "bytes",
+                            await asyncio.to_thread(
+                                write_atomic, file, updated_md_source
+                            ),
+                        )
+        if changed:
+            stats.count("written")
+        stats.count("files")
+        stats.count(
+            "changed_urls", len([item for item in wayback_urls.values() if item])
+        )
+        if results is not None:
+            await results.put(FileResult(file, wayback_urls, failures, changed))
+        if dry_run:
+            return
+        if journal is not None and not failures:
+            journal.record_file(file)
+        if manifest is not None:
+            # Failed URLs are not recorded so they are looked up again next time,
+            # nor are URLs queued for archiving. The file is marked as pending so it
+            # isn't skipped as unchanged. Alive URLs are checked again once their
+            # liveness checks expire.
+            unprocessed: set[str] = set(failures) | scanned_file.saving
+            manifest.update(
+                file,
+                digest,
+                (set(scanned_file.urls) | manifest.processed_urls(file)) - unprocessed,
+                pending=bool(unprocessed),
+                alive={
+                    url
+                    for url, state in scanned_file.liveness.items()
+                    if state == ALIVE
+                },
+                liveness_ttl=LIVENESS_TTL if cache is None else cache.liveness_ttl,
+            )
+
+    to_scan: asyncio.Queue[Any] = asyncio.Queue(maxsize=queue_size)
+    scanned: asyncio.Queue[Any] = asyncio.Queue(maxsize=queue_size)
+    resolved: asyncio.Queue[Any] = asyncio.Queue(maxsize=queue_size)
+    start: float = time.perf_counter()
+    # The cache might be shared with previous runs
+    cache_hits, cache_misses = (cache.hits, cache.misses) if cache else (0, 0)
+    # Let API calls report their latency and retries
+    token: contextvars.Token[Stats | None] = active_stats.set(stats)
+    try:
+        async with contextlib.AsyncExitStack() as stack:
+            if client is None:
+                client = await stack.enter_async_context(create_client())
+            await run_pipeline(
+                feed_queue(chunked(files, CHUNK_SIZE), to_scan),
+                # Keep a second chunk queued for each process
+                run_stage(
+                    scan, 2 * jobs if pool else scan_workers, to_scan, scanned, True
+                ),
+                run_stage(lookup, lookup_workers, scanned, resolved),
+                run_stage(write, write_workers, resolved),
+            )
+    finally:
+        active_stats.reset(token)
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        if results is not None:
+            await results.put(None)
+    elapsed: float = max(time.perf_counter() - start, 1e-9)
+    stats.count("unique_lookups", len(lookups))
+    stats.count("lookups_saved", len(requested) - len(bucketed))
+    if cache is not None:
+        stats.count("cache_hits", cache.hits - cache_hits)
+        stats.count("cache_misses", cache.misses - cache_misses)
+    if not print_summary:
+        return
+    counts: dict[str, int] = {
+        name: value - counters_before.get(name, 0)
+        for name, value in stats.counters.items()
+    }
+    changed_urls, written = counts["changed_urls"], counts["written"]
+    print(
+        f"{'Would change' if dry_run else 'Changed'} {changed_urls} "
+        + f"{'URL' if changed_urls == 1 else 'URLs'} "
+        + f"in {written} {'file' if written == 1 else 'files'} "
+        + f"({counts['files'] / elapsed:.1f} files/s, "
+        + f"{counts['urls'] / elapsed:.1f} URLs/s, "
+        + f"{len(lookups)} unique {'lookup' if len(lookups) == 1 else 'lookups'})."
+    )
     print(
-        f"Changed {changed_urls} {'URL' if changed_urls == 1 else 'URLs'} "
-        + f"in {len(files)} {'file' if len(files) == 1 else 'files'}."
+        f"{'Would write' if dry_run else 'Wrote'} {counts['bytes']} "
+        + f"{'byte' if counts['bytes'] == 1 else 'bytes'}."
     )
+    if counts["lookups_saved"]:
+        saved: int = counts["lookups_saved"]
+        print(
+            f"Truncating timestamps to the {granularity} saved {saved} "
+            + f"{'lookup' if saved == 1 else 'lookups'}."
+        )
+    if counts["alive"]:
+        print(
+            f"Left {counts['alive']} "
+            + f"{'URL' if counts['alive'] == 1 else 'URLs'} unchanged because "
+            + f"{'it is' if counts['alive'] == 1 else 'they are'} still alive."
+        )
+    if counts["save_queued"]:
+        queued: int = counts["save_queued"]
+        print(
+            f"Queued {queued} {'URL' if queued == 1 else 'URLs'} without snapshot "
+            + "for archiving with Save Page Now."
+        )
+    if counts["unchanged"]:
+        print(
+            f"Skipped {counts['unchanged']} unchanged "
+            + f"{'file' if counts['unchanged'] == 1 else 'files'}."
+        )
+    if counts["failed"]:
+        print(
+            f"{counts['failed']} {'URL' if counts['failed'] == 1 else 'URLs'} "
+            + "couldn't be looked up because the API appears unresponsive and "
+            + "remained unchanged."
+        )
+
+
+def scan_files(
+    files: list[Path],
+    engine: str = "tokenizer",
+    digests: list[str | None] | None = None,
+    matcher: StableMatcher | None = None,
+    large_file_threshold: int | None = None,
+) -> list[ScannedFile]:
+    """Read and scan chunk of Markdown files.
+
+    Args:
+        files (list[Path]): Markdown files to scan
+        engine (str): Engine used to extract URLs from Markdown files
+        digests (list[str | None] | None): Content hashes of files when they were
+                                           last processed, files whose content still
+                                           has the same hash are not scanned
+        matcher (StableMatcher | None): Rules for stable URLs, STABLE_URLS if None
+        large_file_threshold (int | None): Size in bytes above which files are
+                                           scanned block by block, never if None
+
+    Returns:
+        list[ScannedFile]: Scanned files
+    """
+    scanned: list[ScannedFile] = []
+    for index, file in enumerate(files):
+        if large_file_threshold is not None and (
+            file.stat().st_size > large_file_threshold
+        ):
+            last_digest: str | None = None if digests is None else digests[index]
+            scanned.append(scan_large_file(file, last_digest, matcher))
+            continue
+        md_source: str = file.read_text(encoding="utf-8")
+        digest: str = hash_source(md_source)
+        if digests is not None and digests[index] == digest:
+            scanned.append(ScannedFile(file, "", None, None, digest, {}, {}))
+        else:
+            stable: dict[str, str] = {}
+            date, urls = scan_md(md_source, file, engine, stable, matcher)
+            scanned.append(ScannedFile(file, md_source, date, urls, digest, stable, {}))
+    return scanned
+
+
+def scan_large_file(
+    file: Path, last_digest: str | None = None, matcher: StableMatcher | None = None
+) -> ScannedFile:
+    """Scan Markdown file block by block without reading it into memory at once.
+
+    URLs are found with the tokenizer, see iter_blocks for how the file is split.
+
+    Args:
+        file (Path): Markdown file to scan
+        last_digest (str | None): Content hash of the file when it was last processed
+        matcher (StableMatcher | None): Rules for stable URLs, STABLE_URLS if None
+
+    Returns:
+        ScannedFile: Scanned file without its content
+    """
+    hasher = hashlib.sha256()
+    # Date from the file name, unless the file isn't empty and has meta data
+    date: str | None = format_date(file.name[:10])
+    # Each URL is kept once, however often it is linked
+    urls: dict[str, None] = {}
+    with file.open(encoding="utf-8") as md_file:
+        for index, block in enumerate(iter_blocks(md_file, BLOCK_SIZE)):
+            hasher.update(block.encode("utf-8"))
+            if index == 0:
+                date = format_date(extract_date(block, file))
+            urls.update(
+                dict.fromkeys(link.url for link in scan_links(block, index == 0))
+            )
+    digest: str = hasher.hexdigest()
+    if digest == last_digest:
+        return ScannedFile(file, "", None, None, digest, {}, {}, True)
+    stable: dict[str, str] = {}
+    filtered_urls: list[str] = filter_urls(list(urls), stable, matcher)
+    return ScannedFile(file, "", date, filtered_urls, digest, stable, {}, True)
+
+
+def rewrite_large_file(
+    file: Path, wayback_urls: dict[str, str | None], dry_run: bool = False
+) -> tuple[int, str] | None:
+    """Replace URLs in Markdown file with Wayback Snapshots block by block.
+
+    Updated blocks are written to a temporary file next to the file, which then
+    replaces it like in write_atomic.
+
+    Args:
+        file (Path): Markdown file to update
+        wayback_urls (dict[str, str | None]): URL-Snapshot pairs
+        dry_run (bool): Don't write anything, only count bytes
+
+    Returns:
+        tuple[int, str] | None: Number of bytes written and content hash of the
+                                updated file, None if no URL was replaced
+    """
+    if not any(wayback_urls.values()):
+        return None
+    target: Path = Path(os.path.realpath(file))
+    temporary_file: BinaryIO | None = None
+    temporary: str = ""
+    if not dry_run:
+        descriptor, temporary = tempfile.mkstemp(
+            prefix=f".{target.name}.", suffix=".tmp", dir=target.parent
+        )
+        temporary_file = os.fdopen(descriptor, "wb")
+    hasher = hashlib.sha256()
+    size: int = 0
+    changed: bool = False
+    try:
+        with file.open(encoding="utf-8") as md_file:
+            for index, block in enumerate(iter_blocks(md_file, BLOCK_SIZE)):
+                links: list[Link] = scan_links(block, index == 0)
+                changed = changed or any(wayback_urls.get(link.url) for link in links)
+                data: bytes = update_md_source(block, wayback_urls, links).encode(
+                    "utf-8"
+                )
+                hasher.update(data)
+                size += len(data)
+                if temporary_file is not None:
+                    temporary_file.write(data)
+        if temporary_file is not None:
+            temporary_file.flush()
+            os.fsync(temporary_file.fileno())
+            temporary_file.close()
+            if changed:
+                replace_file(temporary, target)
+            else:
+                os.unlink(temporary)
+    except BaseException:
+        if temporary_file is not None:
+            temporary_file.close()
+            if os.path.exists(temporary):
+                os.unlink(temporary)
+        raise
+    return (size, hasher.hexdigest()) if changed else None
 
 
-def update_md_source(md_source: str, wayback_urls: dict[str, str | None]) -> str:
+def write_atomic(file: Path, content: str) -> int:
+    """Replace file with new content without leaving it truncated on errors.
+
+    Content is written to a temporary file in the same directory, which then replaces
+    the original file in a single rename. The file mode of the original is kept.
+    Symbolic links are followed, so the file they point to is replaced rather than
+    the link itself.
+
+    Args:
+        file (Path): File to replace
+        content (str): New content of the file
+
+    Returns:
+        int: Number of bytes written
+    """
+    data: bytes = content.encode("utf-8")
+    target: Path = Path(os.path.realpath(file))
+    descriptor, temporary = tempfile.mkstemp(
+        prefix=f".{target.name}.", suffix=".tmp", dir=target.parent
+    )
+    try:
+        with os.fdopen(descriptor, "wb") as temporary_file:
+            temporary_file.write(data)
+            temporary_file.flush()
+            os.fsync(temporary_file.fileno())
+        replace_file(temporary, target)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.unlink(temporary)
+        raise
+    return len(data)
+
+
+def replace_file(temporary: str, target: Path) -> None:
+    """Replace file with a completely written temporary file.
+
+    The temporary file gets the mode of the file and is renamed to it. Files with
+    several hard links are overwritten in place instead, so that all of their links
+    keep sharing the new content.
+
+    Args:
+        temporary (str): Temporary file in the same directory as target
+        target (Path): File to replace, not a symbolic link
+    """
+    status: os.stat_result = target.stat()
+    if status.st_nlink > 1:
+        shutil.copyfile(temporary, target)
+        os.unlink(temporary)
+    else:
+        os.chmod(temporary, stat.S_IMODE(status.st_mode))
+        os.replace(temporary, target)
+
+
+def skip_unchanged(
+    files: Iterable[Path], manifest: Manifest, stats: Stats
+) -> Iterator[Path]:
+    """Filter out files whose modification time and size match the manifest.
+
+    Args:
+        files (Iterable[Path]): Markdown files to process
+        manifest (Manifest): State of files processed in previous runs
+        stats (Stats): Counters of the run, skipped files are added to 'unchanged'
+
+    Yields:
+        Path: Next file that might have changed
+    """
+    for file in files:
+        if manifest.is_unchanged(file):
+            stats.count("unchanged")
+        else:
+            yield file
+
+
+def chunked(items: Iterable[Any], size: int) -> Iterator[list[Any]]:
+    """Split items into lists of the given size, the last one might be shorter.
+
+    Args:
+        items (Iterable[Any]): Items to split
+        size (int): Number of items per list
+
+    Yields:
+        list[Any]: Next list of items
+    """
+    iterator: Iterator[Any] = iter(items)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+async def feed_queue(items: Iterable[Any], queue: asyncio.Queue[Any]) -> None:
+    """Put items into the queue of the first pipeline stage.
+
+    The queue is closed by putting None into it once all items have been added.
+
+    Args:
+        items (Iterable[Any]): Items to process
+        queue (asyncio.Queue[Any]): Input queue of the first pipeline stage
+    """
+    for item in items:
+        await queue.put(item)
+    await queue.put(None)
+
+
+async def run_stage(
+    worker: Callable[[Any], Awaitable[Any]],
+    workers: int,
+    inbox: asyncio.Queue[Any],
+    outbox: asyncio.Queue[Any] | None = None,
+    batched: bool = False,
+) -> None:
+    """Process items from inbox with concurrent workers and pass results on to outbox.
+
+    None marks the end of a queue. A worker that receives None puts it back for the
+    remaining workers of the stage and stops. Once all workers are done, the outbox is
+    closed the same way.
+
+    If batched, the worker processes a list of items at once and returns a list of
+    results, which are passed on to outbox one by one.
+
+    Args:
+        worker (Callable[[Any], Awaitable[Any]]): Coroutine function processing an item
+        workers (int): Number of items processed concurrently
+        inbox (asyncio.Queue[Any]): Queue with items to process
+        outbox (asyncio.Queue[Any] | None): Queue for results, if any
+        batched (bool): Worker processes and returns lists
+    """
+
+    async def consume() -> None:
+        while (item := await inbox.get()) is not None:
+            result: Any = await worker(item)
+            if outbox is not None:
+                for result_item in result if batched else [result]:
+                    await outbox.put(result_item)
+        await inbox.put(None)
+
+    await asyncio.gather(*(consume() for _ in range(workers)))
+    if outbox is not None:
+        await outbox.put(None)
+
+
+async def run_pipeline(*stages: Awaitable[None]) -> None:
+    """Run pipeline stages concurrently and stop all of them if one stage fails.
+
+    Args:
+        stages (Awaitable[None]): Coroutines of the pipeline stages
+    """
+    tasks: list[asyncio.Future[None]] = [asyncio.ensure_future(s) for s in stages]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def update_md_source(
+    md_source: str,
+    wayback_urls: dict[str, str | None],
+    links: list[Link] | None = None,
+) -> str:
     """Replace URLs in Markdown file with Wayback Snapshots.
 
+    Links are replaced at their positions in the source in a single pass, so URLs are
+    matched literally and only where they are used as link targets.
+
     Args:
         md_source (str): Content of Markdown file that should be updated
         wayback_urls (dict[str, str | None]): URL-Snapshot pairs
+        links (list[Link] | None): Links found in md_source, scanned again if None
 
     Returns:
         str: Content of Markdown file with updated URLs
     """
-    for url, snapshot in wayback_urls.items():
+    if not any(wayback_urls.values()):
+        return md_source
+    if links is None:
+        links = scan_links(md_source)
+    parts: list[str] = []
+    position: int = 0
+    for link in links:
         # Skip cases where no Wayback Snapshot was found
-        if snapshot:
-            # Only replace strings which are == url if they are preceded and
-            # followed by braces to avoid mismatches
-            md_source = re.sub(rf"(?<=\(){url}(?=\))", snapshot, md_source)
-    return md_source
+        if snapshot := wayback_urls.get(link.url):
+            parts.append(md_source[position : link.start])
+            parts.append(snapshot)
+            position = link.end
+    if not parts:
+        return md_source
+    parts.append(md_source[position:])
+    return "".join(parts)
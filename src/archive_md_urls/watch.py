@@ -0,0 +1,196 @@
+"""Keep running and update Markdown files as soon as they change.
+
+Watcher waits for changes to the watched files, debounces bursts of edits (e.g. an
+editor saving a file several times) and passes only the changed files to an
+Archiver, which keeps its HTTP client, cache and rate limiter warm between changes.
+Changes are detected with watchfiles (inotify and its equivalents on other systems)
+if it is installed, otherwise by polling the modification time and size of files.
+
+Files written by the Archiver itself trigger change events too. After processing a
+file, its modification time and size are recorded, and changes that result in the
+recorded state are ignored.
+"""
+
+import asyncio
+import os
+from collections.abc import AsyncIterator, Callable, Iterable
+from pathlib import Path
+from typing import Any
+
+from archive_md_urls.archiver import Archiver
+from archive_md_urls.manifest import Manifest
+
+# Seconds without further changes before changed files are processed
+DEBOUNCE: float = 1.0
+# Seconds between two scans of the watched files if watchfiles isn't installed
+POLL_INTERVAL: float = 1.0
+
+
+def file_state(path: Path) -> tuple[int, int] | None:
+    """Return modification time and size of a file.
+
+    Args:
+        path (Path): File
+
+    Returns:
+        tuple[int, int] | None: Modification time in nanoseconds and size, None if
+                                the file doesn't exist (anymore)
+    """
+    try:
+        stat: os.stat_result = path.stat()
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class Watcher:
+    """Update watched Markdown files with an Archiver whenever they change.
+
+    Args:
+        archiver (Archiver): Entered Archiver processing changed files
+        items (list[Path]): Files and directories to watch
+        discover (Callable[[], Iterable[Path]]): Returns all Markdown files that
+                                                  are currently selected in items
+        recursive (bool): Watch subdirectories of directories
+        debounce (float): Seconds without further changes before changed files are
+                          processed
+        poll_interval (float): Seconds between scans if watchfiles isn't used
+        use_watchfiles (bool): Use watchfiles if it is installed, poll otherwise
+        manifest (Manifest | None): Manifest of incremental runs, saved after
+                                    processing changed files
+        **options (Any): Further arguments of update_files, e.g. report or dry_run
+    """
+
+    def __init__(
+        self,
+        archiver: Archiver,
+        items: list[Path],
+        discover: Callable[[], Iterable[Path]],
+        recursive: bool = False,
+        debounce: float = DEBOUNCE,
+        poll_interval: float = POLL_INTERVAL,
+        use_watchfiles: bool = True,
+        manifest: Manifest | None = None,
+        **options: Any,
+    ) -> None:
+        self.archiver: Archiver = archiver
+        self.items: list[Path] = items
+        self.discover: Callable[[], Iterable[Path]] = discover
+        self.recursive: bool = recursive
+        self.debounce: float = debounce
+        self.poll_interval: float = poll_interval
+        self.use_watchfiles: bool = use_watchfiles
+        self.manifest: Manifest | None = manifest
+        self.options: dict[str, Any] = options
+        # Selected files by absolute path, and their state when last processed
+        self.files: dict[str, Path] = {}
+        self.states: dict[str, tuple[int, int] | None] = {}
+        self.refresh()
+        for key, file in self.files.items():
+            self.states[key] = file_state(file)
+
+    def refresh(self) -> None:
+        """Find the files currently selected in the watched items."""
+        self.files = {os.path.abspath(file): file for file in self.discover()}
+
+    async def run(self) -> None:
+        """Process changed files until cancelled."""
+        async for paths in self.changes():
+            await self.process(paths)
+
+    async def process(self, paths: set[str]) -> list[Path]:
+        """Update the selected files among changed paths.
+
+        Args:
+            paths (set[str]): Absolute paths of changed files
+
+        Returns:
+            list[Path]: Files that were passed to the Archiver
+        """
+        if any(path not in self.files for path in paths):
+            # New files might have been created
+            self.refresh()
+        files: list[Path] = sorted(
+            self.files[path]
+            for path in paths
+            if path in self.files
+            and (state := file_state(self.files[path])) is not None
+            and state != self.states.get(path)
+        )
+        if not files:
+            return files
+        async for result in self.archiver.iter_files(
+            files,
+            **{"print_summary": True, **self.options, "manifest": self.manifest},
+        ):
+            # Record state right after writing, so the write is not seen as a change
+            self.states[os.path.abspath(result.path)] = file_state(result.path)
+        if self.manifest is not None and not self.options.get("dry_run"):
+            self.manifest.save()
+        return files
+
+    def changes(self) -> AsyncIterator[set[str]]:
+        """Yield changed paths, debounced.
+
+        Returns:
+            AsyncIterator[set[str]]: Absolute paths of files changed since the last
+                                     batch
+        """
+        if self.use_watchfiles:
+            try:
+                import watchfiles
+            except ImportError:
+                pass
+            else:
+                return self.watchfiles_changes(watchfiles)
+        return self.poll_changes()
+
+    async def watchfiles_changes(self, watchfiles: Any) -> AsyncIterator[set[str]]:
+        """Yield changed paths reported by watchfiles.
+
+        Args:
+            watchfiles (Any): The watchfiles module
+
+        Yields:
+            set[str]: Absolute paths of changed files
+        """
+        async for changes in watchfiles.awatch(
+            *self.items,
+            debounce=int(self.debounce * 1000),
+            recursive=self.recursive,
+        ):
+            yield {os.path.abspath(path) for _, path in changes}
+
+    async def poll_changes(self) -> AsyncIterator[set[str]]:
+        """Yield paths whose modification time or size changed between scans.
+
+        Yields:
+            set[str]: Absolute paths of changed files
+        """
+        seen: dict[str, tuple[int, int] | None] = dict(self.states)
+        pending: set[str] = set()
+        quiet_since: float = 0.0
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            current: dict[str, tuple[int, int] | None] = await asyncio.to_thread(
+                self.scan
+            )
+            changed: set[str] = {
+                path for path, state in current.items() if seen.get(path) != state
+            }
+            seen = current
+            if changed:
+                pending |= changed
+                quiet_since = loop.time()
+            elif pending and loop.time() - quiet_since >= self.debounce:
+                yield pending
+                pending = set()
+
+    def scan(self) -> dict[str, tuple[int, int] | None]:
+        """Return state of all selected files.
+
+        Returns:
+            dict[str, tuple[int, int] | None]: State by absolute path
+        """
+        return {os.path.abspath(file): file_state(file) for file in self.discover()}
@@ -0,0 +1,66 @@
+import asyncio
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from archive_md_urls import Archiver
+from archive_md_urls.fake_wayback import FakeWayback
+from archive_md_urls.update_files import FileResult
+from tests.testfiles import TEST_MD1, TEST_MD1_SOURCE
+
+
+class TestArchiver(unittest.TestCase):
+    """Test reusing an Archiver session across calls."""
+
+    def test_process_text(self) -> None:
+        """Test if text is updated and the client is reused across calls."""
+        fake = FakeWayback(missing_rate=0.0)
+
+        async def run() -> tuple[str, str]:
+            async with Archiver(transport=fake.transport()) as archiver:
+                client = archiver.client
+                first: str = await archiver.process_text(TEST_MD1_SOURCE)
+                second: str = await archiver.process_text(TEST_MD1_SOURCE, "2020-01-01")
+                self.assertIs(archiver.client, client)
+                self.assertEqual(archiver.stats["urls"], 6)
+            self.assertIsNone(archiver.client)
+            return first, second
+
+        first, second = asyncio.run(run())
+        self.assertEqual(first.count("](http://web.archive.org/web/"), 4)
+        # Snapshots are chosen for the given date instead of the metadata's
+        self.assertNotEqual(first, second)
+        # Both calls look up all URLs, as they look up different dates
+        self.assertEqual(fake.requests["/wayback/available"], 6)
+
+    def test_outside_of_context(self) -> None:
+        """Test if using an Archiver without entering it raises an error."""
+        with self.assertRaises(RuntimeError):
+            asyncio.run(Archiver().process_text(TEST_MD1_SOURCE))
+
+    def test_iter_files(self) -> None:
+        """Test if results of files are yielded as they are done."""
+        fake = FakeWayback(missing_rate=0.0)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            files: list[Path] = [
+                Path(shutil.copy(TEST_MD1, Path(tmp_dir, f"{i}.md"))) for i in range(3)
+            ]
+
+            async def run() -> list[FileResult]:
+                async with Archiver(transport=fake.transport()) as archiver:
+                    results: list[FileResult] = [
+                        result async for result in archiver.iter_files(files)
+                    ]
+                    # Files are already updated, stopping early cancels the rest
+                    async for result in archiver.iter_files(files):
+                        self.assertFalse(result.changed)
+                        break
+                    return results
+
+            results: list[FileResult] = asyncio.run(run())
+        self.assertEqual(sorted(result.path for result in results), files)
+        self.assertTrue(all(result.changed for result in results))
+        self.assertEqual(len(results[0].snapshots), 3)
+        # Lookups are shared by all files of a call
+        self.assertEqual(fake.requests["/wayback/available"], 3)
@@ -0,0 +1,97 @@
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from archive_md_urls.cache import SnapshotCache
+
+SNAPSHOT: str = "http://web.archive.org/web/20140428170257/http://www.example.com/"
+
+
+class TestSnapshotCache(unittest.TestCase):
+    """Test persistent snapshot cache."""
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name, "cache", "snapshots.sqlite")
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_get_set(self) -> None:
+        """Test if lookups with and without snapshot survive reopening the cache."""
+        with SnapshotCache(self.path) as cache:
+            self.assertEqual(cache.get("example.com", "201404280000"), (False, None))
+            cache.set("example.com", "201404280000", SNAPSHOT)
+            cache.set("missing.com", None, None)
+        with SnapshotCache(self.path) as cache:
+            self.assertEqual(cache.get("example.com", "201404280000"), (True, SNAPSHOT))
+            self.assertEqual(cache.get("missing.com", None), (True, None))
+            # Same URL with a different timestamp is a different lookup
+            self.assertEqual(cache.get("example.com", None), (False, None))
+            self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+    def test_ttl(self) -> None:
+        """Test if lookups without snapshot expire earlier than others."""
+        with SnapshotCache(self.path, positive_ttl=100, negative_ttl=10) as cache:
+            cache.set("example.com", None, SNAPSHOT)
+            cache.set("missing.com", None, None)
+            with mock.patch("time.time", return_value=time.time() + 50):
+                self.assertEqual(cache.get("example.com", None), (True, SNAPSHOT))
+                self.assertEqual(cache.get("missing.com", None), (False, None))
+
+    def test_lru_eviction(self) -> None:
+        """Test if least recently used lookups are evicted beyond max_entries."""
+        with SnapshotCache(self.path, max_entries=2) as cache:
+            now: float = time.time()
+            for offset, url in enumerate(["a.com", "b.com", "c.com"]):
+                with mock.patch("time.time", return_value=now + offset):
+                    cache.set(url, None, SNAPSHOT)
+            with mock.patch("time.time", return_value=now + 3):
+                cache.get("a.com", None)
+        with SnapshotCache(self.path, max_entries=2) as cache:
+            self.assertTrue(cache.get("a.com", None)[0])
+            self.assertFalse(cache.get("b.com", None)[0])
+            self.assertTrue(cache.get("c.com", None)[0])
+
+    @mock.patch("archive_md_urls.cache.EVICT_INTERVAL", 2)
+    def test_evict_while_open(self) -> None:
+        """Test if lookups beyond max_entries are evicted without closing the cache."""
+        with SnapshotCache(self.path, max_entries=2) as cache:
+            now: float = time.time()
+            for offset, url in enumerate(["a.com", "b.com", "c.com", "d.com"]):
+                with mock.patch("time.time", return_value=now + offset):
+                    cache.set(url, None, SNAPSHOT)
+            self.assertEqual(
+                cache.connection.execute("SELECT url FROM snapshots").fetchall(),
+                [("c.com",), ("d.com",)],
+            )
+
+    @mock.patch("archive_md_urls.cache.ACCESS_BATCH", 2)
+    def test_access_batch(self) -> None:
+        """Test if access times of cache hits are written in batches."""
+        with SnapshotCache(self.path) as cache:
+            cache.set("a.com", None, SNAPSHOT)
+            cache.set("b.com", None, SNAPSHOT)
+
+            def accessed() -> list[tuple[float]]:
+                return cache.connection.execute(
+                    "SELECT accessed FROM snapshots ORDER BY url"
+                ).fetchall()
+
+            before: list[tuple[float]] = accessed()
+            with mock.patch("time.time", return_value=time.time() + 10):
+                cache.get("a.com", None)
+                self.assertEqual(accessed(), before)
+                cache.get("b.com", None)
+                self.assertEqual(accessed(), [(time.time(),), (time.time(),)])
+
+    def test_shared(self) -> None:
+        """Test if two open caches on the same database see each other's writes."""
+        with SnapshotCache(self.path) as cache, SnapshotCache(self.path) as other:
+            cache.set("example.com", None, SNAPSHOT)
+            self.assertEqual(other.get("example.com", None), (True, SNAPSHOT))
+            other.set("missing.com", None, None)
+            other.set_liveness("missing.com", None, "dead")
+            self.assertEqual(cache.get("missing.com", None), (True, None))
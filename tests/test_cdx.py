@@ -0,0 +1,105 @@
+import asyncio
+import contextlib
+import unittest
+from typing import Any
+
+import httpx
+
+from archive_md_urls import cdx
+
+CAPTURES: list[tuple[str, str]] = [
+    ("20100105120000", "http://www.example.com/"),
+    ("20140420080000", "http://www.example.com/"),
+    ("20140503230000", "http://example.com/"),
+]
+
+
+class TestCDX(unittest.TestCase):
+    """Test snapshot lookups with the CDX server."""
+
+    def test_get_nearest(self) -> None:
+        """Test if the capture closest to the requested timestamp is chosen."""
+        self.assertEqual(
+            cdx.get_nearest(CAPTURES, "201404280000"),
+            "http://web.archive.org/web/20140503230000/http://example.com/",
+        )
+        self.assertEqual(
+            cdx.get_nearest(CAPTURES, "20120101"),
+            "http://web.archive.org/web/20100105120000/http://www.example.com/",
+        )
+        # Before first and after last capture
+        self.assertEqual(
+            cdx.get_nearest(CAPTURES, "199901010000"),
+            "http://web.archive.org/web/20100105120000/http://www.example.com/",
+        )
+        self.assertEqual(
+            cdx.get_nearest(CAPTURES, "202001"),
+            "http://web.archive.org/web/20140503230000/http://example.com/",
+        )
+        # No timestamp returns latest capture, no captures return None
+        self.assertEqual(
+            cdx.get_nearest(CAPTURES, None),
+            "http://web.archive.org/web/20140503230000/http://example.com/",
+        )
+        self.assertEqual(cdx.get_nearest([], "201404280000"), None)
+
+    def test_cdx_backend(self) -> None:
+        """Test if captures of a URL are only fetched once for all timestamps."""
+        requests: list[httpx.Request] = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            requests.append(request)
+            if request.url.params["url"] == "missing.com":
+                return httpx.Response(200, content=b"")
+            return httpx.Response(
+                200, json=[["timestamp", "original"], *map(list, reversed(CAPTURES))]
+            )
+
+        async def lookup_all() -> list[str | None]:
+            backend = cdx.CDXBackend()
+            transport = httpx.MockTransport(handler)
+            async with httpx.AsyncClient(transport=transport) as client:
+                return await asyncio.gather(
+                    backend.lookup(client, "example.com", "201404280000"),
+                    backend.lookup(client, "example.com", "201001010000"),
+                    backend.lookup(client, "missing.com", "201001010000"),
+                )
+
+        self.assertEqual(
+            asyncio.run(lookup_all()),
+            [
+                "http://web.archive.org/web/20140503230000/http://example.com/",
+                "http://web.archive.org/web/20100105120000/http://www.example.com/",
+                None,
+            ],
+        )
+        self.assertEqual(len(requests), 2)
+
+    def test_cdx_backend_memo(self) -> None:
+        """Test if failed, expired, evicted and forgotten capture lists are fetched."""
+        fetched: list[str] = []
+
+        async def fetch_captures(
+            client: Any, url: str, limiter: Any = None
+        ) -> list[tuple[str, str]]:
+            fetched.append(url)
+            if fetched == ["a.com"]:
+                raise httpx.ConnectError("unreachable")
+            return CAPTURES
+
+        async def run(backend: cdx.CDXBackend, urls: list[str]) -> None:
+            backend.fetch_captures = fetch_captures  # type: ignore[method-assign]
+            for url in urls:
+                with contextlib.suppress(httpx.HTTPError):
+                    await backend.lookup(None, url)  # type: ignore[arg-type]
+
+        backend = cdx.CDXBackend(max_captures=2)
+        asyncio.run(run(backend, ["a.com", "a.com", "a.com", "b.com", "c.com"]))
+        # Only the failed fetch is repeated, the least recently used URL is dropped
+        self.assertEqual(fetched, ["a.com", "a.com", "b.com", "c.com"])
+        self.assertEqual(list(backend.captures), ["b.com", "c.com"])
+        backend.forget("b.com")
+        self.assertEqual(list(backend.captures), ["c.com"])
+        fetched.clear()
+        asyncio.run(run(cdx.CDXBackend(ttl=-1.0), ["a.com", "a.com"]))
+        self.assertEqual(fetched, ["a.com", "a.com"])
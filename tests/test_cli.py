@@ -1,9 +1,32 @@
+import contextlib
+import io
+import re
+import subprocess
+import sys
+import tempfile
 import unittest
 from pathlib import Path
+from unittest import mock
 
 from archive_md_urls import cli
 from tests.testfiles import CONVERTED_FILE, TEST_MD1, TEST_MD2, TEST_MD3, TEST_YAML
 
+# Dependencies that are only imported on the code paths that need them
+HEAVY_MODULES: tuple[str, ...] = ("httpx", "tenacity", "markdown", "bs4", "dateutil")
+# Maximum time to import the command line interface, in seconds
+IMPORT_TIME_LIMIT: float = 0.5
+IMPORT_CLI: str = "import archive_md_urls.cli"
+# Prints which heavy modules were imported by running main with the given arguments
+RUN_MAIN: str = f"""
+import sys
+from archive_md_urls import cli
+try:
+    cli.main()
+except SystemExit:
+    pass
+print(*(module for module in {HEAVY_MODULES!r} if module in sys.modules))
+"""
+
 
 class TestCli(unittest.TestCase):
     """Test Markdown file searching."""
@@ -55,3 +78,79 @@ class TestCli(unittest.TestCase):
             False,
         )
         self.assertEqual(scanned_files_rec, scanned_files)
+
+    def test_lazy_imports(self) -> None:
+        """Test if runs that exit early don't import heavy dependencies."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # Asking for help and finding no Markdown files
+            for args in (["--help"], [tmp_dir]):
+                result = subprocess.run(
+                    [sys.executable, "-c", RUN_MAIN, *args],
+                    capture_output=True,
+                    text=True,
+                    check=True,
+                )
+                self.assertEqual(result.stdout.splitlines()[-1], "")
+
+    def test_invalid_items(self) -> None:
+        """Test if invalid items stop the run before anything is processed."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            journal = Path(tmp_dir, "journal.jsonl")
+            result = subprocess.run(
+                [
+                    sys.executable,
+                    "-c",
+                    RUN_MAIN,
+                    str(TEST_MD1),
+                    str(Path(tmp_dir, "missing.md")),
+                    "--journal",
+                    str(journal),
+                ],
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            self.assertFalse(journal.exists())
+        self.assertNotIn("Traceback", result.stderr)
+        # The run exits before importing any heavy dependency
+        self.assertEqual(result.stdout.splitlines()[-1], "")
+
+    def test_invalid_counts(self) -> None:
+        """Test if limits and numbers of workers below 1 are rejected."""
+        for option in (
+            "--scan-workers",
+            "--jobs",
+            "--lookup-workers",
+            "--write-workers",
+            "--max-connections",
+            "--max-keepalive",
+            "--max-in-flight",
+        ):
+            with self.subTest(option=option):
+                argv: list[str] = ["archive-md-urls", str(TEST_MD1), option, "0"]
+                stderr = io.StringIO()
+                with (
+                    mock.patch("sys.argv", argv),
+                    contextlib.redirect_stderr(stderr),
+                    self.assertRaises(SystemExit),
+                ):
+                    cli.parse_args()
+                self.assertIn(f"{option} must be at least 1", stderr.getvalue())
+
+    def test_import_time(self) -> None:
+        """Test if importing the command line interface stays fast."""
+        import_times: list[float] = []
+        for _ in range(3):
+            result = subprocess.run(
+                [sys.executable, "-X", "importtime", "-c", IMPORT_CLI],
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            # Lines read 'import time: self [us] | cumulative [us] | module'
+            match: re.Match[str] | None = re.search(
+                r"\|\s*(\d+) \| archive_md_urls\.cli$", result.stderr, re.MULTILINE
+            )
+            assert match is not None
+            import_times.append(int(match[1]) / 1_000_000)
+        self.assertLess(min(import_times), IMPORT_TIME_LIMIT)
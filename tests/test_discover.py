@@ -0,0 +1,116 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from typing import Any
+from unittest import mock
+
+from archive_md_urls.discover import is_ignored, iter_md_files, parse_ignore_rules
+
+
+def create_tree(root: Path, files: list[str]) -> None:
+    """Create empty files (and their parent directories) below root."""
+    for file in files:
+        Path(root, file).parent.mkdir(parents=True, exist_ok=True)
+        Path(root, file).touch()
+
+
+class TestDiscover(unittest.TestCase):
+    """Test lazy discovery of Markdown files."""
+
+    def test_iter_md_files(self) -> None:
+        """Test order of files and include and exclude globs."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            create_tree(
+                Path(tmp_dir),
+                ["b.md", "a.md", "notes.txt", "sub/c.md", "drafts/d.md", "sub/e.mdx"],
+            )
+            self.assertEqual(
+                list(iter_md_files([Path(tmp_dir)], False)),
+                [Path(tmp_dir, "a.md"), Path(tmp_dir, "b.md")],
+            )
+            # Files of a directory come before files of its subdirectories
+            self.assertEqual(
+                list(iter_md_files([Path(tmp_dir)], True, exclude=["drafts/"])),
+                [
+                    Path(tmp_dir, "a.md"),
+                    Path(tmp_dir, "b.md"),
+                    Path(tmp_dir, "sub/c.md"),
+                ],
+            )
+            self.assertEqual(
+                list(
+                    iter_md_files(
+                        [Path(tmp_dir)], True, include=["*.md", "*.mdx"], exclude=["a*"]
+                    )
+                ),
+                [
+                    Path(tmp_dir, "b.md"),
+                    Path(tmp_dir, "drafts/d.md"),
+                    Path(tmp_dir, "sub/c.md"),
+                    Path(tmp_dir, "sub/e.mdx"),
+                ],
+            )
+            # Files passed directly must match include globs
+            with self.assertRaises(SystemExit):
+                list(iter_md_files([Path(tmp_dir, "notes.txt")], False))
+            # Items are checked before any file is yielded
+            with self.assertRaises(SystemExit):
+                iter_md_files([Path(tmp_dir, "a.md"), Path(tmp_dir, "missing")], False)
+
+    def test_ignore_files(self) -> None:
+        """Test if ignore files are read in every searched directory."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            create_tree(
+                Path(tmp_dir), ["a.md", "build/b.md", "sub/c.md", "sub/keep.md"]
+            )
+            Path(tmp_dir, ".gitignore").write_text("# Output\nbuild/\n", "utf-8")
+            Path(tmp_dir, "sub/.gitignore").write_text("*.md\n!keep.md\n", "utf-8")
+            self.assertEqual(
+                list(iter_md_files([Path(tmp_dir)], True, ignore_files=[".gitignore"])),
+                [Path(tmp_dir, "a.md"), Path(tmp_dir, "sub/keep.md")],
+            )
+
+    def test_is_ignored(self) -> None:
+        """Test matching of anchored, unanchored and directory-only patterns."""
+        rules = parse_ignore_rules(["/top.md", "docs/*.md", "tmp/", "**/old.md"], "r")
+        self.assertTrue(is_ignored("r/top.md", False, rules))
+        self.assertFalse(is_ignored("r/sub/top.md", False, rules))
+        self.assertTrue(is_ignored("r/docs/a.md", False, rules))
+        self.assertFalse(is_ignored("r/sub/docs/a.md", False, rules))
+        self.assertTrue(is_ignored("r/sub/tmp", True, rules))
+        self.assertFalse(is_ignored("r/sub/tmp", False, rules))
+        self.assertTrue(is_ignored("r/sub/old.md", False, rules))
+
+    def test_duplicates_and_symlinks(self) -> None:
+        """Test if files are yielded once and symlink loops are not followed."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            create_tree(Path(tmp_dir), ["a.md", "sub/b.md"])
+            os.symlink(tmp_dir, Path(tmp_dir, "sub/loop"))
+            os.symlink(Path(tmp_dir, "a.md"), Path(tmp_dir, "sub/link.md"))
+            self.assertEqual(
+                list(
+                    iter_md_files(
+                        [Path(tmp_dir, "a.md"), Path(tmp_dir), Path(tmp_dir, "sub")],
+                        True,
+                    )
+                ),
+                [Path(tmp_dir, "a.md"), Path(tmp_dir, "sub/b.md")],
+            )
+
+    def test_unreadable_directory(self) -> None:
+        """Test if directories that can't be read are skipped."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            create_tree(Path(tmp_dir), ["a.md", "private/b.md", "sub/c.md"])
+            scandir = os.scandir
+
+            def restricted_scandir(path: str) -> Any:
+                if os.path.basename(path) == "private":
+                    raise PermissionError(13, "Permission denied", path)
+                return scandir(path)
+
+            with mock.patch("os.scandir", restricted_scandir):
+                self.assertEqual(
+                    list(iter_md_files([Path(tmp_dir)], True)),
+                    [Path(tmp_dir, "a.md"), Path(tmp_dir, "sub/c.md")],
+                )
@@ -0,0 +1,86 @@
+import asyncio
+import contextlib
+import io
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from archive_md_urls import gather_snapshots
+from archive_md_urls.cdx import CDXBackend
+from archive_md_urls.fake_wayback import FakeWayback
+from archive_md_urls.ratelimit import RateLimiter
+from archive_md_urls.update_files import update_files
+from tests.testfiles import TEST_MD1, TEST_MD1_SOURCE
+
+
+class TestFakeWayback(unittest.TestCase):
+    """Test runs against the offline Wayback Machine stand-in."""
+
+    def test_backends_agree(self) -> None:
+        """Test if availability API and CDX server return the same snapshots."""
+        fake = FakeWayback(missing_rate=0.5)
+        urls: list[str] = [f"https://example.com/{i}" for i in range(20)]
+
+        async def gather(
+            backend: gather_snapshots.SnapshotBackend,
+        ) -> dict[str, str | None]:
+            async with gather_snapshots.create_client(
+                transport=fake.transport()
+            ) as client:
+                return await gather_snapshots.gather_snapshots(
+                    urls, "201404280000", client, backend=backend
+                )
+
+        available = asyncio.run(gather(gather_snapshots.AvailableBackend()))
+        self.assertEqual(available, asyncio.run(gather(CDXBackend())))
+        # Some URLs have never been archived
+        self.assertIn(None, available.values())
+        self.assertTrue(any(available.values()))
+        self.assertEqual(
+            fake.requests, {"/wayback/available": 20, "/cdx/search/cdx": 20}
+        )
+
+    @mock.patch.object(gather_snapshots, "RETRY_WAIT", 0.0)
+    def test_injected_failures(self) -> None:
+        """Test if throttling slows down the limiter and errors become failures."""
+        fake = FakeWayback(throttle_rate=1.0, retry_after=0.0)
+        limiter = RateLimiter(rate=1000.0)
+        failures: dict[str, str] = {}
+
+        async def gather() -> dict[str, str | None]:
+            async with gather_snapshots.create_client(
+                transport=fake.transport()
+            ) as client:
+                return await gather_snapshots.gather_snapshots(
+                    ["example.com"], client=client, limiter=limiter, failures=failures
+                )
+
+        self.assertEqual(asyncio.run(gather()), {"example.com": None})
+        self.assertEqual(fake.responses, {429: 5})
+        self.assertLess(limiter.rate, limiter.max_rate)
+        self.assertIn("429", failures["example.com"])
+        fake.throttle_rate, fake.error_rate = 0.0, 1.0
+        failures.clear()
+        asyncio.run(gather())
+        self.assertIn("503", failures["example.com"])
+
+    def test_update_files(self) -> None:
+        """Test if files are updated end to end with snapshots of the fake."""
+        fake = FakeWayback(missing_rate=0.0)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file = Path(shutil.copy(TEST_MD1, tmp_dir))
+
+            async def run() -> None:
+                async with gather_snapshots.create_client(
+                    transport=fake.transport()
+                ) as client:
+                    await update_files([file], client=client)
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                asyncio.run(run())
+            md_source: str = file.read_text(encoding="utf-8")
+        self.assertNotEqual(md_source, TEST_MD1_SOURCE)
+        self.assertEqual(md_source.count("](http://web.archive.org/web/"), 4)
+        self.assertEqual(fake.requests, {"/wayback/available": 3})
@@ -1,7 +1,26 @@
+import asyncio
 import unittest
 from typing import Any
+from unittest import mock
+
+import httpx
 
 from archive_md_urls import gather_snapshots
+from archive_md_urls.fake_wayback import FakeWayback
+
+
+def wayback_response(request: httpx.Request) -> httpx.Response:
+    """Answer API calls like the Wayback Machine for any URL but 'missing.com'."""
+    url: str = request.url.params["url"]
+    if url == "missing.com":
+        return httpx.Response(200, json={"url": url, "archived_snapshots": {}})
+    snapshot: dict[str, Any] = {
+        "available": True,
+        "url": f"http://web.archive.org/web/20140428170257/{url}",
+    }
+    return httpx.Response(
+        200, json={"url": url, "archived_snapshots": {"closest": snapshot}}
+    )
 
 
 class TestClosestSnapshot(unittest.TestCase):
@@ -33,6 +52,27 @@ class TestClosestSnapshot(unittest.TestCase):
             f"{api_base}{non_existend_url}&timestamp={bad_timestamp}",
         )
 
+    def test_build_api_call_special_characters(self) -> None:
+        """Test if URLs with query strings and fragments are looked up unchanged."""
+        urls: list[str] = [
+            "https://example.com/b?x=1&y=2",
+            "https://example.com/search?q=a+b",
+            "https://example.com/page#section",
+        ]
+        self.assertEqual(
+            gather_snapshots.build_api_call(urls[0]),
+            "https://archive.org/wayback/available?url="
+            + "https://example.com/b%3Fx%3D1%26y%3D2",
+        )
+
+        async def gather() -> dict[str, str | None]:
+            transport = FakeWayback(missing_rate=0.0).transport()
+            async with gather_snapshots.create_client(transport=transport) as client:
+                return await gather_snapshots.gather_snapshots(urls, None, client)
+
+        for url, snapshot in asyncio.run(gather()).items():
+            self.assertTrue(str(snapshot).endswith(f"/{url}"), snapshot)
+
     def test_get_closest(self) -> None:
         """Test if correct value is returned given various API responses."""
         test_url: str = "http://web.archive.org/web/20210605231254/https://example.com/"
@@ -52,3 +92,112 @@ class TestClosestSnapshot(unittest.TestCase):
             gather_snapshots.get_closest(available),
             r"http://web.archive.org/web/\d+/https://example.com/",
         )
+
+    def test_gather_snapshots_shared_client(self) -> None:
+        """Test if a shared client is used for API calls and stays open."""
+        requests: list[httpx.Request] = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            requests.append(request)
+            return wayback_response(request)
+
+        async def gather_twice() -> list[dict[str, str | None]]:
+            transport = httpx.MockTransport(handler)
+            async with httpx.AsyncClient(transport=transport) as client:
+                results = [
+                    await gather_snapshots.gather_snapshots(
+                        ["example.com", "missing.com"], "201404280000", client
+                    ),
+                    await gather_snapshots.gather_snapshots(
+                        ["github.com"], None, client
+                    ),
+                ]
+                self.assertFalse(client.is_closed)
+            return results
+
+        first, second = asyncio.run(gather_twice())
+        self.assertEqual(
+            first,
+            {
+                "example.com": "http://web.archive.org/web/20140428170257/example.com",
+                "missing.com": None,
+            },
+        )
+        self.assertEqual(
+            second,
+            {"github.com": "http://web.archive.org/web/20140428170257/github.com"},
+        )
+        self.assertEqual(len(requests), 3)
+
+    def test_gather_snapshots_shared_lookups(self) -> None:
+        """Test if URL-timestamp pairs are only looked up once across calls."""
+        requests: list[httpx.Request] = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            requests.append(request)
+            return wayback_response(request)
+
+        async def gather_for_files() -> None:
+            lookups: dict[tuple[str, str | None], asyncio.Future[str | None]] = {}
+            transport = httpx.MockTransport(handler)
+            async with httpx.AsyncClient(transport=transport) as client:
+                await asyncio.gather(
+                    gather_snapshots.gather_snapshots(
+                        ["example.com", "github.com"], "201404280000", client, lookups
+                    ),
+                    gather_snapshots.gather_snapshots(
+                        ["example.com"], "201404280000", client, lookups
+                    ),
+                    gather_snapshots.gather_snapshots(
+                        ["example.com"], "201506010000", client, lookups
+                    ),
+                )
+            self.assertEqual(len(lookups), 3)
+
+        asyncio.run(gather_for_files())
+        self.assertEqual(len(requests), 3)
+
+    @mock.patch.object(gather_snapshots, "RETRY_WAIT", 0.0)
+    def test_gather_snapshots_failures(self) -> None:
+        """Test if a URL failing all retries doesn't affect the other URLs."""
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.params["url"] == "broken.com":
+                return httpx.Response(503)
+            return wayback_response(request)
+
+        async def gather() -> dict[str, str | None]:
+            transport = httpx.MockTransport(handler)
+            async with httpx.AsyncClient(transport=transport) as client:
+                return await gather_snapshots.gather_snapshots(
+                    ["example.com", "broken.com"], None, client, failures=failures
+                )
+
+        failures: dict[str, str] = {}
+        self.assertEqual(
+            asyncio.run(gather()),
+            {
+                "example.com": "http://web.archive.org/web/20140428170257/example.com",
+                "broken.com": None,
+            },
+        )
+        self.assertEqual(list(failures), ["broken.com"])
+        self.assertIn("503", failures["broken.com"])
+
+    def test_create_client_without_h2(self) -> None:
+        """Test if a missing h2 package raises an ImportError telling how to fix it."""
+        with (
+            mock.patch("httpx.AsyncClient", side_effect=ImportError("no h2")),
+            self.assertRaisesRegex(ImportError, r"archive-md-urls\[http2\]"),
+        ):
+            gather_snapshots.create_client(http2=True)
+
+    def test_backend_without_lookup(self) -> None:
+        """Test if backends must implement lookup to be instantiated."""
+
+        class IncompleteBackend(gather_snapshots.SnapshotBackend):
+            pass
+
+        with self.assertRaises(TypeError):
+            IncompleteBackend()  # type: ignore[abstract]
+        gather_snapshots.AvailableBackend()
@@ -0,0 +1,75 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from archive_md_urls.journal import Journal, JournalInUseError
+from tests.testfiles import TEST_MD1, TEST_MD2
+
+SNAPSHOT: str = "http://web.archive.org/web/20140428170257/http://www.example.com/"
+
+
+class TestJournal(unittest.TestCase):
+    """Test checkpointing and resuming runs."""
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name, "journal.jsonl")
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_resume(self) -> None:
+        """Test if completed files and resolved lookups are restored."""
+        with Journal(self.path) as journal:
+            journal.record_lookup("example.com", "201404280000", SNAPSHOT)
+            journal.record_lookup("missing.com", "201404280000", None)
+            journal.record_failure("broken.com", "201404280000", "HTTPStatusError()")
+            journal.record_file(TEST_MD1)
+            self.assertEqual(journal.failures, 1)
+        # Simulate a run that was killed while writing a record
+        with self.path.open("a", encoding="utf-8") as journal_file:
+            journal_file.write('{"url": "github.com", "timest')
+        with Journal(self.path, resume=True) as journal:
+            self.assertTrue(journal.is_completed(TEST_MD1))
+            self.assertFalse(journal.is_completed(TEST_MD2))
+            self.assertEqual(
+                journal.snapshots,
+                {
+                    ("example.com", "201404280000"): SNAPSHOT,
+                    ("missing.com", "201404280000"): None,
+                },
+            )
+            self.assertEqual(journal.failures, 0)
+
+    def test_start_anew(self) -> None:
+        """Test if journal is reset unless resuming and removed on request."""
+        with Journal(self.path) as journal:
+            journal.record_file(TEST_MD1)
+        with Journal(self.path) as journal:
+            self.assertFalse(journal.is_completed(TEST_MD1))
+            self.assertEqual(self.path.read_text(encoding="utf-8"), "")
+            journal.close(remove=True)
+        self.assertFalse(self.path.exists())
+
+    def test_open_lazily(self) -> None:
+        """Test if journal file is only created when it is opened."""
+        journal = Journal(self.path)
+        self.assertFalse(self.path.exists())
+        journal.close(remove=True)
+        journal.open()
+        self.assertTrue(self.path.exists())
+        journal.close()
+
+    def test_concurrent_runs(self) -> None:
+        """Test if a journal in use is neither truncated nor removed by other runs."""
+        with Journal(self.path) as journal:
+            journal.record_file(TEST_MD1)
+            for resume in (False, True):
+                other = Journal(self.path, resume=resume)
+                with self.assertRaises(JournalInUseError):
+                    other.open()
+                other.close(remove=True)
+            journal.record_file(TEST_MD2)
+        with Journal(self.path, resume=True) as journal:
+            self.assertTrue(journal.is_completed(TEST_MD1))
+            self.assertTrue(journal.is_completed(TEST_MD2))
@@ -0,0 +1,141 @@
+import unittest
+
+from archive_md_urls import linkscan, scan_md
+from tests.testfiles import (
+    TEST_MD1_SOURCE,
+    TEST_MD2_SOURCE,
+    TEST_MD3_SOURCE,
+    TEST_YAML_SOURCE,
+)
+
+# Markdown with all kinds of links, images and code that should be ignored
+LINK_SAMPLER: str = """Title: Link sampler
+Date: 2020-01-01
+
+An [inline link](http://a.com/x_(y) "with title") and ![an image](http://img.com/i.png).
+A [![linked image](http://img.com/j.png)](http://b.com) and <http://auto.com/p?q=1>.
+Code `[no link](http://code.com)` and \\[escaped](http://escaped.com) brackets.
+
+```
+[fenced](http://fence.com)
+```
+
+Use [ref] and [again][ref], <a href="http://html.com">raw HTML</a>
+and [angle brackets](<http://angle.com/a b>).
+
+[ref]: http://ref.com  "Title"
+"""
+
+# Markdown that looks like it contains links but doesn't, apart from two real ones
+NOT_LINKS: str = """Title: Not links
+Date: 2020-01-01
+
+A footnote definition isn't a reference definition.
+
+[^1]: example.com is mentioned in the footnote.
+
+An indented code block:
+
+    [code](http://indented.com)
+
+    <http://indented.com/more>
+
+It`s a [real link](http://a.com) after a stray backtick.
+
+A second paragraph with ` another one and [one more](http://b.com).
+"""
+
+# Indented text that is list content rather than code, quotes and escaped URLs
+LISTS_AND_QUOTES: str = """Title: Lists and quotes
+Date: 2020-01-01
+
+1. Item
+
+    See [continued](http://a.com/x) in the same item.
+
+- Item
+
+    - A [nested item](http://b.com/nested)
+
+        [More of the nested item](http://b.com/more)
+
+A paragraph ends the list.
+
+    [code after the list](http://code.com/after)
+
+> A quote
+>
+>     [code in the quote](http://code.com/quote)
+>
+> With a [quoted link](http://c.com/quote)
+
+[Escaped](http://d.com/a\\)b) and <http://d.com/a\\_b>.
+"""
+
+
+class TestLinkScan(unittest.TestCase):
+    """Test scanning Markdown source for links."""
+
+    def test_parity(self) -> None:
+        """Test if scan_links finds the same URLs as get_urls."""
+        for md_source in (
+            TEST_MD1_SOURCE,
+            TEST_MD2_SOURCE,
+            TEST_MD3_SOURCE,
+            TEST_YAML_SOURCE,
+            LINK_SAMPLER,
+            NOT_LINKS,
+            LISTS_AND_QUOTES,
+        ):
+            html, date = scan_md.convert_markdown(md_source)
+            self.assertEqual(
+                set(scan_md.get_urls(html)),
+                {link.url for link in linkscan.scan_links(md_source)},
+            )
+        # Apart from reference links, also order and number of URLs are equal
+        html, date = scan_md.convert_markdown(TEST_MD1_SOURCE)
+        self.assertEqual(
+            scan_md.get_urls(html),
+            [link.url for link in linkscan.scan_links(TEST_MD1_SOURCE)],
+        )
+
+    def test_offsets(self) -> None:
+        """Test if reported positions point at the URLs in the source."""
+        links: list[linkscan.Link] = linkscan.scan_links(LINK_SAMPLER)
+        self.assertEqual(len(links), 6)
+        for link in links:
+            self.assertEqual(LINK_SAMPLER[link.start : link.end], link.url)
+
+    def test_scan_front_matter(self) -> None:
+        """Test if meta data is parsed like Python-Markdown's meta extension."""
+        for md_source in (TEST_MD1_SOURCE, TEST_YAML_SOURCE):
+            meta, offset = linkscan.scan_front_matter(md_source)
+            self.assertEqual(meta["date"], ["2014-04-28"])
+            self.assertTrue(md_source[offset:].lstrip().startswith("Linking to"))
+        self.assertEqual(linkscan.scan_front_matter("A [link](a.com)\n"), ({}, 0))
+        # Values can continue on indented lines
+        meta, offset = linkscan.scan_front_matter("Authors: A\n    B\n\nText")
+        self.assertEqual((meta, offset), ({"authors": ["A", "B"]}, 18))
+
+    def test_iter_blocks(self) -> None:
+        """Test if blocks end at blank lines outside of fenced code blocks."""
+        lines: list[str] = TEST_MD1_SOURCE.splitlines(keepends=True)
+        blocks: list[str] = list(linkscan.iter_blocks(lines, 1))
+        self.assertEqual("".join(blocks), TEST_MD1_SOURCE)
+        self.assertGreater(len(blocks), 1)
+        # Meta data is part of the first block
+        self.assertIn("date", linkscan.scan_front_matter(blocks[0])[0])
+        md_source: str = "A\n\n```\n[a](a.com)\n\n```\n\nB\n"
+        self.assertEqual(
+            list(linkscan.iter_blocks(md_source.splitlines(keepends=True), 1)),
+            ["A\n\n", "```\n[a](a.com)\n\n```\n\n", "B\n"],
+        )
+        # Links in blocks are found like in the whole source
+        self.assertEqual(
+            [
+                link.url
+                for index, block in enumerate(blocks)
+                for link in linkscan.scan_links(block, index == 0)
+            ],
+            [link.url for link in linkscan.scan_links(TEST_MD1_SOURCE)],
+        )
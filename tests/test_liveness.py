@@ -0,0 +1,206 @@
+import asyncio
+import contextlib
+import io
+import shutil
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import httpx
+
+from archive_md_urls import liveness
+from archive_md_urls.cache import SnapshotCache
+from archive_md_urls.fake_wayback import FakeWayback
+from archive_md_urls.gather_snapshots import create_client
+from archive_md_urls.manifest import Manifest
+from archive_md_urls.update_files import update_files
+from tests.testfiles import TEST_MD1, TEST_MD1_SOURCE
+
+# Posts linking to these pages are from 2014-04-28
+PAGES: dict[str, httpx.Response] = {
+    "/alive": httpx.Response(200),
+    "/not-modified": httpx.Response(304),
+    "/gone": httpx.Response(404),
+    "/forbidden": httpx.Response(403),
+    "/error": httpx.Response(503),
+    "/moved": httpx.Response(301, headers={"Location": "https://other.org/new"}),
+    "/https": httpx.Response(301, headers={"Location": "https://example.com/https/"}),
+    "/changed": httpx.Response(
+        200, headers={"Last-Modified": "Mon, 05 Jan 2015 10:00:00 GMT"}
+    ),
+    "/unchanged": httpx.Response(
+        200, headers={"Last-Modified": "Sun, 05 Jan 2014 10:00:00 GMT"}
+    ),
+}
+
+
+class FakeOrigin:
+    """Serve PAGES for example.com and forward everything else to FakeWayback."""
+
+    def __init__(self) -> None:
+        self.wayback = FakeWayback(missing_rate=0.0)
+        self.requests: list[tuple[str, str, str | None]] = []
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        if request.url.host != "example.com":
+            return await self.wayback.handle(request)
+        self.requests.append(
+            (
+                request.method,
+                request.url.path,
+                request.headers.get("If-Modified-Since"),
+            )
+        )
+        if request.url.path == "/no-head" and request.method == "HEAD":
+            return httpx.Response(405)
+        if request.url.path == "/unreachable":
+            raise httpx.ConnectError("Connection refused", request=request)
+        return PAGES.get(request.url.path, httpx.Response(200))
+
+
+class TestLiveness(unittest.TestCase):
+    """Test liveness checks of linked pages."""
+
+    def gather(
+        self, origin: FakeOrigin, urls: list[str], cache: SnapshotCache | None = None
+    ) -> dict[str, str]:
+        async def run() -> dict[str, str]:
+            async with create_client(transport=origin.transport()) as client:
+                return await liveness.gather_liveness(
+                    urls, "201404280000", client, cache=cache
+                )
+
+        return asyncio.run(run())
+
+    def test_gather_liveness(self) -> None:
+        """Test if responses are classified correctly."""
+        origin = FakeOrigin()
+        states: dict[str, str] = self.gather(
+            origin,
+            [f"https://example.com{path}" for path in PAGES]
+            + [
+                "https://example.com/no-head",
+                "https://example.com/unreachable",
+                "example.com",
+            ],
+        )
+        self.assertEqual(
+            states,
+            {
+                "https://example.com/alive": liveness.ALIVE,
+                "https://example.com/not-modified": liveness.ALIVE,
+                "https://example.com/gone": liveness.DEAD,
+                # Servers blocking bots or failing temporarily don't mean dead pages
+                "https://example.com/forbidden": liveness.UNCHECKED,
+                "https://example.com/error": liveness.UNCHECKED,
+                "https://example.com/moved": liveness.REDIRECTED,
+                # Upgrades to https and trailing slashes don't count as redirects
+                "https://example.com/https": liveness.ALIVE,
+                "https://example.com/changed": liveness.CHANGED,
+                "https://example.com/unchanged": liveness.ALIVE,
+                "https://example.com/no-head": liveness.ALIVE,
+                "https://example.com/unreachable": liveness.UNCHECKED,
+                "example.com": liveness.UNCHECKED,
+            },
+        )
+        # Requests are conditional on changes since the post's date
+        self.assertIn(
+            ("HEAD", "/alive", "Mon, 28 Apr 2014 00:00:00 GMT"), origin.requests
+        )
+        # Servers that don't answer HEAD requests get a GET request
+        self.assertIn(
+            ("GET", "/no-head", "Mon, 28 Apr 2014 00:00:00 GMT"), origin.requests
+        )
+
+    def test_cache(self) -> None:
+        """Test if cached states are reused until they expire."""
+        origin = FakeOrigin()
+        urls: list[str] = [
+            "https://example.com/alive",
+            "https://example.com/gone",
+            "https://example.com/unreachable",
+        ]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir, "cache.sqlite")
+            with SnapshotCache(path) as cache:
+                self.gather(origin, urls, cache)
+            with SnapshotCache(path) as cache:
+                self.assertEqual(
+                    self.gather(origin, urls, cache),
+                    {
+                        urls[0]: liveness.ALIVE,
+                        urls[1]: liveness.DEAD,
+                        urls[2]: liveness.UNCHECKED,
+                    },
+                )
+            # Only the unreachable URL is checked again
+            self.assertEqual(len(origin.requests), 4)
+            with SnapshotCache(path, liveness_ttl=-1) as cache:
+                self.gather(origin, urls, cache)
+            self.assertEqual(len(origin.requests), 7)
+
+    def test_update_files(self) -> None:
+        """Test if only URLs that are no longer alive are replaced with snapshots."""
+        origin = FakeOrigin()
+        md_source: str = TEST_MD1_SOURCE + (
+            "\n[Alive](https://example.com/alive) and [gone](https://example.com/gone)"
+        )
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file = Path(shutil.copy(TEST_MD1, tmp_dir))
+            file.write_text(md_source, encoding="utf-8")
+
+            async def run() -> None:
+                async with create_client(transport=origin.transport()) as client:
+                    await update_files([file], client=client, check_liveness=True)
+
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                asyncio.run(run())
+            updated_md_source: str = file.read_text(encoding="utf-8")
+        self.assertIn("(https://example.com/alive)", updated_md_source)
+        self.assertNotIn("(https://example.com/gone)", updated_md_source)
+        # Other hosts (like github.com) are answered by the fake Wayback Machine with
+        # 404 Not Found, so only example.com counts as alive
+        self.assertIn(
+            "Left 1 URL unchanged because it is still alive.", output.getvalue()
+        )
+
+    def test_update_files_incremental(self) -> None:
+        """Test if files with alive URLs are skipped until the checks expire."""
+        origin = FakeOrigin()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file = Path(tmp_dir, "post.md")
+            file.write_text(
+                TEST_MD1_SOURCE + "\n[Alive](https://example.com/alive)",
+                encoding="utf-8",
+            )
+            manifest = Manifest(Path(tmp_dir, "manifest.json"))
+
+            async def run() -> None:
+                async with create_client(transport=origin.transport()) as client:
+                    with SnapshotCache(
+                        Path(tmp_dir, "cache.sqlite"), liveness_ttl=60
+                    ) as cache:
+                        await update_files(
+                            [file],
+                            client=client,
+                            check_liveness=True,
+                            manifest=manifest,
+                            cache=cache,
+                        )
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                asyncio.run(run())
+                self.assertTrue(manifest.is_unchanged(file))
+                asyncio.run(run())
+                self.assertEqual(len(origin.requests), 1)
+                # Expired checks make the file be scanned and the URL checked again
+                with mock.patch("time.time", return_value=time.time() + 60):
+                    self.assertFalse(manifest.is_unchanged(file))
+                    asyncio.run(run())
+                self.assertEqual(len(origin.requests), 2)
@@ -0,0 +1,71 @@
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from archive_md_urls.cache import LIVENESS_TTL
+from archive_md_urls.manifest import Manifest, hash_source
+from tests.testfiles import TEST_MD1_SOURCE
+
+
+class TestManifest(unittest.TestCase):
+    """Test recording state of processed files."""
+
+    def test_manifest(self) -> None:
+        """Test if file state survives saving and changes are detected."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file = Path(tmp_dir, "post.md")
+            file.write_text(TEST_MD1_SOURCE, encoding="utf-8")
+            manifest = Manifest(Path(tmp_dir, "manifest.json"))
+            self.assertFalse(manifest.is_unchanged(file))
+            manifest.update(file, hash_source(TEST_MD1_SOURCE), {"example.com"})
+            manifest.save()
+            manifest = Manifest(Path(tmp_dir, "manifest.json"))
+            self.assertTrue(manifest.is_unchanged(file))
+            self.assertEqual(manifest.digest(file), hash_source(TEST_MD1_SOURCE))
+            self.assertEqual(manifest.processed_urls(file), {"example.com"})
+            # Touching the file changes its modification time but not its content
+            stat: os.stat_result = file.stat()
+            os.utime(file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+            self.assertFalse(manifest.is_unchanged(file))
+            self.assertEqual(manifest.digest(file), hash_source(TEST_MD1_SOURCE))
+            # Updating without URLs keeps the processed URLs
+            manifest.update(file, hash_source(TEST_MD1_SOURCE))
+            self.assertTrue(manifest.is_unchanged(file))
+            self.assertEqual(manifest.processed_urls(file), {"example.com"})
+
+    def test_alive(self) -> None:
+        """Test if files with alive URLs are scanned again once their checks expire."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file = Path(tmp_dir, "post.md")
+            file.write_text(TEST_MD1_SOURCE, encoding="utf-8")
+            manifest = Manifest(Path(tmp_dir, "manifest.json"))
+            digest: str = hash_source(TEST_MD1_SOURCE)
+            manifest.update(
+                file, digest, {"example.com", "alive.com"}, alive={"alive.com"}
+            )
+            manifest.save()
+            manifest = Manifest(Path(tmp_dir, "manifest.json"))
+            self.assertTrue(manifest.is_unchanged(file))
+            self.assertEqual(
+                manifest.processed_urls(file), {"example.com", "alive.com"}
+            )
+            with mock.patch("time.time", return_value=time.time() + LIVENESS_TTL):
+                self.assertFalse(manifest.is_unchanged(file))
+                self.assertIsNone(manifest.digest(file))
+                self.assertEqual(manifest.processed_urls(file), {"example.com"})
+                # Updating without URLs keeps the expired check
+                manifest.update(file, digest)
+                self.assertFalse(manifest.is_unchanged(file))
+                # Checking the URL again postpones the next check
+                manifest.update(
+                    file, digest, {"example.com", "alive.com"}, alive={"alive.com"}
+                )
+                self.assertTrue(manifest.is_unchanged(file))
+            with mock.patch("time.time", return_value=time.time() + 3 * LIVENESS_TTL):
+                self.assertFalse(manifest.is_unchanged(file))
+                # URLs that are no longer alive aren't checked again
+                manifest.update(file, digest, {"example.com", "alive.com"})
+                self.assertTrue(manifest.is_unchanged(file))
@@ -0,0 +1,85 @@
+import asyncio
+import time
+import unittest
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from unittest import mock
+
+import httpx
+
+from archive_md_urls import gather_snapshots
+from archive_md_urls.ratelimit import RateLimiter, parse_retry_after
+
+
+class TestRateLimiter(unittest.TestCase):
+    """Test limiting concurrency and rate of API calls."""
+
+    def test_parse_retry_after(self) -> None:
+        """Test if Retry-After headers in seconds and as HTTP date are parsed."""
+        self.assertEqual(parse_retry_after("120"), 120.0)
+        self.assertEqual(parse_retry_after(None), None)
+        self.assertEqual(parse_retry_after("soon"), None)
+        retry_at: datetime = datetime.now(timezone.utc) + timedelta(seconds=30)
+        self.assertAlmostEqual(
+            parse_retry_after(format_datetime(retry_at, usegmt=True)), 30, delta=2
+        )
+
+    def test_max_in_flight(self) -> None:
+        """Test if no more than max_in_flight calls run at the same time."""
+        limiter = RateLimiter(max_in_flight=3, rate=1000)
+        in_flight: list[int] = [0, 0]
+
+        async def fake_call() -> None:
+            async with limiter:
+                in_flight[0] += 1
+                in_flight[1] = max(in_flight)
+                await asyncio.sleep(0.01)
+                in_flight[0] -= 1
+
+        async def call_all() -> None:
+            await asyncio.gather(*(fake_call() for _ in range(20)))
+
+        asyncio.run(call_all())
+        self.assertEqual(in_flight[1], 3)
+
+    def test_rate(self) -> None:
+        """Test if calls beyond the burst size are spaced out according to rate."""
+        limiter = RateLimiter(max_in_flight=10, rate=100, burst=1)
+
+        async def call_all() -> None:
+            for _ in range(6):
+                async with limiter:
+                    pass
+
+        start: float = time.monotonic()
+        asyncio.run(call_all())
+        self.assertGreaterEqual(time.monotonic() - start, 0.045)
+
+    def test_throttle(self) -> None:
+        """Test if a 429 response pauses calls and lowers the rate until recovery."""
+        limiter = RateLimiter(rate=10)
+        limiter.throttle(0.05)
+        self.assertEqual(limiter.rate, 5)
+        self.assertGreater(limiter.paused_until, time.monotonic())
+        for _ in range(20):
+            limiter.succeeded()
+        self.assertEqual(limiter.rate, 10)
+
+    @mock.patch.object(gather_snapshots, "RETRY_WAIT", 0.0)
+    def test_call_api_throttled(self) -> None:
+        """Test if call_api reports 429 responses to the limiter and retries."""
+        responses: list[httpx.Response] = [
+            httpx.Response(429, headers={"Retry-After": "0"}),
+            httpx.Response(200, json={"url": "example.com", "archived_snapshots": {}}),
+        ]
+        limiter = RateLimiter(rate=10)
+
+        async def call() -> dict:
+            transport = httpx.MockTransport(lambda request: responses.pop(0))
+            async with httpx.AsyncClient(transport=transport) as client:
+                return await gather_snapshots.call_api(
+                    client, gather_snapshots.build_api_call("example.com"), limiter
+                )
+
+        self.assertEqual(asyncio.run(call())["archived_snapshots"], {})
+        self.assertEqual(limiter.throttled, 1)
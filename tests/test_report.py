@@ -0,0 +1,45 @@
+import csv
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from archive_md_urls.report import Report, snapshot_distance
+
+
+class TestReport(unittest.TestCase):
+    """Test reporting of URL decisions."""
+
+    def test_snapshot_distance(self) -> None:
+        """Test if distance between snapshot and timestamp is in seconds."""
+        snapshot: str = "http://web.archive.org/web/20140428170257/http://example.com/"
+        self.assertEqual(snapshot_distance(snapshot, "201404280000"), 61377)
+        self.assertEqual(snapshot_distance(snapshot, "201404281703"), 3)
+        self.assertIsNone(snapshot_distance(snapshot, None))
+        self.assertIsNone(snapshot_distance(None, "201404280000"))
+
+    def test_report(self) -> None:
+        """Test if records are written as JSON Lines or CSV."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for name in ("report.jsonl", "report.csv"):
+                path = Path(tmp_dir, name)
+                with Report(path) as report:
+                    report.record_file(
+                        Path("post.md"),
+                        "201404280000",
+                        {"a.com": "http://web.archive.org/web/20140428000001/a.com"},
+                        {"https://doi.org/1": "https://doi.org/"},
+                        {},
+                    )
+                    # Records are written before the report is closed
+                    self.assertGreater(path.stat().st_size, 0)
+                with path.open(encoding="utf-8", newline="") as report_file:
+                    records: list[dict[str, str | None]] = (
+                        list(csv.DictReader(report_file))
+                        if name.endswith(".csv")
+                        else [json.loads(line) for line in report_file]
+                    )
+                self.assertEqual(len(records), 2)
+                self.assertEqual(records[0]["url"], "a.com")
+                self.assertEqual(str(records[0]["distance"]), "1")
+                self.assertEqual(records[1]["stable"], "https://doi.org/")
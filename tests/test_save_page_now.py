@@ -0,0 +1,156 @@
+import asyncio
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import httpx
+
+from archive_md_urls import Archiver
+from archive_md_urls.cache import SnapshotCache
+from archive_md_urls.cdx import CDXBackend
+from archive_md_urls.fake_wayback import FakeWayback
+from archive_md_urls.gather_snapshots import create_client
+from archive_md_urls.manifest import Manifest
+from archive_md_urls.ratelimit import RateLimiter
+from archive_md_urls.save_page_now import (
+    FAILED,
+    MAX_ATTEMPTS,
+    PENDING,
+    QUEUED,
+    SAVED,
+    SavePageNow,
+    SaveQueue,
+)
+from tests.testfiles import TEST_MD1, TEST_MD1_SOURCE
+
+URL: str = "https://example.com/page"
+
+
+class TestSavePageNow(unittest.TestCase):
+    """Test archiving URLs without snapshot with Save Page Now."""
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.queue_path = Path(self.tmp_dir.name, "saves.sqlite")
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_queue(self) -> None:
+        """Test if queued URLs and their progress survive reopening the queue."""
+        with SaveQueue(self.queue_path) as queue:
+            self.assertTrue(queue.add(URL))
+            self.assertFalse(queue.add(URL))
+            self.assertEqual(queue.due(0.0), [(URL, QUEUED, "")])
+            queue.update(URL, PENDING, 100.0, "spn2-1")
+        with SaveQueue(self.queue_path) as queue:
+            self.assertEqual(queue.due(50.0), [])
+            self.assertEqual(queue.next_check(), 100.0)
+            self.assertEqual(queue.due(100.0), [(URL, PENDING, "spn2-1")])
+            self.assertEqual(queue.counts(), {PENDING: 1})
+            self.assertEqual(queue.state(URL), PENDING)
+            self.assertIsNone(queue.state("https://example.com/other"))
+
+    def test_submit(self) -> None:
+        """Test if submit tells whether a URL is waiting to be archived."""
+        with SaveQueue(self.queue_path) as queue:
+            saver = SavePageNow(queue)
+            self.assertTrue(saver.submit(URL))
+            self.assertTrue(saver.submit(URL))
+            # Relative links are never queued, saved URLs not again
+            self.assertFalse(saver.submit("/about/"))
+            self.assertFalse(saver.submit("#top"))
+            queue.update(URL, SAVED)
+            self.assertFalse(saver.submit(URL))
+
+    def test_retry(self) -> None:
+        """Test if URLs are given up on after MAX_ATTEMPTS failed calls."""
+        fake = FakeWayback(error_rate=1.0)
+
+        async def run() -> None:
+            async with create_client(transport=fake.transport()) as client:
+                saver = SavePageNow(
+                    queue, limiter=RateLimiter(rate=1000.0), retry_delay=0.0, wait=5.0
+                )
+                saver.start(client)
+                saver.submit(URL)
+                # Relative links can't be archived
+                saver.submit("example.com")
+                await saver.stop()
+
+        with SaveQueue(self.queue_path) as queue:
+            asyncio.run(run())
+            self.assertEqual(queue.counts(), {FAILED: 1})
+        self.assertEqual(fake.requests["/save"], MAX_ATTEMPTS)
+
+    def test_credentials(self) -> None:
+        """Test if Save Page Now calls are authorized with the given S3 keys."""
+        fake = FakeWayback(save_polls=1)
+        authorization: set[str | None] = set()
+
+        async def handle(request: httpx.Request) -> httpx.Response:
+            authorization.add(request.headers.get("Authorization"))
+            return await fake.handle(request)
+
+        async def run() -> None:
+            async with create_client(transport=httpx.MockTransport(handle)) as client:
+                saver = SavePageNow(
+                    queue,
+                    limiter=RateLimiter(rate=1000.0),
+                    poll_interval=0.01,
+                    wait=5.0,
+                    credentials="access:secret",
+                )
+                saver.start(client)
+                saver.submit(URL)
+                await saver.stop()
+
+        with SaveQueue(self.queue_path) as queue:
+            asyncio.run(run())
+            self.assertEqual(queue.counts(), {SAVED: 1})
+        self.assertEqual(authorization, {"LOW access:secret"})
+
+    def test_archiver(self) -> None:
+        """Test if archived URLs are replaced by the next incremental run."""
+        fake = FakeWayback(missing_rate=1.0, save_polls=2)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file = Path(shutil.copy(TEST_MD1, tmp_dir))
+            cache = SnapshotCache(Path(tmp_dir, "cache.sqlite"))
+            manifest = Manifest(Path(tmp_dir, "manifest.json"))
+            # Capture lists kept by the backend are refreshed once a URL is saved
+            backend = CDXBackend()
+
+            async def run() -> None:
+                saver = SavePageNow(
+                    queue,
+                    cache,
+                    RateLimiter(rate=1000.0),
+                    poll_interval=0.01,
+                    wait=5.0,
+                )
+                async with Archiver(
+                    cache=cache,
+                    transport=fake.transport(),
+                    backend=backend,
+                    saver=saver,
+                ) as archiver:
+                    await archiver.process_files([file], manifest=manifest)
+
+            with SaveQueue(self.queue_path) as queue, cache:
+                # The first run finds no snapshots and queues the only absolute URL,
+                # which is saved before the run ends
+                asyncio.run(run())
+                self.assertEqual(queue.counts(), {SAVED: 1})
+                self.assertEqual(file.read_text(encoding="utf-8"), TEST_MD1_SOURCE)
+                # The second run finds the new snapshots in spite of cached lookups
+                asyncio.run(run())
+                # Relative links without snapshots don't keep the file from being
+                # skipped by the next run
+                self.assertTrue(manifest.is_unchanged(file))
+            updated_md_source: str = file.read_text(encoding="utf-8")
+        self.assertIn(
+            "(http://web.archive.org/web/20240101000000/https://github.com/pypa/pip)",
+            updated_md_source,
+        )
+        self.assertEqual(len(fake.jobs), 1)
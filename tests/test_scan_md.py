@@ -35,6 +35,30 @@ class TestScanMD(unittest.TestCase):
         )
         # Filtering STABLE_URLS should result in empty list
         self.assertEqual(scan_md.filter_urls(scan_md.STABLE_URLS), [])
+        # Filtered out URLs are collected with the stable URL they matched
+        stable: dict[str, str] = {}
+        scan_md.filter_urls(urls, stable)
+        self.assertEqual(
+            stable,
+            {
+                "https://web.archive.org/web/20000622042643/http://www.google.com/": (
+                    "web.archive.org/web/"
+                ),
+                "https://doi.org/10.1080/32498327493.2014.358732798": (
+                    "https://doi.org/"
+                ),
+                "{filename}/blog/2012/2012-02-05-an-even-older-blogpost.md": (
+                    "{filename}"
+                ),
+            },
+        )
+
+    def test_bucket_timestamp(self) -> None:
+        """Test if timestamps are truncated to the requested granularity."""
+        self.assertEqual(scan_md.bucket_timestamp("201304111450"), "201304111450")
+        self.assertEqual(scan_md.bucket_timestamp("201304111450", "day"), "20130411")
+        self.assertEqual(scan_md.bucket_timestamp("201304111450", "month"), "201304")
+        self.assertIsNone(scan_md.bucket_timestamp(None, "day"))
 
     def test_format_date(self) -> None:
         """Test if date is correctly formatted or returned as None."""
@@ -54,6 +78,17 @@ class TestScanMD(unittest.TestCase):
         # Various inputs that should raise dateutil ParserError and thus return None
         self.assertEqual(scan_md.format_date("some wrong string"), None)
         self.assertEqual(scan_md.format_date("2014-04-10 13:10:99"), None)
+        self.assertEqual(scan_md.format_date("2014-02-30"), None)
+
+    def test_format_date_fast_path(self) -> None:
+        """Test if YYYY-MM-DD dates are formatted without dateutil."""
+        scan_md.format_date.cache_clear()
+        with mock.patch("dateutil.parser.parse") as mock_parse:
+            self.assertEqual(scan_md.format_date("2012-02-05"), "201202050000")
+            mock_parse.assert_not_called()
+        # Cached results are reused
+        self.assertEqual(scan_md.format_date("2012-02-05"), "201202050000")
+        self.assertEqual(scan_md.format_date.cache_info().hits, 1)
 
     def test_convert_markdown(self) -> None:
         """Test if date correctly extracted from metadata."""
@@ -66,6 +101,19 @@ class TestScanMD(unittest.TestCase):
         html, date = scan_md.convert_markdown(TEST_MD3_SOURCE)
         self.assertEqual(date, None)
 
+    def test_get_converter(self) -> None:
+        """Test if converter is reused and reset between files."""
+        md = scan_md.get_converter()
+        md.convert(TEST_MD1_SOURCE)
+        self.assertIs(scan_md.get_converter(), md)
+        self.assertEqual(md.Meta, {})
+
+    def test_extract_date(self) -> None:
+        """Test if date is read from front matter or file name."""
+        self.assertEqual(scan_md.extract_date(TEST_MD1_SOURCE, TEST_MD1), "2014-04-28")
+        self.assertEqual(scan_md.extract_date(TEST_YAML_SOURCE, TEST_MD2), "2014-04-28")
+        self.assertEqual(scan_md.extract_date(TEST_MD2_SOURCE, TEST_MD2), "fake-blogp")
+
     def test_get_urls(self) -> None:
         """Test if URLs are correctly extracted from HTML."""
         html, date = scan_md.convert_markdown(TEST_MD1_SOURCE)
@@ -93,3 +141,19 @@ class TestScanMD(unittest.TestCase):
         # Test with date in file name only
         scan_md.scan_md(TEST_MD3_SOURCE, TEST_MD3)
         mock_format_date.assert_called_with("2014-04-28")
+        # Same dates are found when converting files to HTML first
+        scan_md.scan_md(TEST_MD1_SOURCE, TEST_MD1, engine="markdown")
+        mock_format_date.assert_called_with("2014-04-28")
+        scan_md.scan_md(TEST_MD2_SOURCE, TEST_MD2, engine="markdown")
+        mock_format_date.assert_called_with("fake-blogp")
+
+    def test_scan_md_engines(self) -> None:
+        """Test if both engines extract the same URLs."""
+        for md_source, md_file in (
+            (TEST_MD1_SOURCE, TEST_MD1),
+            (TEST_MD3_SOURCE, TEST_MD3),
+        ):
+            date, urls = scan_md.scan_md(md_source, md_file)
+            html_date, html_urls = scan_md.scan_md(md_source, md_file, "markdown")
+            self.assertEqual(date, html_date)
+            self.assertEqual(sorted(urls), sorted(html_urls))
@@ -0,0 +1,89 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from archive_md_urls.scan_md import STABLE_URLS
+from archive_md_urls.stable import StableMatcher, StableRule, load_stable_rules
+
+
+class TestStable(unittest.TestCase):
+    """Test matching of stable URLs."""
+
+    def test_substring_rules(self) -> None:
+        """Test if substring rules match like checking each of them in turn."""
+        matcher = StableMatcher(StableRule("substring", url) for url in STABLE_URLS)
+        urls: list[str] = [
+            *STABLE_URLS,
+            *(f"x{url}y" for url in STABLE_URLS),
+            *(url[:-1] for url in STABLE_URLS),
+            "https://example.com/?via=https://doi.org/10.1/2",
+            "http://doi.org/10.1/2",
+            "https://www.example.com/blog/post.html",
+            "example.com",
+        ]
+        for url in urls:
+            self.assertEqual(
+                matcher.match(url) is not None,
+                any(stable_url in url for stable_url in STABLE_URLS),
+                url,
+            )
+        self.assertEqual(
+            matcher.match("https://doi.org/10.1/2"),
+            StableRule("substring", "https://doi.org/"),
+        )
+
+    def test_rule_kinds(self) -> None:
+        """Test prefix, domain and regex rules and their names."""
+        matcher = StableMatcher(
+            [
+                StableRule("prefix", "https://intranet.example.com/"),
+                StableRule("prefix", "mailto:"),
+                StableRule("domain", "example.org"),
+                StableRule("regex", r"^https://gist\.github\.com/\w+/[0-9a-f]+$"),
+            ]
+        )
+        self.assertEqual(
+            matcher.match("https://intranet.example.com/page").name,
+            "prefix:https://intranet.example.com/",
+        )
+        # Prefix rules only match at the beginning
+        self.assertIsNone(matcher.match("https://a.com/?https://intranet.example.com/"))
+        self.assertEqual(matcher.match("mailto:me@example.com").name, "prefix:mailto:")
+        self.assertEqual(
+            matcher.match("http://docs.Example.org:8080/x").name, "domain:example.org"
+        )
+        self.assertIsNone(matcher.match("http://notexample.org/"))
+        self.assertEqual(
+            matcher.match("https://gist.github.com/someone/0a1b2c").kind, "regex"
+        )
+        self.assertIsNone(matcher.match("https://gist.github.com/someone"))
+
+    def test_regex_rules(self) -> None:
+        """Test if regex rules with inline flags and backreferences work together."""
+        rules: list[StableRule] = [
+            StableRule("regex", r"(?i)^https://EXAMPLE\.net/"),
+            StableRule("regex", r"^https://(\w+)\.com/\1$"),
+            StableRule("regex", r"/v(?P<major>\d+)/(?P=major)$"),
+        ]
+        matcher = StableMatcher(rules)
+        self.assertEqual(matcher.match("https://example.net/page"), rules[0])
+        self.assertEqual(matcher.match("https://repeat.com/repeat"), rules[1])
+        self.assertIsNone(matcher.match("https://repeat.com/other"))
+        self.assertEqual(matcher.match("https://a.org/v2/2"), rules[2])
+
+    def test_load_stable_rules(self) -> None:
+        """Test if rules are loaded from JSON and invalid configs are rejected."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            config = Path(tmp_dir, "stable.json")
+            config.write_text(
+                json.dumps({"domain": ["example.org"], "regex": ["^ftp:"]}), "utf-8"
+            )
+            self.assertEqual(
+                load_stable_rules(config),
+                [StableRule("domain", "example.org"), StableRule("regex", "^ftp:")],
+            )
+            for invalid in ({"host": ["a"]}, {"regex": ["("]}, {"prefix": "a"}, []):
+                config.write_text(json.dumps(invalid), "utf-8")
+                with self.assertRaises(ValueError):
+                    load_stable_rules(config)
@@ -0,0 +1,77 @@
+import asyncio
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from archive_md_urls import gather_snapshots
+from archive_md_urls.fake_wayback import FakeWayback
+from archive_md_urls.ratelimit import RateLimiter
+from archive_md_urls.stats import Stats, active_stats
+
+
+class TestStats(unittest.TestCase):
+    """Test collecting and exporting stats."""
+
+    def test_stats(self) -> None:
+        """Test counters, timers and the latency histogram."""
+        stats = Stats()
+        stats.count("files")
+        stats.count("urls", 3)
+        self.assertEqual((stats["files"], stats["urls"], stats["retries"]), (1, 3, 0))
+        with stats.timer("scan"):
+            pass
+        self.assertIn("scan", stats.stages)
+        for seconds in (0.01, 0.07, 0.07, 100.0):
+            stats.observe_latency(seconds)
+        self.assertEqual(stats.cumulative_buckets()[:2], [1, 3])
+        self.assertEqual(stats.cumulative_buckets()[-1], 4)
+        self.assertAlmostEqual(stats.mean_latency(), 100.15 / 4)
+        self.assertIn("0.05-0.1s", stats.format())
+
+    def test_write(self) -> None:
+        """Test if stats are exported as JSON or in Prometheus textfile format."""
+        stats = Stats()
+        stats.count("files", 2)
+        stats.observe_latency(0.2)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            stats.write(Path(tmp_dir, "stats.json"))
+            exported = json.loads(Path(tmp_dir, "stats.json").read_text())
+            stats.write(Path(tmp_dir, "stats.prom"))
+            metrics: str = Path(tmp_dir, "stats.prom").read_text()
+            self.assertEqual(
+                sorted(path.name for path in Path(tmp_dir).iterdir()),
+                ["stats.json", "stats.prom"],
+            )
+        self.assertEqual(exported["counters"]["files"], 2)
+        self.assertEqual(exported["api_latency"]["buckets"]["0.25"], 1)
+        self.assertEqual(exported["api_latency"]["buckets"]["+Inf"], 1)
+        self.assertIn("archive_md_urls_files_total 2\n", metrics)
+        self.assertIn(
+            'archive_md_urls_api_latency_seconds_bucket{le="0.1"} 0\n', metrics
+        )
+        self.assertIn("archive_md_urls_api_latency_seconds_count 1\n", metrics)
+
+    @mock.patch.object(gather_snapshots, "RETRY_WAIT", 0.0)
+    def test_api_calls(self) -> None:
+        """Test if API calls report latency, 429 responses and retries."""
+        fake = FakeWayback(throttle_rate=1.0, retry_after=0.0)
+        stats = Stats()
+
+        async def gather() -> None:
+            active_stats.set(stats)
+            async with gather_snapshots.create_client(
+                transport=fake.transport()
+            ) as client:
+                await gather_snapshots.gather_snapshots(
+                    ["example.com"], client=client, limiter=RateLimiter(rate=1000.0)
+                )
+
+        asyncio.run(gather())
+        self.assertEqual(stats["api_calls"], 5)
+        self.assertEqual(stats["throttled"], 5)
+        self.assertEqual(stats["retries"], 4)
+        self.assertEqual(stats.latency_count, 5)
+        # Outside of the run, no stats are active
+        self.assertIsNone(active_stats.get())
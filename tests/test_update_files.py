@@ -1,7 +1,23 @@
+import asyncio
+import contextlib
+import io
+import itertools
+import json
+import os
+import shutil
+import stat
+import tempfile
 import unittest
+from pathlib import Path
+from typing import Any
+from unittest import mock
 
 from archive_md_urls import update_files
-from tests.testfiles import CONVERTED_SOURCE, TEST_MD1_SOURCE
+from archive_md_urls.journal import Journal
+from archive_md_urls.manifest import Manifest, hash_source
+from archive_md_urls.report import Report
+from archive_md_urls.stats import Stats
+from tests.testfiles import CONVERTED_SOURCE, TEST_MD1, TEST_MD1_SOURCE
 
 # Create correct URL-Snapshot pairs for TEST_MD1 file
 WAYBACK_URLS: dict[str, str] = {
@@ -11,6 +27,20 @@ WAYBACK_URLS: dict[str, str] = {
 }
 
 
+async def fake_gather_snapshots(
+    urls: list[str],
+    timestamp: str | None = None,
+    client: Any = None,
+    lookups: Any = None,
+    cache: Any = None,
+    limiter: Any = None,
+    backend: Any = None,
+    failures: Any = None,
+) -> dict[str, str | None]:
+    """Return snapshots from WAYBACK_URLS instead of calling the API."""
+    return {url: WAYBACK_URLS.get(url) for url in urls}
+
+
 class TestUpdateFiles(unittest.TestCase):
     """Test if files are updated correctly."""
 
@@ -22,3 +52,317 @@ class TestUpdateFiles(unittest.TestCase):
             # correctly updated URLs
             CONVERTED_SOURCE,
         )
+
+    def test_update_source_special_characters(self) -> None:
+        """Test if URLs containing regex metacharacters are replaced literally."""
+        md_source: str = (
+            "[a](http://a.com/?q=1+2) [b](http://a.com/x_(y)) [c](a.com) "
+            + '(aXcom) `(a.com)` [d](a.com "title")\n\n[ref]: http://a.com/?q=1+2\n'
+        )
+        wayback_urls: dict[str, str | None] = {
+            "http://a.com/?q=1+2": "http://web.archive.org/web/1/http://a.com/?q=1+2",
+            "http://a.com/x_(y)": "http://web.archive.org/web/2/http://a.com/x_(y)",
+            "a.com": "http://web.archive.org/web/3/a.com",
+        }
+        self.assertEqual(
+            update_files.update_md_source(md_source, wayback_urls),
+            "[a](http://web.archive.org/web/1/http://a.com/?q=1+2) "
+            + "[b](http://web.archive.org/web/2/http://a.com/x_(y)) "
+            + "[c](http://web.archive.org/web/3/a.com) (aXcom) `(a.com)` "
+            + '[d](http://web.archive.org/web/3/a.com "title")\n\n'
+            + "[ref]: http://web.archive.org/web/1/http://a.com/?q=1+2\n",
+        )
+        # Without any snapshots, the source is returned unchanged
+        self.assertIs(update_files.update_md_source(md_source, {}), md_source)
+
+    @mock.patch("archive_md_urls.update_files.gather_snapshots", fake_gather_snapshots)
+    def test_update_files(self) -> None:
+        """Test if all files pass through the pipeline and are updated."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            files: list[Path] = [
+                Path(shutil.copy(TEST_MD1, Path(tmp_dir, f"{i}-{TEST_MD1.name}")))
+                for i in range(5)
+            ]
+            output = io.StringIO()
+            stats = Stats()
+            with contextlib.redirect_stdout(output):
+                asyncio.run(
+                    update_files.update_files(files, lookup_workers=2, stats=stats)
+                )
+            for file in files:
+                self.assertEqual(file.read_text(encoding="utf-8"), CONVERTED_SOURCE)
+        self.assertTrue(output.getvalue().startswith("Changed 15 URLs in 5 files ("))
+        self.assertIn("files/s", output.getvalue())
+        self.assertEqual(stats["files"], 5)
+        self.assertEqual(stats["urls"], 15)
+        self.assertEqual(stats["stable"], 15)
+        self.assertEqual(set(stats.stages), {"scan", "lookup", "rewrite", "write"})
+
+    @mock.patch("archive_md_urls.update_files.gather_snapshots", fake_gather_snapshots)
+    def test_update_files_unchanged(self) -> None:
+        """Test if files without changed URLs are not written."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file = Path(tmp_dir, "converted.md")
+            file.write_text(CONVERTED_SOURCE, encoding="utf-8")
+            os.utime(file, ns=(0, 0))
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                asyncio.run(update_files.update_files([file]))
+            self.assertEqual(file.stat().st_mtime_ns, 0)
+        self.assertIn("Changed 0 URLs in 0 files (", output.getvalue())
+        self.assertIn("Wrote 0 bytes.", output.getvalue())
+
+    @mock.patch("archive_md_urls.update_files.gather_snapshots", fake_gather_snapshots)
+    def test_update_files_dry_run(self) -> None:
+        """Test if a dry run reports changes without writing any file."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file = Path(shutil.copy(TEST_MD1, Path(tmp_dir, TEST_MD1.name)))
+            output = io.StringIO()
+            with (
+                Report(Path(tmp_dir, "report.jsonl")) as report,
+                contextlib.redirect_stdout(output),
+            ):
+                asyncio.run(
+                    update_files.update_files([file], report=report, dry_run=True)
+                )
+            self.assertEqual(file.read_text(encoding="utf-8"), TEST_MD1_SOURCE)
+            records: list[dict[str, Any]] = [
+                json.loads(line)
+                for line in Path(tmp_dir, "report.jsonl").read_text().splitlines()
+            ]
+        self.assertTrue(output.getvalue().startswith("Would change 3 URLs in 1 file ("))
+        # Three looked up URLs and three stable ones
+        self.assertEqual(len(records), 6)
+        self.assertIn(
+            {
+                "file": str(file),
+                "url": "example.com",
+                "timestamp": "201404280000",
+                "snapshot": WAYBACK_URLS["example.com"],
+                "distance": 61377,
+                "stable": None,
+                "liveness": None,
+                "error": None,
+            },
+            records,
+        )
+        self.assertEqual(len([record for record in records if record["stable"]]), 3)
+
+    def test_update_files_granularity(self) -> None:
+        """Test if posts of the same day share lookups with day granularity."""
+        timestamps: set[str | None] = set()
+
+        async def recording_gather_snapshots(
+            urls: list[str], timestamp: str | None = None, *args: Any
+        ) -> dict[str, str | None]:
+            timestamps.add(timestamp)
+            return await fake_gather_snapshots(urls)
+
+        with (
+            tempfile.TemporaryDirectory() as tmp_dir,
+            mock.patch(
+                "archive_md_urls.update_files.gather_snapshots",
+                recording_gather_snapshots,
+            ),
+        ):
+            Path(tmp_dir, "morning.md").write_text(TEST_MD1_SOURCE, encoding="utf-8")
+            Path(tmp_dir, "evening.md").write_text(
+                TEST_MD1_SOURCE.replace("2014-04-28", "2014-04-28 18:30"),
+                encoding="utf-8",
+            )
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                asyncio.run(
+                    update_files.update_files(
+                        [Path(tmp_dir, "morning.md"), Path(tmp_dir, "evening.md")],
+                        granularity="day",
+                    )
+                )
+        self.assertEqual(timestamps, {"20140428"})
+        self.assertIn("to the day saved 3 lookups.", output.getvalue())
+
+    def test_write_atomic(self) -> None:
+        """Test if files are replaced with their mode kept and no leftovers."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file = Path(tmp_dir, "post.md")
+            file.write_text(TEST_MD1_SOURCE, encoding="utf-8")
+            file.chmod(0o640)
+            self.assertEqual(
+                update_files.write_atomic(file, "Grüße\n"), len("Grüße\n".encode())
+            )
+            self.assertEqual(file.read_text(encoding="utf-8"), "Grüße\n")
+            self.assertEqual(stat.S_IMODE(file.stat().st_mode), 0o640)
+            self.assertEqual(list(Path(tmp_dir).iterdir()), [file])
+
+    @mock.patch("archive_md_urls.update_files.gather_snapshots", fake_gather_snapshots)
+    @mock.patch("archive_md_urls.update_files.BLOCK_SIZE", 16)
+    def test_update_files_links(self) -> None:
+        """Test if symbolic and hard links to updated files are kept."""
+        for threshold in (None, 0):
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                posts = Path(tmp_dir, "posts")
+                posts.mkdir()
+                target = Path(shutil.copy(TEST_MD1, Path(tmp_dir, TEST_MD1.name)))
+                symlink = Path(posts, "symlink.md")
+                symlink.symlink_to(target)
+                hard_link = Path(tmp_dir, "hard-link.md")
+                hard_link.hardlink_to(target)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    asyncio.run(
+                        update_files.update_files(
+                            [symlink], large_file_threshold=threshold
+                        )
+                    )
+                self.assertTrue(symlink.is_symlink())
+                for file in (target, hard_link):
+                    self.assertEqual(file.read_text(encoding="utf-8"), CONVERTED_SOURCE)
+                self.assertEqual(list(posts.iterdir()), [symlink])
+                self.assertEqual(
+                    sorted(Path(tmp_dir).iterdir()), sorted([posts, target, hard_link])
+                )
+
+    @mock.patch("archive_md_urls.update_files.gather_snapshots", fake_gather_snapshots)
+    def test_update_files_jobs(self) -> None:
+        """Test if files scanned in a process pool are updated like in threads."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            files: list[Path] = [
+                Path(shutil.copy(TEST_MD1, Path(tmp_dir, f"{i}-{TEST_MD1.name}")))
+                for i in range(update_files.CHUNK_SIZE + 3)
+            ]
+            with contextlib.redirect_stdout(io.StringIO()):
+                asyncio.run(update_files.update_files(files, jobs=2))
+            for file in files:
+                self.assertEqual(file.read_text(encoding="utf-8"), CONVERTED_SOURCE)
+
+    def test_update_files_no_workers(self) -> None:
+        """Test if stages without workers are rejected instead of hanging."""
+        for stage in ("scan_workers", "lookup_workers", "write_workers"):
+            with self.subTest(stage=stage), self.assertRaises(ValueError):
+                asyncio.run(update_files.update_files([TEST_MD1], **{stage: 0}))
+
+    @mock.patch("archive_md_urls.update_files.gather_snapshots", fake_gather_snapshots)
+    @mock.patch("archive_md_urls.update_files.BLOCK_SIZE", 16)
+    def test_update_files_large(self) -> None:
+        """Test if large files are updated block by block like other files."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file = Path(shutil.copy(TEST_MD1, Path(tmp_dir, TEST_MD1.name)))
+            manifest = Manifest(Path(tmp_dir, "manifest.json"))
+            stats = Stats()
+            with contextlib.redirect_stdout(io.StringIO()):
+                asyncio.run(
+                    update_files.update_files(
+                        [file], dry_run=True, large_file_threshold=0, stats=stats
+                    )
+                )
+                self.assertEqual(file.read_text(encoding="utf-8"), TEST_MD1_SOURCE)
+                self.assertEqual(stats["bytes"], len(CONVERTED_SOURCE.encode()))
+                asyncio.run(
+                    update_files.update_files(
+                        [file], manifest=manifest, large_file_threshold=0
+                    )
+                )
+            self.assertEqual(file.read_text(encoding="utf-8"), CONVERTED_SOURCE)
+            self.assertEqual(manifest.digest(file), hash_source(CONVERTED_SOURCE))
+            # No temporary files are left behind
+            self.assertEqual(list(Path(tmp_dir).iterdir()), [file])
+
+    def test_chunked(self) -> None:
+        """Test if items are split into chunks lazily."""
+        self.assertEqual(list(update_files.chunked(range(5), 2)), [[0, 1], [2, 3], [4]])
+        self.assertEqual(list(update_files.chunked([], 2)), [])
+        self.assertEqual(next(update_files.chunked(itertools.count(), 3)), [0, 1, 2])
+
+    @mock.patch("archive_md_urls.update_files.gather_snapshots", fake_gather_snapshots)
+    def test_update_files_resume(self) -> None:
+        """Test if files completed according to the journal are skipped."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            completed = Path(shutil.copy(TEST_MD1, Path(tmp_dir, "completed.md")))
+            remaining = Path(shutil.copy(TEST_MD1, Path(tmp_dir, "remaining.md")))
+            journal_path = Path(tmp_dir, "journal.jsonl")
+            with Journal(journal_path) as journal:
+                journal.record_file(completed)
+            with Journal(journal_path, resume=True) as journal:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    asyncio.run(
+                        update_files.update_files(
+                            [completed, remaining], journal=journal
+                        )
+                    )
+                self.assertTrue(journal.is_completed(remaining))
+            self.assertEqual(completed.read_text(encoding="utf-8"), TEST_MD1_SOURCE)
+            self.assertEqual(remaining.read_text(encoding="utf-8"), CONVERTED_SOURCE)
+
+    def test_update_files_incremental(self) -> None:
+        """Test if unchanged files and known URLs are skipped in incremental runs."""
+        looked_up: list[str] = []
+
+        async def counting_gather_snapshots(
+            urls: list[str], *args: Any
+        ) -> dict[str, str | None]:
+            looked_up.extend(urls)
+            return await fake_gather_snapshots(urls)
+
+        def run(files: list[Path], manifest: Manifest) -> None:
+            with contextlib.redirect_stdout(io.StringIO()):
+                asyncio.run(update_files.update_files(files, manifest=manifest))
+
+        with (
+            tempfile.TemporaryDirectory() as tmp_dir,
+            mock.patch(
+                "archive_md_urls.update_files.gather_snapshots",
+                counting_gather_snapshots,
+            ),
+        ):
+            file = Path(shutil.copy(TEST_MD1, Path(tmp_dir, TEST_MD1.name)))
+            manifest = Manifest(Path(tmp_dir, "manifest.json"))
+            run([file], manifest)
+            self.assertEqual(len(looked_up), 3)
+            # Second run skips the file without looking up anything
+            looked_up.clear()
+            run([file], manifest)
+            self.assertEqual(looked_up, [])
+            # After adding a link, only the new URL is looked up
+            file.write_text(
+                file.read_text(encoding="utf-8") + "\n[New](new.com)\n",
+                encoding="utf-8",
+            )
+            run([file], manifest)
+            self.assertEqual(looked_up, ["new.com"])
+
+    def test_update_files_incremental_failures(self) -> None:
+        """Test if files with failed lookups are not skipped in incremental runs."""
+        looked_up: list[str] = []
+
+        async def failing_gather_snapshots(
+            urls: list[str], *args: Any
+        ) -> dict[str, str | None]:
+            looked_up.extend(urls)
+            snapshots: dict[str, str | None] = await fake_gather_snapshots(urls)
+            if looked_up.count("github.com") == 1 and "github.com" in urls:
+                # The first lookup of github.com fails, failures is the last argument
+                snapshots["github.com"] = None
+                args[-1]["github.com"] = "timeout"
+            return snapshots
+
+        def run(files: list[Path], manifest: Manifest) -> None:
+            with contextlib.redirect_stdout(io.StringIO()):
+                asyncio.run(update_files.update_files(files, manifest=manifest))
+
+        with (
+            tempfile.TemporaryDirectory() as tmp_dir,
+            mock.patch(
+                "archive_md_urls.update_files.gather_snapshots",
+                failing_gather_snapshots,
+            ),
+        ):
+            file = Path(shutil.copy(TEST_MD1, Path(tmp_dir, TEST_MD1.name)))
+            manifest = Manifest(Path(tmp_dir, "manifest.json"))
+            run([file], manifest)
+            self.assertEqual(len(looked_up), 3)
+            self.assertFalse(manifest.is_unchanged(file))
+            # Only the failed URL is looked up again, then the file is done
+            run([file], manifest)
+            self.assertEqual(looked_up[3:], ["github.com"])
+            self.assertEqual(file.read_text(encoding="utf-8"), CONVERTED_SOURCE)
+            run([file], manifest)
+            self.assertEqual(len(looked_up), 4)
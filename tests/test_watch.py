@@ -0,0 +1,137 @@
+import asyncio
+import contextlib
+import io
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from archive_md_urls import Archiver
+from archive_md_urls.discover import iter_md_files
+from archive_md_urls.fake_wayback import FakeWayback
+from archive_md_urls.manifest import Manifest, hash_source
+from archive_md_urls.watch import Watcher
+from tests.testfiles import TEST_MD1, TEST_MD1_SOURCE
+
+
+class TestWatcher(unittest.TestCase):
+    """Test updating files whenever they change."""
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.directory = Path(self.tmp_dir.name)
+        self.file = Path(shutil.copy(TEST_MD1, self.directory))
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_process(self) -> None:
+        """Test if only changed files are processed, ignoring the Archiver's writes."""
+
+        async def run() -> list[list[Path]]:
+            async with Archiver(
+                transport=FakeWayback(missing_rate=0.0).transport()
+            ) as archiver:
+                watcher = Watcher(
+                    archiver,
+                    [self.directory],
+                    lambda: iter_md_files([self.directory], False),
+                )
+                new_file = Path(self.directory, "2020-01-01-new.md")
+                new_file.write_text(TEST_MD1_SOURCE, encoding="utf-8")
+                # A new file is found, the unchanged file is skipped
+                first: list[Path] = await watcher.process(
+                    {str(new_file.resolve()), str(self.file.resolve())}
+                )
+                # Writing the new file changed it, but that was the Archiver
+                second: list[Path] = await watcher.process({str(new_file.resolve())})
+                return [first, second]
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            first, second = asyncio.run(run())
+        self.assertEqual(first, [Path(self.directory, "2020-01-01-new.md")])
+        self.assertEqual(second, [])
+
+    def test_process_manifest(self) -> None:
+        """Test if processed files are recorded in the manifest."""
+        manifest = Manifest(Path(self.directory, "manifest.json"))
+
+        async def run() -> None:
+            async with Archiver(
+                transport=FakeWayback(missing_rate=0.0).transport()
+            ) as archiver:
+                watcher = Watcher(
+                    archiver,
+                    [self.directory],
+                    lambda: iter_md_files([self.directory], False),
+                    manifest=manifest,
+                )
+                self.file.write_text(TEST_MD1_SOURCE + "\n", encoding="utf-8")
+                await watcher.process({str(self.file.resolve())})
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            asyncio.run(run())
+        self.assertEqual(
+            Manifest(manifest.path).digest(self.file),
+            hash_source(self.file.read_text(encoding="utf-8")),
+        )
+
+    def test_poll_changes(self) -> None:
+        """Test if bursts of edits are debounced into a single batch."""
+
+        async def run() -> set[str]:
+            async with Archiver(
+                transport=FakeWayback(missing_rate=0.0).transport()
+            ) as archiver:
+                watcher = Watcher(
+                    archiver,
+                    [self.directory],
+                    lambda: iter_md_files([self.directory], False),
+                    debounce=0.2,
+                    poll_interval=0.01,
+                    use_watchfiles=False,
+                )
+                changes = watcher.changes()
+                batch: asyncio.Task[set[str]] = asyncio.create_task(anext(changes))
+                for i in range(3):
+                    await asyncio.sleep(0.02)
+                    self.file.write_text(TEST_MD1_SOURCE + "\n" * i, encoding="utf-8")
+                    self.assertFalse(batch.done())
+                return await batch
+
+        self.assertEqual(asyncio.run(run()), {str(self.file.resolve())})
+
+    def test_run(self) -> None:
+        """Test if a saved file is updated while watching."""
+
+        async def run() -> None:
+            async with Archiver(
+                transport=FakeWayback(missing_rate=0.0).transport()
+            ) as archiver:
+                watcher = Watcher(
+                    archiver,
+                    [self.directory],
+                    lambda: iter_md_files([self.directory], False),
+                    debounce=0.02,
+                    poll_interval=0.01,
+                    use_watchfiles=False,
+                )
+                task: asyncio.Task[None] = asyncio.create_task(watcher.run())
+                self.file.write_text(
+                    TEST_MD1_SOURCE + "\n[New](https://example.com/new)\n",
+                    encoding="utf-8",
+                )
+                for _ in range(100):
+                    await asyncio.sleep(0.01)
+                    if archiver.stats["files"]:
+                        break
+                task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await task
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            asyncio.run(run())
+        self.assertIn(
+            "(http://web.archive.org/web/",
+            self.file.read_text(encoding="utf-8").split("[New]")[1],
+        )